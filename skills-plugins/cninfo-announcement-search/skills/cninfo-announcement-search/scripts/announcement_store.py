@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import datetime as _dt
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from cninfo_client import Announcement, format_publish_time
+from date_utils import iter_dates
+
+STORE_FILENAME = ".announcements.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS announcements (
+    announcement_id TEXT PRIMARY KEY,
+    market TEXT NOT NULL,
+    publish_date TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_announcements_market_date ON announcements (market, publish_date);
+CREATE TABLE IF NOT EXISTS partitions (
+    market TEXT NOT NULL,
+    day TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (market, day)
+);
+"""
+
+
+# 公告主键：优先 announcementId，缺失时退化为与 dedupe_announcements 一致的组合键
+
+def announcement_key(a: Announcement):
+    if a.announcement_id != "":
+        return str(a.announcement_id)
+    return "key:" + "|".join([a.sec_code, a.title, a.adjunct_url, str(a.announcement_time)])
+
+
+# 本地公告元数据库：按 announcementId 存储，按 (市场, 日期) 记录已完整拉取的分区
+
+class AnnouncementStore:
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def complete_days(self, market: str, start_date: str, end_date: str):
+        rows = self.conn.execute(
+            "SELECT day FROM partitions WHERE market = ? AND day BETWEEN ? AND ?",
+            (market, start_date, end_date),
+        )
+        return {row[0] for row in rows}
+
+    def upsert(self, market: str, items):
+        now = time.time()
+        rows = []
+        for a in items:
+            publish_time = format_publish_time(a.announcement_time)
+            publish_date = publish_time.split(" ")[0] if publish_time else ""
+            rows.append((announcement_key(a), market, publish_date, json.dumps(a.to_raw(), ensure_ascii=False), now))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO announcements (announcement_id, market, publish_date, data, updated_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.conn.commit()
+
+    def mark_complete(self, market: str, days):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO partitions (market, day, fetched_at) VALUES (?, ?, ?)",
+            [(market, d, now) for d in days],
+        )
+        self.conn.commit()
+
+    def load(self, market: str, start_date: str, end_date: str):
+        rows = self.conn.execute(
+            "SELECT data FROM announcements WHERE market = ? AND publish_date BETWEEN ? AND ?",
+            (market, start_date, end_date),
+        )
+        return [Announcement.from_raw(json.loads(row[0])) for row in rows]
+
+
+# 将日期列表拆成连续区间 [(start, end)]
+
+def group_date_runs(days):
+    runs = []
+    for d in days:
+        if runs:
+            prev = _dt.datetime.strptime(runs[-1][1], "%Y-%m-%d").date()
+            if _dt.datetime.strptime(d, "%Y-%m-%d").date() - prev == _dt.timedelta(days=1):
+                runs[-1][1] = d
+                continue
+        runs.append([d, d])
+    return [(s, e) for s, e in runs]
+
+
+# 增量同步：仅对缺失分区与今天及以后的分区访问网络，其余从本地读取
+# fetch_range(date_range) -> (items, errors)，date_range 形如 "YYYY-MM-DD~YYYY-MM-DD"
+
+def sync_announcements(store: AnnouncementStore, market: str, start_date: str, end_date: str, fetch_range):
+    today = _dt.date.today().strftime("%Y-%m-%d")
+    days = list(iter_dates(start_date, end_date))
+    complete = store.complete_days(market, start_date, end_date)
+    missing = [d for d in days if d not in complete or d >= today]
+    cached = [d for d in days if d in complete and d < today]
+
+    items = []
+    errors = []
+    for run_start, run_end in group_date_runs(missing):
+        run_items, errs = fetch_range(f"{run_start}~{run_end}")
+        errors.extend(errs)
+        items.extend(run_items)
+        store.upsert(market, run_items)
+        if errs:
+            continue
+        settled = [d for d in days if run_start <= d <= run_end and d < today]
+        if settled:
+            store.mark_complete(market, settled)
+
+    for run_start, run_end in group_date_runs(cached):
+        items.extend(store.load(market, run_start, run_end))
+
+    stats = {"fetchedDays": len(missing), "cachedDays": len(cached)}
+    return items, errors, stats
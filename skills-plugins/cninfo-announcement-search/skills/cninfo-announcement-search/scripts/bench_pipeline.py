@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import tempfile
+import time
+
+import cninfo_client
+from cninfo_announcement_search import build_result_items
+from cninfo_client import breaker_stats, build_headers, configure_breakers, dedupe_announcements, fetch_announcements
+from pdf_search import has_pdftotext
+from replay_server import ReplayServer, synthesize_fixtures
+
+
+# 基于本地回放服务的端到端基准：分页拉取 → 去重 → PDF 下载与全文匹配
+
+def run_bench(args, fixtures: str):
+    server = ReplayServer(fixtures, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, omit_totals=args.omit_totals).start()
+    cninfo_client.CNINFO_QUERY_URL = server.query_url
+    cninfo_client.CNINFO_PDF_BASE = server.pdf_base
+    configure_breakers(args.breaker_threshold, args.breaker_cooldown)
+    headers = build_headers("", "Mozilla/5.0")
+    date_range = f"{args.start_date}~{args.end_date}"
+    try:
+        errors = []
+        items = []
+        started = time.perf_counter()
+        for market in args.markets.split(","):
+            got, errs = fetch_announcements(date_range, "", market, args.page_size, 0, headers, args.timeout, False, page_workers=args.page_workers, page_sleep=0, retries=args.retries, retry_backoff=0.05)
+            items.extend(got)
+            errors.extend(errs)
+        items = dedupe_announcements(items)
+        fetch_seconds = time.perf_counter() - started
+        query_stats = server.stats.snapshot().get("query", {})
+
+        report = {
+            "fixtures": fixtures,
+            "fetch": {
+                "pageWorkers": args.page_workers,
+                "pages": query_stats.get("requests", 0),
+                "items": len(items),
+                "seconds": round(fetch_seconds, 3),
+                "pagesPerSec": round(query_stats.get("requests", 0) / fetch_seconds, 1) if fetch_seconds else 0,
+                "itemsPerSec": round(len(items) / fetch_seconds, 1) if fetch_seconds else 0,
+                "peakConcurrency": query_stats.get("peakConcurrency", 0),
+                "serverErrors": query_stats.get("errors", 0),
+            },
+        }
+
+        if not args.skip_pdf:
+            stats = {}
+            started = time.perf_counter()
+            with tempfile.TemporaryDirectory(prefix="cninfo-bench-dl-") as download_root:
+                results, pdf_errors = build_result_items(
+                    items[:args.max_pdfs] if args.max_pdfs else items,
+                    args.start_date, args.end_date, [], "any", [args.keyword], "any",
+                    download_root, args.timeout, True, args.workers,
+                    extract_workers=args.extract_workers, queue_size=args.queue_size,
+                    stats=stats, retries=args.retries, retry_backoff=0.05,
+                )
+            pdf_seconds = time.perf_counter() - started
+            errors.extend(pdf_errors)
+            matched = sum(1 for r in results if r.get("pdfMatch"))
+            pdf_stats = server.stats.snapshot().get("pdf", {})
+            report["pdf"] = {
+                "pdfs": len(results),
+                "seconds": round(pdf_seconds, 3),
+                "pdfsPerSec": round(len(results) / pdf_seconds, 1) if pdf_seconds else 0,
+                "matched": matched,
+                "matchRate": round(matched / len(results), 3) if results else 0,
+                "peakDownloadConcurrency": pdf_stats.get("peakConcurrency", 0),
+                "serverErrors": pdf_stats.get("errors", 0),
+                "pipeline": stats,
+            }
+        report["breakers"] = breaker_stats()
+        report["errors"] = len(errors)
+        return report
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cninfo paging and the PDF pipeline against the offline replay server.")
+    parser.add_argument("--fixtures", default="", help="Fixture directory (default: synthesize into a temp dir).")
+    parser.add_argument("--start-date", default="2026-01-05")
+    parser.add_argument("--end-date", default="2026-01-09")
+    parser.add_argument("--markets", default="szse,sse,bse")
+    parser.add_argument("--per-day", type=int, default=100, help="Synthetic announcements per market per day.")
+    parser.add_argument("--pdf-pages", type=int, default=20, help="Pages per synthetic PDF.")
+    parser.add_argument("--match-ratio", type=float, default=0.2)
+    parser.add_argument("--keyword", default="buyback")
+    parser.add_argument("--page-size", type=int, default=30)
+    parser.add_argument("--page-workers", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=6, help="PDF download workers.")
+    parser.add_argument("--extract-workers", type=int, default=0)
+    parser.add_argument("--queue-size", type=int, default=0)
+    parser.add_argument("--max-pdfs", type=int, default=300, help="Cap PDFs processed (0 = all).")
+    parser.add_argument("--skip-pdf", action="store_true", help="Benchmark paging only.")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Injected server latency.")
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--omit-totals", action="store_true", help="Exercise speculative paging.")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--breaker-threshold", type=int, default=5)
+    parser.add_argument("--breaker-cooldown", type=float, default=0.5, help="Short cooldown so injected errors do not stall the run.")
+    parser.add_argument("--timeout", type=int, default=20)
+    args = parser.parse_args()
+
+    if not args.skip_pdf and not has_pdftotext():
+        parser.error("pdftotext not found; install poppler-utils or pass --skip-pdf")
+
+    if args.fixtures:
+        report = run_bench(args, args.fixtures)
+    else:
+        with tempfile.TemporaryDirectory(prefix="cninfo-bench-") as fixtures:
+            synthesize_fixtures(fixtures, args.start_date, args.end_date, args.markets.split(","), args.per_day, args.pdf_pages, args.match_ratio, args.keyword)
+            report = run_bench(args, fixtures)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
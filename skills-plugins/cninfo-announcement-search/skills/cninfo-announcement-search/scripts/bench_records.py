@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from cninfo_client import Announcement, dedupe_announcements
+
+PAGE_SIZE = 30
+
+
+# 生成一页与 cninfo 返回结构相近的原始公告（含高亮 HTML 与大量无用字段）
+
+def synthetic_page(page_num: int, rng: random.Random):
+    items = []
+    for i in range(PAGE_SIZE):
+        n = page_num * PAGE_SIZE + i
+        code = f"{rng.randint(1, 3999):06d}"
+        items.append({
+            "id": None,
+            "secCode": code,
+            "secName": f"测试{code[-3:]}",
+            "orgId": f"gssz{code}",
+            "announcementId": str(1220000000 + n),
+            "announcementTitle": f"关于<em>回购</em>公司股份进展情况的公告（第{n}号）",
+            "announcementTime": 1767196800000 + n * 1000,
+            "adjunctUrl": f"finalpage/2026-01-01/{1220000000 + n}.PDF",
+            "adjunctSize": rng.randint(100, 5000),
+            "adjunctType": "PDF",
+            "storageTime": None,
+            "columnId": "09020202||250101||251302",
+            "pageColumn": "SZZB",
+            "announcementType": "01010503||010112||012399",
+            "associateAnnouncement": None,
+            "important": None,
+            "batchNum": None,
+            "announcementContent": "",
+            "orgName": None,
+            "tileSecName": f"<em>测试</em>{code[-3:]}",
+            "shortTitle": f"回购进展{n}",
+            "announcementTypeName": "股份回购",
+            "secNameList": None,
+        })
+    # 经 JSON 往返，模拟从响应体解析出的独立字符串对象
+    return json.loads(json.dumps({"announcements": items}, ensure_ascii=False))["announcements"]
+
+
+# 旧实现：保留原始 dict，按字符串字段元组去重
+
+def legacy_dedupe(items):
+    uniq = {}
+    for a in items:
+        aid = str(a.get("announcementId", "")) if a.get("announcementId") is not None else ""
+        if aid:
+            if aid not in uniq:
+                uniq[aid] = a
+            continue
+        key = (
+            str(a.get("secCode", "")),
+            str(a.get("announcementTitle", "")),
+            str(a.get("adjunctUrl", "")),
+            str(a.get("announcementTime", "")),
+        )
+        if key not in uniq:
+            uniq[key] = a
+    return list(uniq.values())
+
+
+def measure(label: str, total: int, project: bool):
+    rng = random.Random(42)
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    items = []
+    for page_num in range((total + PAGE_SIZE - 1) // PAGE_SIZE):
+        page = synthetic_page(page_num, rng)
+        if project:
+            items.extend(Announcement.from_raw(a) for a in page)
+        else:
+            items.extend(page)
+    ingest = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    uniq = dedupe_announcements(items) if project else legacy_dedupe(items)
+    dedupe = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "label": label,
+        "items": len(items),
+        "unique": len(uniq),
+        "retainedMB": round(current / 1024 / 1024, 1),
+        "peakMB": round(peak / 1024 / 1024, 1),
+        "ingestSeconds": round(ingest, 2),
+        "dedupeSeconds": round(dedupe, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory benchmark: raw cninfo dicts vs slotted Announcement records.")
+    parser.add_argument("--items", type=int, default=500_000, help="Synthetic announcement count.")
+    args = parser.parse_args()
+
+    rows = [
+        measure("raw dict", args.items, project=False),
+        measure("Announcement", args.items, project=True),
+    ]
+    for row in rows:
+        print(json.dumps(row, ensure_ascii=False))
+    saved = rows[0]["retainedMB"] - rows[1]["retainedMB"]
+    print(f"retained memory reduced by {saved:.1f} MB ({saved * 100.0 / rows[0]['retainedMB']:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,30 @@
 import argparse
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
 from pathlib import Path
 
+from announcement_store import STORE_FILENAME, AnnouncementStore, sync_announcements
 from cninfo_client import (
+    breaker_stats,
     build_headers,
     build_pdf_url,
+    configure_breakers,
     dedupe_announcements,
     download_pdf,
     fetch_announcements,
     format_publish_time,
     normalize_markets,
+    publish_time_ms,
 )
-from date_utils import parse_when_or_date, resolve_date_range, in_date_range
+from date_utils import date_range_ms, in_date_range, ms_in_range, parse_when_or_date, resolve_date_range
+from fulltext_index import INDEX_FILENAME, build_index, search_index
 from keywords import load_keywords_json, normalize_keywords, split_keywords
-from pdf_search import has_pdftotext, pdf_contains_keywords
+from page_history import HISTORY_FILENAME, PageHistory
+from pdf_pipeline import PdfPipeline
+from pdf_search import has_pdftotext, pdf_contains_keywords, scan_pdf_keywords
+from progress import ProgressReporter
+from resume_state import default_state_path, load_state, market_incomplete, query_signature, save_state, state_owned
 
 DEFAULT_DOWNLOAD_ROOT = "/tmp/cninfo-announcement-search"
 DEFAULT_KEYWORDS_JSON = Path(__file__).resolve().parent.parent / "keywords.json"
@@ -36,14 +45,14 @@ def title_match(title: str, keywords, match_mode: str):
     return any(hits)
 
 
-# 下载并匹配 PDF
+# 下载 PDF（已存在的本地文件直接复用），返回 ((pdf_url, 本地路径), 错误)
 
-def process_pdf_item(item, publish_date: str, pdf_keywords, pdf_match_mode: str, download_root: str, timeout: int):
-    announcement_id = str(item.get("announcementId", ""))
-    adjunct_url = item.get("adjunctUrl", "")
+def fetch_pdf_item(item, publish_date: str, download_root: str, timeout: int, retries: int = 0, retry_backoff: float = 1.0):
+    announcement_id = str(item.announcement_id)
+    adjunct_url = item.adjunct_url
     pdf_url = build_pdf_url(adjunct_url, announcement_id)
     if not pdf_url:
-        return ("", "", None, f"pdf_url_empty[{announcement_id}]")
+        return ("", ""), f"pdf_url_empty[{announcement_id}]"
 
     out_dir = Path(download_root) / publish_date
     filename = os.path.basename(adjunct_url) if adjunct_url else f"{announcement_id}.PDF"
@@ -54,82 +63,226 @@ def process_pdf_item(item, publish_date: str, pdf_keywords, pdf_match_mode: str,
     out_path = out_dir / filename
     try:
         if out_path.exists() and out_path.stat().st_size > 0:
-            pdf_local_path = str(out_path)
-        else:
-            pdf_local_path = download_pdf(pdf_url, out_dir, filename, timeout)
-        pdf_match = pdf_contains_keywords(pdf_local_path, pdf_keywords, pdf_match_mode)
-        return (pdf_url, pdf_local_path, pdf_match, None)
+            return (pdf_url, str(out_path)), None
+        return (pdf_url, download_pdf(pdf_url, out_dir, filename, timeout, retries, retry_backoff)), None
     except Exception as exc:
-        return (pdf_url, "", False, f"pdf_failed[{announcement_id}]: {exc}")
+        return (pdf_url, ""), f"pdf_failed[{announcement_id}]: {exc}"
 
 
-# 构建结构化结果
+# 匹配已下载 PDF 的关键词，返回 ((是否命中, 命中页码), 错误)
 
-def build_result_items(raw_items, start_date: str, end_date: str, title_keywords, title_match_mode: str, pdf_keywords, pdf_match_mode: str, download_root: str, timeout: int, download_pdf: bool, workers: int):
-    results = []
-    errors = []
+def match_pdf_item(item, pdf_local_path: str, pdf_keywords, pdf_match_mode: str, pdf_scan: str = "page"):
+    try:
+        if pdf_scan == "full":
+            return (pdf_contains_keywords(pdf_local_path, pdf_keywords, pdf_match_mode), {}), None
+        return scan_pdf_keywords(pdf_local_path, pdf_keywords, pdf_match_mode), None
+    except Exception as exc:
+        return (False, {}), f"pdf_failed[{item.announcement_id}]: {exc}"
+
+
+# 构建单条结果
+
+def make_result(item, publish_time: str, pdf_url: str, pdf_local_path: str, pdf_match, hit_pages):
+    return {
+        "secCode": item.sec_code,
+        "secName": item.sec_name,
+        "announcementTitle": item.title,
+        "announcementId": str(item.announcement_id),
+        "publishTime": publish_time,
+        "pdfUrl": pdf_url,
+        "pdfLocalPath": pdf_local_path,
+        "titleMatch": True,
+        "pdfMatch": pdf_match,
+        "pdfHitPages": hit_pages,
+    }
 
-    filtered = []
-    for a in raw_items:
-        publish_time = format_publish_time(a.get("announcementTime") or a.get("publishTime"))
-        publish_date = publish_time.split(" ")[0] if publish_time else ""
-        if publish_date and not in_date_range(publish_date, start_date, end_date):
-            continue
 
-        title = a.get("announcementTitle", "")
-        if not title_match(title, title_keywords, title_match_mode):
+# 按发布日期过滤，返回 [(公告, 发布日期, 发布时间)]
+# 起止日期只换算一次为毫秒时间戳区间，数值时间整批做整数比较，仅对保留下来的公告格式化发布时间
+
+def filter_by_date(raw_items, start_date: str, end_date: str):
+    items = list(raw_items)
+    keep = [True] * len(items)
+    timed = []
+    stamps = []
+    for i, a in enumerate(items):
+        ts = publish_time_ms(a.announcement_time)
+        if ts is not None:
+            timed.append(i)
+            stamps.append(ts)
+        elif a.announcement_time is not None:
+            publish_date = str(a.announcement_time).split(" ")[0]
+            keep[i] = not publish_date or in_date_range(publish_date, start_date, end_date)
+
+    bounds = date_range_ms(start_date, end_date)
+    in_range = ms_in_range(stamps, *bounds) if bounds else [False] * len(stamps)
+    for i, ok in zip(timed, in_range):
+        keep[i] = ok
+
+    dated = []
+    for a, ok in zip(items, keep):
+        if not ok:
             continue
+        publish_time = format_publish_time(a.announcement_time)
+        publish_date = publish_time.split(" ")[0] if publish_time else ""
+        dated.append((a, publish_date or start_date, publish_time))
+    return dated
+
 
-        filtered.append((a, publish_date or start_date, publish_time))
+# 创建 PDF 两阶段流水线（下载阶段通用，提取阶段由调用方提供）
+
+def make_pdf_pipeline(extract_stage, download_root: str, timeout: int, workers: int, extract_workers: int, queue_size: int, retries: int, retry_backoff: float):
+    def download_stage(job):
+        item, publish_date = job[0], job[1]
+        return fetch_pdf_item(item, publish_date, download_root, timeout, retries, retry_backoff)
+
+    extract_workers = extract_workers or os.cpu_count() or 1
+    return PdfPipeline(
+        download_stage,
+        extract_stage,
+        download_workers=workers,
+        extract_workers=extract_workers,
+        queue_size=queue_size or extract_workers * 2,
+    )
+
+
+# 构建结构化结果
+# 传入 on_result 时逐条回调（PDF 检查完成即回调）且不在内存中累积结果
+# PDF 处理分两阶段：workers 个下载线程 + extract_workers 个提取线程，stats 回填各阶段吞吐
+
+def build_result_items(raw_items, start_date: str, end_date: str, title_keywords, title_match_mode: str, pdf_keywords, pdf_match_mode: str, download_root: str, timeout: int, download_pdf: bool, workers: int, pdf_scan: str = "page", on_result=None, progress_interval: float = 0, extract_workers: int = 0, queue_size: int = 0, stats=None, retries: int = 0, retry_backoff: float = 1.0):
+    results = []
+    errors = []
+    emit = on_result or results.append
+
+    filtered = [
+        job for job in filter_by_date(raw_items, start_date, end_date)
+        if title_match(job[0].title, title_keywords, title_match_mode)
+    ]
 
     if download_pdf:
-        with ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = {}
-            for item, publish_date, publish_time in filtered:
-                futures[executor.submit(
-                    process_pdf_item,
-                    item,
-                    publish_date,
-                    pdf_keywords,
-                    pdf_match_mode,
-                    download_root,
-                    timeout,
-                )] = (item, publish_date, publish_time)
-
-            for fut in as_completed(futures):
-                item, publish_date, publish_time = futures[fut]
-                pdf_url, pdf_local_path, pdf_match, err = fut.result()
-                if err:
-                    errors.append(err)
-
-                results.append({
-                    "secCode": item.get("secCode") or item.get("secid") or "",
-                    "secName": item.get("secName") or item.get("secname") or "",
-                    "announcementTitle": item.get("announcementTitle", ""),
-                    "announcementId": str(item.get("announcementId", "")),
-                    "publishTime": publish_time,
-                    "pdfUrl": pdf_url,
-                    "pdfLocalPath": pdf_local_path,
-                    "titleMatch": True,
-                    "pdfMatch": pdf_match,
-                })
+        progress = ProgressReporter("pdf", len(filtered), progress_interval)
+
+        def extract_stage(job, downloaded):
+            return match_pdf_item(job[0], downloaded[1], pdf_keywords, pdf_match_mode, pdf_scan)
+
+        pipeline = make_pdf_pipeline(extract_stage, download_root, timeout, workers, extract_workers, queue_size, retries, retry_backoff)
+        for job, downloaded, extracted, err in pipeline.run(filtered):
+            item, _, publish_time = job
+            pdf_url, pdf_local_path = downloaded or ("", "")
+            pdf_match, hit_pages = extracted or (False, {})
+            if err:
+                errors.append(err)
+                pdf_local_path = ""
+            progress.update(matched=bool(pdf_match), error=bool(err))
+            emit(make_result(item, publish_time, pdf_url, pdf_local_path, pdf_match, hit_pages))
+        progress.finish()
+        if stats is not None:
+            stats.update(pipeline.stats())
     else:
         for item, publish_date, publish_time in filtered:
-            results.append({
-                "secCode": item.get("secCode") or item.get("secid") or "",
-                "secName": item.get("secName") or item.get("secname") or "",
-                "announcementTitle": item.get("announcementTitle", ""),
-                "announcementId": str(item.get("announcementId", "")),
-                "publishTime": publish_time,
-                "pdfUrl": build_pdf_url(item.get("adjunctUrl", ""), str(item.get("announcementId", ""))),
-                "pdfLocalPath": "",
-                "titleMatch": True,
-                "pdfMatch": None,
-            })
+            pdf_url = build_pdf_url(item.adjunct_url, str(item.announcement_id))
+            emit(make_result(item, publish_time, pdf_url, "", None, {}))
 
     return results, errors
 
 
+# 读取多个关键词配置（监控组合），名称取文件名，重名时追加序号
+
+def load_profiles(paths, skip_pdf: bool, download_pdf: bool):
+    profiles = []
+    names = set()
+    for path in paths:
+        cfg = load_keywords_json(path)
+        name = Path(path).stem
+        if name in names:
+            name = f"{name}_{len(profiles) + 1}"
+        names.add(name)
+        profiles.append({
+            "name": name,
+            "path": path,
+            "title_keywords": cfg["title_keywords"],
+            "pdf_keywords": cfg["pdf_keywords"],
+            "title_match": cfg["title_match"],
+            "pdf_match": cfg["pdf_match"],
+            "download": (not skip_pdf) and (download_pdf or bool(cfg["pdf_keywords"])),
+        })
+    return profiles
+
+
+# 根据共享扫描得到的关键词命中页判断某个组合是否命中
+
+def profile_pdf_match(profile, hit_pages):
+    keywords = profile["pdf_keywords"]
+    if not keywords:
+        return True
+    hits = [k in hit_pages for k in keywords]
+    return all(hits) if profile["pdf_match"] == "all" else any(hits)
+
+
+# 多组合结果：公告列表只拉一次，各组合分别做标题匹配；
+# 同一 PDF 只下载、扫描一次（扫描所有相关组合 PDF 关键词的并集），再按组合分别判定
+# emit(组合名, 结果) 逐条回调
+
+def build_profile_results(raw_items, start_date: str, end_date: str, profiles, emit, download_root: str, timeout: int, workers: int, progress_interval: float = 0, extract_workers: int = 0, queue_size: int = 0, stats=None, retries: int = 0, retry_backoff: float = 1.0):
+    errors = []
+    jobs = []
+    for job in filter_by_date(raw_items, start_date, end_date):
+        title = job[0].title
+        selected = [p for p in profiles if title_match(title, p["title_keywords"], p["title_match"])]
+        if not selected:
+            continue
+        pdf_url = build_pdf_url(job[0].adjunct_url, str(job[0].announcement_id))
+        for p in selected:
+            if not p["download"]:
+                emit(p["name"], make_result(job[0], job[2], pdf_url, "", None, {}))
+        pdf_profiles = [p for p in selected if p["download"]]
+        if pdf_profiles:
+            jobs.append(job + (pdf_profiles,))
+
+    if not jobs:
+        return errors
+
+    progress = ProgressReporter("pdf", len(jobs), progress_interval)
+
+    def extract_stage(job, downloaded):
+        pdf_profiles = job[3]
+        keywords = list(dict.fromkeys(k for p in pdf_profiles for k in p["pdf_keywords"]))
+        if not keywords:
+            return (True, {}), None
+
+        # 所有组合的结果都已确定（any 命中任一、all 全部命中）即停止扫描
+        def decided(hit_pages):
+            return all(profile_pdf_match(p, hit_pages) for p in pdf_profiles)
+
+        try:
+            return scan_pdf_keywords(downloaded[1], keywords, "all", stop_when=decided), None
+        except Exception as exc:
+            return (False, {}), f"pdf_failed[{job[0].announcement_id}]: {exc}"
+
+    pipeline = make_pdf_pipeline(extract_stage, download_root, timeout, workers, extract_workers, queue_size, retries, retry_backoff)
+    for job, downloaded, extracted, err in pipeline.run(jobs):
+        item, _, publish_time, pdf_profiles = job
+        pdf_url, pdf_local_path = downloaded or ("", "")
+        hit_pages = (extracted or (False, {}))[1]
+        if err:
+            errors.append(err)
+            pdf_local_path = ""
+        matched_any = False
+        for p in pdf_profiles:
+            pdf_match = (not err) and profile_pdf_match(p, hit_pages)
+            if p["pdf_keywords"] and not pdf_match:
+                continue
+            matched_any = True
+            own_pages = {k: v for k, v in hit_pages.items() if k in p["pdf_keywords"]}
+            emit(p["name"], make_result(item, publish_time, pdf_url, pdf_local_path, pdf_match, own_pages))
+        progress.update(matched=matched_any, error=bool(err))
+    progress.finish()
+    if stats is not None:
+        stats.update(pipeline.stats())
+    return errors
+
+
 # 解析关键词配置
 
 def resolve_keywords(args):
@@ -169,7 +322,170 @@ def json_dumps(obj):
     return json.dumps(obj, ensure_ascii=False, indent=2)
 
 
+# 输出单行 JSON（NDJSON）
+
+def json_line(obj):
+    import json
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+# 本地全文索引：index 子命令
+
+def index_main(argv):
+    parser = argparse.ArgumentParser(prog="cninfo_announcement_search.py index", description="Build or update the local full-text index over downloaded PDFs.")
+    parser.add_argument("--download-root", default=DEFAULT_DOWNLOAD_ROOT, help="PDF download root directory.")
+    parser.add_argument("--index-path", default="", help="Index file path (default: <download-root>/%s)." % INDEX_FILENAME)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent pdftotext workers.")
+    args = parser.parse_args(argv)
+
+    if not has_pdftotext():
+        print(json_dumps({"errors": ["pdftotext_not_found: 安装方式 - macOS: brew install poppler; Linux: apt/yum/pacman 安装 poppler-utils"]}))
+        sys.exit(2)
+
+    index_path = args.index_path or str(Path(args.download_root) / INDEX_FILENAME)
+    stats, errors = build_index(args.download_root, index_path, args.workers)
+    print(json_dumps({"indexPath": index_path, "stats": stats, "errors": errors}))
+
+
+# 本地全文索引：search 子命令（不访问网络）
+
+def search_main(argv):
+    parser = argparse.ArgumentParser(prog="cninfo_announcement_search.py search", description="Search the local full-text index without touching the network.")
+    parser.add_argument("--keywords", "--keyword", required=True, help="Comma-separated keywords.")
+    parser.add_argument("--match", choices=["any", "all"], default="any", help="Keyword match mode.")
+    parser.add_argument("--start-date", default="", help="Range start date: YYYY-MM-DD.")
+    parser.add_argument("--end-date", default="", help="Range end date: YYYY-MM-DD.")
+    parser.add_argument("--limit", type=int, default=0, help="Max results (<=0 means all).")
+    parser.add_argument("--download-root", default=DEFAULT_DOWNLOAD_ROOT, help="PDF download root directory.")
+    parser.add_argument("--index-path", default="", help="Index file path (default: <download-root>/%s)." % INDEX_FILENAME)
+    parser.add_argument("--out", default="", help="Write JSON output to file.")
+    args = parser.parse_args(argv)
+
+    keywords = split_keywords(args.keywords)
+    index_path = args.index_path or str(Path(args.download_root) / INDEX_FILENAME)
+    if not Path(index_path).exists():
+        print(json_dumps({"errors": [f"index_not_found[{index_path}]: 请先运行 index 子命令"]}))
+        sys.exit(2)
+
+    started = time.time()
+    results = search_index(index_path, keywords, args.match, args.start_date, args.end_date, args.limit)
+    output = {
+        "keywords": keywords,
+        "matchMode": args.match,
+        "startDate": args.start_date,
+        "endDate": args.end_date,
+        "count": len(results),
+        "elapsedMs": int((time.time() - started) * 1000),
+        "items": results,
+    }
+    text = json_dumps(output)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+# 多组合模式：输出按组合名分组
+
+def run_profiles(args, profiles, all_items, date_str: str, start_date: str, end_date: str, markets, errors, run_stats):
+    if any(p["download"] for p in profiles) and not has_pdftotext():
+        print(json_dumps({
+            "date": date_str,
+            "startDate": start_date,
+            "endDate": end_date,
+            "markets": markets,
+            "profiles": {},
+            "errors": [
+                "pdftotext_not_found: 安装方式 - macOS: brew install poppler; Linux: apt/yum/pacman 安装 poppler-utils"
+            ],
+        }))
+        sys.exit(2)
+
+    results = {p["name"]: [] for p in profiles}
+    counts = {p["name"]: 0 for p in profiles}
+    out_file = open(args.out, "w", encoding="utf-8") if args.out and args.format == "ndjson" else None
+    pipeline_stats = {}
+
+    def emit(name, result):
+        counts[name] += 1
+        if args.format != "ndjson":
+            results[name].append(result)
+            return
+        line = json_line(dict(result, profile=name))
+        print(line, flush=True)
+        if out_file:
+            out_file.write(line + "\n")
+
+    try:
+        pdf_errors = build_profile_results(
+            raw_items=all_items,
+            start_date=start_date,
+            end_date=end_date,
+            profiles=profiles,
+            emit=emit,
+            download_root=args.download_root,
+            timeout=args.timeout,
+            workers=args.workers,
+            progress_interval=args.progress_interval,
+            extract_workers=args.extract_workers,
+            queue_size=args.queue_size,
+            stats=pipeline_stats,
+            retries=args.retries,
+            retry_backoff=args.retry_backoff,
+        )
+    finally:
+        if out_file:
+            out_file.close()
+    errors.extend(pdf_errors)
+
+    output = {
+        "date": date_str,
+        "startDate": start_date,
+        "endDate": end_date,
+        "markets": markets,
+        "profiles": {
+            p["name"]: {
+                "keywordsJson": p["path"],
+                "titleKeywords": p["title_keywords"],
+                "pdfKeywords": p["pdf_keywords"],
+                "titleMatchMode": p["title_match"],
+                "pdfMatchMode": p["pdf_match"],
+                "count": counts[p["name"]],
+                "items": results[p["name"]],
+            }
+            for p in profiles
+        },
+        "errors": errors,
+    }
+    output.update(run_stats)
+    if pipeline_stats:
+        output["pipeline"] = pipeline_stats
+    breakers = breaker_stats()
+    if breakers:
+        output["breakers"] = breakers
+
+    if args.format == "ndjson":
+        for entry in output["profiles"].values():
+            entry.pop("items")
+        sys.stderr.write(json_line({"summary": output}) + "\n")
+        return
+
+    text = json_dumps(output)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+SUBCOMMANDS = {
+    "index": index_main,
+    "search": search_main,
+}
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="Search CNINFO announcements by date/keyword with optional PDF matching.")
     parser.add_argument("--when", choices=["today", "yesterday", "tomorrow"], default="today", help="Relative date.")
     parser.add_argument("--date", default="", help="Absolute date: YYYY-MM-DD. Overrides --when.")
@@ -177,6 +493,7 @@ def main():
     parser.add_argument("--end-date", default="", help="Range end date: YYYY-MM-DD.")
     parser.add_argument("--keyword", default="", help="Keyword used for both title and PDF search.")
     parser.add_argument("--keywords-json", default="", help="Path to keywords JSON config.")
+    parser.add_argument("--profiles", default="", help="Comma-separated keywords JSON files; fetch the listing once and match every profile, output keyed by profile name.")
     parser.add_argument("--title-keywords", "--title-keyword", default="", help="Comma-separated title keywords.")
     parser.add_argument("--pdf-keywords", "--pdf-keyword", default="", help="Comma-separated PDF keywords.")
     parser.add_argument("--title-match", choices=["any", "all"], default=None, help="Title keyword match mode.")
@@ -186,14 +503,27 @@ def main():
     parser.add_argument("--max-pages", type=int, default=0, help="Max pages to query per market (<=0 means all pages).")
     parser.add_argument("--page-workers", type=int, default=6, help="Concurrent page fetch workers (1 means no concurrency).")
     parser.add_argument("--page-sleep", type=float, default=0.2, help="Sleep seconds before each page request.")
+    parser.add_argument("--page-history", default="", help="Pagination history file used to size speculative page windows (default: <download-root>/%s; 'off' disables)." % HISTORY_FILENAME)
     parser.add_argument("--download-root", default=DEFAULT_DOWNLOAD_ROOT, help="PDF download root directory.")
     parser.add_argument("--timeout", type=int, default=20, help="Timeout seconds.")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per page query / PDF download with exponential backoff.")
+    parser.add_argument("--retry-backoff", type=float, default=1.0, help="Base backoff seconds between retries (doubles each attempt).")
+    parser.add_argument("--breaker-threshold", type=int, default=5, help="Consecutive failures per host before all requests to it pause.")
+    parser.add_argument("--breaker-cooldown", type=float, default=30.0, help="Pause seconds when the circuit breaker opens (doubles on repeated trips).")
+    parser.add_argument("--resume", action="store_true", help="Refetch only the pages that failed in the previous run with the same query.")
+    parser.add_argument("--state-file", default="", help="Pagination state file for --resume (default: <download-root>/.resume_state.<query-hash>.json).")
     parser.add_argument("--cookie", default="", help="Optional cookie for cninfo requests.")
     parser.add_argument("--user-agent", default="Mozilla/5.0", help="User-Agent header.")
     parser.add_argument("--skip-pdf", action="store_true", help="Skip PDF download and content search.")
     parser.add_argument("--download-pdf", action="store_true", help="Download PDF even without PDF keywords.")
     parser.add_argument("--server-search", action="store_true", help="Send keyword to server searchkey for server-side filtering.")
-    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent download/parse workers.")
+    parser.add_argument("--pdf-scan", choices=["page", "full"], default="page", help="PDF scan mode: page (stream pages, stop once decided) or full (convert whole PDF first).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent PDF download workers (I/O bound).")
+    parser.add_argument("--extract-workers", type=int, default=0, help="Concurrent pdftotext extraction workers (<=0 means CPU count).")
+    parser.add_argument("--queue-size", type=int, default=0, help="Max downloaded PDFs waiting for extraction (<=0 means 2x extract workers).")
+    parser.add_argument("--store", default="", help="Local announcement metadata store (SQLite); only missing or today's (market, date) partitions are fetched. Use 'default' for <download-root>/%s." % STORE_FILENAME)
+    parser.add_argument("--format", choices=["json", "ndjson"], default="json", help="Output format: json (one document at the end) or ndjson (one item per line as soon as it is ready; summary goes to stderr).")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines on stderr (<=0 disables).")
     parser.add_argument("--out", default="", help="Write JSON output to file.")
 
     args = parser.parse_args()
@@ -202,33 +532,124 @@ def main():
     start_date, end_date = resolve_date_range(args.when, args.date, args.start_date, args.end_date)
     title_keywords, pdf_keywords, title_match_mode, pdf_match_mode = resolve_keywords(args)
     markets = normalize_markets(args.markets)
+    profiles = load_profiles(split_keywords(args.profiles), args.skip_pdf, args.download_pdf) if args.profiles else []
 
     headers = build_headers(args.cookie, args.user_agent)
 
     all_items = []
     errors = []
 
+    # 多组合模式下各组合关键词不同，公告列表需全量拉取
+    if profiles and args.server_search:
+        errors.append("server_search_ignored: --profiles 模式需全量拉取公告列表")
+        args.server_search = False
+
     server_search_keyword = " ".join(title_keywords) if title_keywords else ""
     date_range = f"{start_date}~{end_date}"
 
+    # 分区只有在全量拉取（无服务端过滤、不限页数）时才完整，才可落库复用
+    store = None
+    sync_stats = {}
+    if args.store:
+        if args.server_search or args.max_pages > 0:
+            errors.append("store_ignored: --store 不支持 --server-search 或 --max-pages")
+        else:
+            store_path = str(Path(args.download_root) / STORE_FILENAME) if args.store == "default" else args.store
+            store = AnnouncementStore(store_path)
+
+    history = None
+    if args.page_history != "off":
+        history = PageHistory(args.page_history or str(Path(args.download_root) / HISTORY_FILENAME))
+
+    configure_breakers(args.breaker_threshold, args.breaker_cooldown)
+
+    # 非落库模式下记录各市场失败页，供 --resume 精确补拉
+    signature = query_signature(date_range, server_search_keyword, args.server_search, args.page_size, args.max_pages)
+    state_path = args.state_file or default_state_path(args.download_root, signature)
+    resume_markets = {}
+    if args.resume:
+        if store:
+            errors.append("resume_ignored: 使用 --store 时出错分区会在下次运行自动重拉")
+        else:
+            state = load_state(state_path, signature)
+            if state is None:
+                errors.append(f"resume_state_not_found[{state_path}]: 已按完整查询执行")
+            else:
+                resume_markets = state.get("markets") or {}
+    state_markets = {}
+
     for market in markets:
-        raw_items, errs = fetch_announcements(
-            date_range=date_range,
-            keyword=server_search_keyword,
-            market=market,
-            page_size=args.page_size,
-            max_pages=args.max_pages,
-            headers=headers,
-            timeout=args.timeout,
-            server_search=args.server_search,
-            page_workers=args.page_workers,
-            page_sleep=args.page_sleep,
-        )
+        def fetch_range(market_date_range, market=market, **resume_args):
+            return fetch_announcements(
+                date_range=market_date_range,
+                keyword=server_search_keyword,
+                market=market,
+                page_size=args.page_size,
+                max_pages=args.max_pages,
+                headers=headers,
+                timeout=args.timeout,
+                server_search=args.server_search,
+                page_workers=args.page_workers,
+                page_sleep=args.page_sleep,
+                history=history,
+                retries=args.retries,
+                retry_backoff=args.retry_backoff,
+                **resume_args,
+            )
+
+        if store:
+            raw_items, errs, sync_stats[market] = sync_announcements(store, market, start_date, end_date, fetch_range)
+        else:
+            page_state = {"failedPages": [], "openFrom": 0}
+            prev = resume_markets.get(market)
+            if prev is None or 1 in (prev.get("failedPages") or []):
+                raw_items, errs = fetch_range(date_range, page_state=page_state)
+            elif market_incomplete(prev):
+                raw_items, errs = fetch_range(
+                    date_range,
+                    page_state=page_state,
+                    pages=prev.get("failedPages") or [],
+                    open_from=prev.get("openFrom") or 0,
+                )
+                raw_items = (prev.get("items") or []) + raw_items
+            else:
+                raw_items, errs = prev.get("items") or [], []
+            state_markets[market] = {
+                "items": raw_items,
+                "failedPages": sorted(page_state["failedPages"]),
+                "openFrom": page_state["openFrom"],
+            }
         errors.extend(errs)
         all_items.extend(raw_items)
 
+    if store:
+        store.close()
+    if history:
+        history.save()
+
+    # 有缺失页才保留状态文件，全部成功则清理
+    failed_pages = {m: st["failedPages"] for m, st in state_markets.items() if st["failedPages"]}
+    # 状态文件属于其它查询（--state-file 指定了同一路径）时不覆盖也不删除，保留其未完成的补拉
+    if state_markets and not state_owned(state_path, signature):
+        if any(market_incomplete(st) for st in state_markets.values()):
+            errors.append(f"resume_state_kept[{state_path}]: 状态文件属于其它查询，本次缺失页未记录")
+    elif any(market_incomplete(st) for st in state_markets.values()):
+        save_state(state_path, signature, state_markets)
+    elif state_markets and Path(state_path).exists():
+        Path(state_path).unlink()
+
     all_items = dedupe_announcements(all_items)
 
+    run_stats = {}
+    if sync_stats:
+        run_stats["sync"] = sync_stats
+    if failed_pages:
+        run_stats["failedPages"] = failed_pages
+
+    if profiles:
+        run_profiles(args, profiles, all_items, date_str, start_date, end_date, markets, errors, run_stats)
+        return
+
     if pdf_keywords and args.skip_pdf:
         errors.append("pdf_keywords_provided_but_skip_pdf=true")
 
@@ -252,22 +673,50 @@ def main():
         print(json_dumps(output))
         sys.exit(2)
 
-    results, pdf_errors = build_result_items(
-        raw_items=all_items,
-        start_date=start_date,
-        end_date=end_date,
-        title_keywords=title_keywords,
-        title_match_mode=title_match_mode,
-        pdf_keywords=pdf_keywords,
-        pdf_match_mode=pdf_match_mode,
-        download_root=args.download_root,
-        timeout=args.timeout,
-        download_pdf=download_pdf_flag,
-        workers=args.workers,
-    )
+    pdf_match_only = bool(pdf_keywords and download_pdf_flag)
+    out_file = open(args.out, "w", encoding="utf-8") if args.out and args.format == "ndjson" else None
+    streamed = 0
+    pipeline_stats = {}
+
+    # NDJSON：逐条输出命中结果，不在内存中累积
+    def emit_line(result):
+        nonlocal streamed
+        if pdf_match_only and not result.get("pdfMatch"):
+            return
+        line = json_line(result)
+        print(line, flush=True)
+        if out_file:
+            out_file.write(line + "\n")
+        streamed += 1
+
+    try:
+        results, pdf_errors = build_result_items(
+            raw_items=all_items,
+            start_date=start_date,
+            end_date=end_date,
+            title_keywords=title_keywords,
+            title_match_mode=title_match_mode,
+            pdf_keywords=pdf_keywords,
+            pdf_match_mode=pdf_match_mode,
+            download_root=args.download_root,
+            timeout=args.timeout,
+            download_pdf=download_pdf_flag,
+            workers=args.workers,
+            pdf_scan=args.pdf_scan,
+            on_result=emit_line if args.format == "ndjson" else None,
+            progress_interval=args.progress_interval,
+            extract_workers=args.extract_workers,
+            queue_size=args.queue_size,
+            stats=pipeline_stats,
+            retries=args.retries,
+            retry_backoff=args.retry_backoff,
+        )
+    finally:
+        if out_file:
+            out_file.close()
     errors.extend(pdf_errors)
 
-    if pdf_keywords and download_pdf_flag:
+    if pdf_match_only:
         results = [r for r in results if r.get("pdfMatch")]
 
     output = {
@@ -279,10 +728,21 @@ def main():
         "titleMatchMode": title_match_mode,
         "pdfMatchMode": pdf_match_mode,
         "markets": markets,
-        "count": len(results),
+        "count": streamed if args.format == "ndjson" else len(results),
         "items": results,
         "errors": errors,
     }
+    output.update(run_stats)
+    if pipeline_stats:
+        output["pipeline"] = pipeline_stats
+    breakers = breaker_stats()
+    if breakers:
+        output["breakers"] = breakers
+
+    if args.format == "ndjson":
+        output.pop("items")
+        sys.stderr.write(json_line({"summary": output}) + "\n")
+        return
 
     text = json_dumps(output)
 
@@ -2,14 +2,20 @@
 
 import json
 import math
+import os
+import random
+import sys
+import threading
 import time
+import urllib.error
 import urllib.parse
 import urllib.request
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
-CNINFO_QUERY_URL = "https://www.cninfo.com.cn/new/hisAnnouncement/query"
-CNINFO_PDF_BASE = "https://static.cninfo.com.cn/"
+# 可通过环境变量指向本地回放服务（见 replay_server.py）
+CNINFO_QUERY_URL = os.environ.get("CNINFO_QUERY_URL", "https://www.cninfo.com.cn/new/hisAnnouncement/query")
+CNINFO_PDF_BASE = os.environ.get("CNINFO_PDF_BASE", "https://static.cninfo.com.cn/")
 
 MARKET_MAP = {
     "sz": "szse",
@@ -62,6 +68,163 @@ def build_headers(cookie: str, user_agent: str):
     return headers
 
 
+# 精简公告记录：入库时只保留 build_result_items 用到的字段
+# announcementId 为十进制数字且转换后能原样还原（无前导零）时存为 int（去重直接用整数），否则保留原字符串；证券代码/简称做字符串驻留
+
+class Announcement:
+    __slots__ = ("announcement_id", "sec_code", "sec_name", "title", "adjunct_url", "announcement_time")
+
+    def __init__(self, announcement_id, sec_code: str, sec_name: str, title: str, adjunct_url: str, announcement_time):
+        self.announcement_id = announcement_id
+        self.sec_code = sec_code
+        self.sec_name = sec_name
+        self.title = title
+        self.adjunct_url = adjunct_url
+        self.announcement_time = announcement_time
+
+    @classmethod
+    def from_raw(cls, raw: dict):
+        aid = raw.get("announcementId")
+        if aid is None:
+            aid = ""
+        elif not isinstance(aid, int):
+            aid = str(aid)
+            if aid.isdecimal() and str(int(aid)) == aid:
+                aid = int(aid)
+        return cls(
+            aid,
+            sys.intern(str(raw.get("secCode") or raw.get("secid") or "")),
+            sys.intern(str(raw.get("secName") or raw.get("secname") or "")),
+            raw.get("announcementTitle") or "",
+            raw.get("adjunctUrl") or "",
+            raw.get("announcementTime") or raw.get("publishTime"),
+        )
+
+    def to_raw(self):
+        return {
+            "announcementId": self.announcement_id,
+            "secCode": self.sec_code,
+            "secName": self.sec_name,
+            "announcementTitle": self.title,
+            "adjunctUrl": self.adjunct_url,
+            "announcementTime": self.announcement_time,
+        }
+
+
+# 熔断最长冷却时间（秒）
+MAX_BREAKER_COOLDOWN = 300.0
+
+
+# 按主机的熔断器：连续失败达到阈值后打开，冷却期内所有请求线程统一暂停
+# 冷却后仍失败则冷却时间翻倍，成功一次即恢复
+
+class CircuitBreaker:
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.consecutive_trips = 0
+        self.trips = 0
+        self.paused_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self.lock:
+                remaining = self.open_until - time.time()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+            with self.lock:
+                self.paused_seconds += remaining
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.consecutive_trips = 0
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            now = time.time()
+            if self.failures < self.threshold or now < self.open_until:
+                return
+            self.failures = 0
+            self.consecutive_trips += 1
+            self.trips += 1
+            cooldown = min(self.cooldown * (2 ** (self.consecutive_trips - 1)), MAX_BREAKER_COOLDOWN)
+            self.open_until = now + cooldown
+
+    def stats(self):
+        with self.lock:
+            return {"trips": self.trips, "pausedSeconds": round(self.paused_seconds, 3)}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_breaker_settings = {"threshold": 5, "cooldown": 30.0}
+
+
+# 配置熔断参数（对之后创建的熔断器生效）
+
+def configure_breakers(threshold: int, cooldown: float):
+    with _breakers_lock:
+        _breaker_settings["threshold"] = threshold
+        _breaker_settings["cooldown"] = cooldown
+        _breakers.clear()
+
+
+# 获取 URL 所属主机的熔断器
+
+def get_breaker(url: str):
+    host = urllib.parse.urlsplit(url).netloc
+    with _breakers_lock:
+        breaker = _breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(_breaker_settings["threshold"], _breaker_settings["cooldown"])
+            _breakers[host] = breaker
+        return breaker
+
+
+# 各主机熔断统计
+
+def breaker_stats():
+    with _breakers_lock:
+        items = list(_breakers.items())
+    return {host: b.stats() for host, b in items if b.trips}
+
+
+# 判断异常是否值得重试（限流/服务端错误/网络错误/非 JSON 响应）
+
+def is_retryable(exc: Exception):
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code in (403, 429) or exc.code >= 500
+    return True
+
+
+# 带指数退避重试与熔断的调用
+
+def call_with_retry(url: str, fn, retries: int = 0, backoff: float = 1.0):
+    breaker = get_breaker(url)
+    attempt = 0
+    while True:
+        breaker.wait()
+        try:
+            result = fn()
+        except Exception as exc:
+            if not is_retryable(exc):
+                raise
+            breaker.failure()
+            if attempt >= retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+            attempt += 1
+            continue
+        breaker.success()
+        return result
+
+
 # 发起查询请求
 
 def post_query(params: dict, headers: dict, timeout: int):
@@ -76,6 +239,8 @@ def post_query(params: dict, headers: dict, timeout: int):
 
 
 # 拉取公告列表（支持分页 + 可并发）
+# page_state（可选 dict）回填 failedPages（重试后仍失败的页码）与 openFrom（整窗失败后未探明的起始页）
+# pages / open_from 用于 --resume：仅补拉指定页，并从 open_from 起继续探测后续页
 
 def fetch_announcements(
     date_range: str,
@@ -88,9 +253,20 @@ def fetch_announcements(
     server_search: bool,
     page_workers: int = 1,
     page_sleep: float = 0.2,
+    history=None,
+    retries: int = 0,
+    retry_backoff: float = 1.0,
+    page_state=None,
+    pages=None,
+    open_from: int = 0,
 ):
     items = []
     errors = []
+    failed_pages = []
+    history_key = history.key(market, date_range, keyword if server_search else "") if history else ""
+    if page_state is not None:
+        page_state["failedPages"] = failed_pages
+        page_state["openFrom"] = 0
 
     def build_params(page_num: int):
         return {
@@ -111,15 +287,22 @@ def fetch_announcements(
         }
 
     def extract_announcements(data: dict):
-        return data.get("announcements") or data.get("announcement") or []
+        raw = data.get("announcements") or data.get("announcement") or []
+        return [Announcement.from_raw(a) for a in raw]
 
     def fetch_page(page_num: int, sleep_first: bool = True):
         if sleep_first and page_sleep > 0:
             time.sleep(page_sleep)
         params = build_params(page_num)
         try:
-            data = post_query(params, headers, timeout)
+            data = call_with_retry(
+                CNINFO_QUERY_URL,
+                lambda: post_query(params, headers, timeout),
+                retries,
+                retry_backoff,
+            )
         except Exception as exc:
+            failed_pages.append(page_num)
             return None, f"query_failed[{market}][page={page_num}]: {exc}"
         return data, None
 
@@ -134,27 +317,91 @@ def fetch_announcements(
             return None
         return int(math.ceil(total_records / float(page_size)))
 
-    first_data, err = fetch_page(1, sleep_first=False)
-    if err:
-        errors.append(err)
-        return items, errors
-
-    first_items = extract_announcements(first_data or {})
-    if not first_items:
-        return items, errors
+    # 总数缺失：按窗口并发预取后续页，遇到首个不满页即停止
+    # 窗口大小与「满页」阈值参考历史页数与服务端实际单页上限
+    def fetch_until_short(executor, next_page: int, page_cap: int, window: int, max_seen: int):
+        unlimited = max_pages <= 0
+        last_page = next_page - 1
+        finished = False
+        while not finished:
+            if not unlimited and next_page > max_pages:
+                break
+            end_page = next_page + window - 1
+            if not unlimited:
+                end_page = min(end_page, max_pages)
+            page_nums = list(range(next_page, end_page + 1))
+            next_page = end_page + 1
+            window = max(1, page_workers)
+
+            failed = 0
+            for page_num, (data, err) in zip(page_nums, executor.map(lambda p: fetch_page(p, True), page_nums)):
+                if err:
+                    errors.append(err)
+                    failed += 1
+                    continue
+                announcements = extract_announcements(data or {})
+                if announcements:
+                    items.extend(announcements)
+                    last_page = max(last_page, page_num)
+                if len(announcements) < page_cap:
+                    finished = True
+                else:
+                    # 只有满页才能说明服务端单页上限，末尾的不满页不计入
+                    max_seen = max(max_seen, len(announcements))
+            # 整个窗口失败时无法判断是否还有后续页：记录起点供 --resume 继续
+            if failed == len(page_nums):
+                if page_state is not None:
+                    page_state["openFrom"] = next_page
+                return
+
+        if history and finished:
+            history.record(history_key, last_page, max_seen or None)
+
+    page_cap = page_size
+    window = max(1, page_workers)
+    if history:
+        expected_pages, learned_cap = history.suggest(history_key)
+        if learned_cap:
+            page_cap = min(page_size, learned_cap)
+        if expected_pages and page_workers > 1:
+            window = max(1, min(int(math.ceil(expected_pages)) - 1, window * 4))
+    page_cap = max(1, page_cap)
+
+    with ThreadPoolExecutor(max_workers=max(1, page_workers)) as executor:
+        # 仅补拉指定页（--resume）
+        if pages or open_from:
+            for data, err in executor.map(lambda p: fetch_page(p, True), sorted(pages or [])):
+                if err:
+                    errors.append(err)
+                    continue
+                items.extend(extract_announcements(data or {}))
+            if open_from:
+                fetch_until_short(executor, open_from, page_cap, max(1, page_workers), 0)
+            return items, errors
 
-    items.extend(first_items)
+        first_data, err = fetch_page(1, sleep_first=False)
+        if err:
+            errors.append(err)
+            return items, errors
 
-    total_pages = get_total_pages(first_data or {})
-    if total_pages is not None:
-        if max_pages > 0:
-            total_pages = min(total_pages, max_pages)
-        if total_pages <= 1:
+        first_items = extract_announcements(first_data or {})
+        if not first_items:
             return items, errors
 
-        page_nums = list(range(2, total_pages + 1))
-        if page_workers and page_workers > 1 and len(page_nums) > 1:
-            with ThreadPoolExecutor(max_workers=page_workers) as executor:
+        items.extend(first_items)
+
+        total_pages = get_total_pages(first_data or {})
+        if total_pages is not None:
+            if history:
+                # 只有一页时首页可能不满，不能当作单页上限
+                history.record(history_key, total_pages, len(first_items) if total_pages > 1 else None)
+            if max_pages > 0:
+                total_pages = min(total_pages, max_pages)
+            if total_pages <= 1:
+                return items, errors
+
+            page_nums = list(range(2, total_pages + 1))
+            if page_workers and page_workers > 1 and len(page_nums) > 1:
                 futures = {executor.submit(fetch_page, p, True): p for p in page_nums}
                 for fut in as_completed(futures):
                     data, err = fut.result()
@@ -164,34 +411,21 @@ def fetch_announcements(
                     announcements = extract_announcements(data or {})
                     if announcements:
                         items.extend(announcements)
-        else:
-            for page_num in page_nums:
-                data, err = fetch_page(page_num, True)
-                if err:
-                    errors.append(err)
-                    break
-                announcements = extract_announcements(data or {})
-                if not announcements:
-                    break
-                items.extend(announcements)
-        return items, errors
+            else:
+                for page_num in page_nums:
+                    data, err = fetch_page(page_num, True)
+                    if err:
+                        errors.append(err)
+                        continue
+                    announcements = extract_announcements(data or {})
+                    if not announcements:
+                        break
+                    items.extend(announcements)
+            return items, errors
 
-    page_num = 2
-    unlimited = max_pages <= 0
-    while True:
-        if not unlimited and page_num > max_pages:
-            break
-        data, err = fetch_page(page_num, True)
-        if err:
-            errors.append(err)
-            break
-        announcements = extract_announcements(data or {})
-        if not announcements:
-            break
-        items.extend(announcements)
-        if len(announcements) < page_size:
-            break
-        page_num += 1
+        if len(first_items) < page_cap:
+            return items, errors
+        fetch_until_short(executor, 2, page_cap, window, len(first_items))
 
     return items, errors
 
@@ -208,16 +442,22 @@ def build_pdf_url(adjunct_url: str, announcement_id: str):
     return ""
 
 
-# 下载 PDF 到指定目录
+# 下载 PDF 到指定目录（先写临时文件，完整后再改名，避免半截文件被复用）
 
-def download_pdf(pdf_url: str, out_dir, filename: str, timeout: int):
+def download_pdf(pdf_url: str, out_dir, filename: str, timeout: int, retries: int = 0, retry_backoff: float = 1.0):
     if not pdf_url:
         return ""
     out_dir.mkdir(parents=True, exist_ok=True)
     out_path = out_dir / filename
-    req = urllib.request.Request(pdf_url, headers={"User-Agent": "Mozilla/5.0"})
-    with urllib.request.urlopen(req, timeout=timeout) as resp, open(out_path, "wb") as f:
-        f.write(resp.read())
+    part_path = out_dir / f"{filename}.part"
+
+    def fetch():
+        req = urllib.request.Request(pdf_url, headers={"User-Agent": "Mozilla/5.0"})
+        with urllib.request.urlopen(req, timeout=timeout) as resp, open(part_path, "wb") as f:
+            f.write(resp.read())
+
+    call_with_retry(pdf_url, fetch, retries, retry_backoff)
+    os.replace(part_path, out_path)
     return str(out_path)
 
 
@@ -237,22 +477,26 @@ def format_publish_time(raw):
     return str(raw)
 
 
-# 公告去重
+# 发布时间换算为毫秒时间戳（秒/毫秒判定与 format_publish_time 一致）；非数值返回 None
+
+def publish_time_ms(raw):
+    if not isinstance(raw, (int, float)):
+        return None
+    try:
+        ts = int(raw)
+    except (ValueError, OverflowError):
+        return None
+    return ts if ts > 10_000_000_000 else ts * 1000
+
+
+# 公告去重（有 announcementId 的按 id，缺失时按代码/标题/链接/时间组合）
 
 def dedupe_announcements(items):
     uniq = {}
     for a in items:
-        aid = str(a.get("announcementId", "")) if a.get("announcementId") is not None else ""
-        if aid:
-            if aid not in uniq:
-                uniq[aid] = a
-            continue
-        key = (
-            str(a.get("secCode", "")),
-            str(a.get("announcementTitle", "")),
-            str(a.get("adjunctUrl", "")),
-            str(a.get("announcementTime", "")),
-        )
+        key = a.announcement_id
+        if key == "":
+            key = (a.sec_code, a.title, a.adjunct_url, str(a.announcement_time))
         if key not in uniq:
             uniq[key] = a
     return list(uniq.values())
@@ -2,6 +2,14 @@
 
 import datetime as _dt
 
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+# 条目数达到该值且装有 NumPy 时，时间戳区间判定走向量化路径
+NUMPY_MIN_ITEMS = 50_000
+
 
 # 解析相对/绝对日期
 
@@ -43,3 +51,37 @@ def in_date_range(date_str: str, start_date: str, end_date: str):
     except Exception:
         return False
     return s <= d <= e
+
+
+# 日期范围换算为本地时区毫秒时间戳的半开区间 [开始日 0 点, 结束日次日 0 点)；日期非法返回 None
+
+def date_range_ms(start_date: str, end_date: str):
+    try:
+        s = _dt.datetime.strptime(start_date, "%Y-%m-%d")
+        e = _dt.datetime.strptime(end_date, "%Y-%m-%d") + _dt.timedelta(days=1)
+    except Exception:
+        return None
+    return int(s.timestamp()) * 1000, int(e.timestamp()) * 1000
+
+
+# 批量判定毫秒时间戳是否落在 [lo, hi) 内，返回布尔列表
+
+def ms_in_range(stamps, lo: int, hi: int):
+    if _np is not None and len(stamps) >= NUMPY_MIN_ITEMS:
+        try:
+            arr = _np.fromiter(stamps, dtype=_np.int64, count=len(stamps))
+        except OverflowError:
+            pass
+        else:
+            return ((arr >= lo) & (arr < hi)).tolist()
+    return [lo <= ts < hi for ts in stamps]
+
+
+# 逐日遍历日期范围（含首尾）
+
+def iter_dates(start_date: str, end_date: str):
+    d = _dt.datetime.strptime(start_date, "%Y-%m-%d").date()
+    e = _dt.datetime.strptime(end_date, "%Y-%m-%d").date()
+    while d <= e:
+        yield d.strftime("%Y-%m-%d")
+        d += _dt.timedelta(days=1)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from pdf_search import iter_pdf_pages
+
+INDEX_FILENAME = ".fulltext_index.sqlite3"
+# FTS rowid = 文档 id * PAGE_ROWID_BASE + 页码，按文档删除时只需范围删除
+PAGE_ROWID_BASE = 100_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    publish_date TEXT NOT NULL,
+    announcement_id TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    pages INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS page_fts USING fts5(body, tokenize = 'unicode61');
+"""
+
+
+# 判断是否为中日韩文字
+
+def is_cjk(ch: str):
+    code = ord(ch)
+    return (
+        0x4E00 <= code <= 0x9FFF
+        or 0x3400 <= code <= 0x4DBF
+        or 0xF900 <= code <= 0xFAFF
+        or 0x20000 <= code <= 0x2FFFF
+    )
+
+
+# 按字符类型切分连续片段：("cjk" | "word", 片段)
+
+def split_runs(text: str):
+    runs = []
+    buf = []
+    kind = ""
+    for ch in text:
+        if is_cjk(ch):
+            cur = "cjk"
+        elif ch.isalnum():
+            cur = "word"
+        else:
+            cur = ""
+        if cur != kind and buf:
+            runs.append((kind, "".join(buf)))
+            buf = []
+        kind = cur
+        if cur:
+            buf.append(ch)
+    if buf:
+        runs.append((kind, "".join(buf)))
+    return runs
+
+
+# 文档分词：中文二元组 + 片段末字单字，英文/数字按词小写
+# 末字单字保证任意单字都能以「前缀」命中
+
+def tokenize_document(text: str):
+    tokens = []
+    for kind, run in split_runs(text):
+        if kind == "word":
+            tokens.append(run.lower())
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        tokens.append(run[-1])
+    return tokens
+
+
+# 关键词转 FTS5 查询：二元组短语；末尾单个汉字用前缀匹配
+
+def build_match_query(keyword: str):
+    runs = split_runs(keyword)
+    if not runs:
+        return ""
+    tokens = []
+    for kind, run in runs:
+        if kind == "word":
+            tokens.append(run.lower())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    phrase = '"' + " ".join(tokens) + '"'
+    last_kind, last_run = runs[-1]
+    if last_kind == "cjk" and len(last_run) == 1:
+        phrase += " *"
+    return phrase
+
+
+# 打开（必要时创建）索引库
+
+def open_index(index_path: str):
+    Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(index_path)
+    try:
+        conn.executescript(SCHEMA)
+    except sqlite3.OperationalError as exc:
+        conn.close()
+        raise RuntimeError(f"sqlite_fts5_unavailable: {exc}")
+    return conn
+
+
+# 遍历下载目录中的 PDF：<download_root>/<date>/<file>.pdf
+
+def iter_downloaded_pdfs(download_root: str):
+    root = Path(download_root)
+    if not root.is_dir():
+        return
+    for date_dir in sorted(root.iterdir()):
+        if not date_dir.is_dir() or date_dir.name.startswith("."):
+            continue
+        for pdf_path in sorted(date_dir.iterdir()):
+            if pdf_path.is_file() and pdf_path.suffix.lower() == ".pdf":
+                yield date_dir.name, pdf_path
+
+
+# 提取单个 PDF 的分页分词结果
+
+def extract_page_tokens(pdf_path: str):
+    pages = []
+    for page_num, page_text in iter_pdf_pages(pdf_path):
+        if page_num >= PAGE_ROWID_BASE:
+            break
+        tokens = tokenize_document(page_text)
+        if tokens:
+            pages.append((page_num, " ".join(tokens)))
+    return pages
+
+
+# 删除文档及其分页索引
+
+def delete_doc(conn, doc_id: int):
+    conn.execute(
+        "DELETE FROM page_fts WHERE rowid >= ? AND rowid < ?",
+        (doc_id * PAGE_ROWID_BASE, (doc_id + 1) * PAGE_ROWID_BASE),
+    )
+    conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+
+
+# 增量构建索引：新增/变更文件重新提取，已删除文件移出索引
+
+def build_index(download_root: str, index_path: str, workers: int = 4):
+    started = time.time()
+    conn = open_index(index_path)
+    stats = {"scanned": 0, "indexed": 0, "unchanged": 0, "removed": 0, "failed": 0}
+    errors = []
+    try:
+        known = {
+            row[1]: (row[0], row[2], row[3])
+            for row in conn.execute("SELECT id, path, size, mtime FROM docs")
+        }
+        todo = []
+        seen = set()
+        for publish_date, pdf_path in iter_downloaded_pdfs(download_root):
+            stats["scanned"] += 1
+            path = str(pdf_path)
+            seen.add(path)
+            st = pdf_path.stat()
+            if st.st_size <= 0:
+                continue
+            prev = known.get(path)
+            if prev and prev[1] == st.st_size and prev[2] == st.st_mtime:
+                stats["unchanged"] += 1
+                continue
+            todo.append((path, publish_date, pdf_path.stem, st.st_size, st.st_mtime))
+
+        for path, (doc_id, _, _) in known.items():
+            if path not in seen:
+                delete_doc(conn, doc_id)
+                stats["removed"] += 1
+        conn.commit()
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(extract_page_tokens, job[0]): job for job in todo}
+            for fut in as_completed(futures):
+                path, publish_date, announcement_id, size, mtime = futures[fut]
+                try:
+                    pages = fut.result()
+                except Exception as exc:
+                    stats["failed"] += 1
+                    errors.append(f"index_failed[{path}]: {exc}")
+                    continue
+                prev = known.get(path)
+                if prev:
+                    delete_doc(conn, prev[0])
+                cur = conn.execute(
+                    "INSERT INTO docs (path, publish_date, announcement_id, size, mtime, pages, indexed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (path, publish_date, announcement_id, size, mtime, len(pages), time.time()),
+                )
+                doc_id = cur.lastrowid
+                conn.executemany(
+                    "INSERT INTO page_fts (rowid, body) VALUES (?, ?)",
+                    [(doc_id * PAGE_ROWID_BASE + page_num, body) for page_num, body in pages],
+                )
+                conn.commit()
+                stats["indexed"] += 1
+        total = conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+    finally:
+        conn.close()
+
+    stats["totalDocs"] = total
+    stats["elapsedMs"] = int((time.time() - started) * 1000)
+    return stats, errors
+
+
+# 在索引中检索关键词，返回命中公告及各关键词命中页码
+
+def search_index(index_path: str, keywords, match_mode: str, start_date: str = "", end_date: str = "", limit: int = 0):
+    keywords = [k for k in dict.fromkeys(keywords) if build_match_query(k)]
+    conn = open_index(index_path)
+    try:
+        doc_hits = {}
+        for k in keywords:
+            query = build_match_query(k)
+            for (rowid,) in conn.execute("SELECT rowid FROM page_fts WHERE page_fts MATCH ?", (query,)):
+                doc_id, page_num = divmod(rowid, PAGE_ROWID_BASE)
+                doc_hits.setdefault(doc_id, {}).setdefault(k, []).append(page_num)
+
+        if match_mode == "all":
+            doc_hits = {d: h for d, h in doc_hits.items() if len(h) == len(keywords)}
+
+        results = []
+        for doc_id, hits in doc_hits.items():
+            row = conn.execute(
+                "SELECT path, publish_date, announcement_id, pages FROM docs WHERE id = ?",
+                (doc_id,),
+            ).fetchone()
+            if not row:
+                continue
+            path, publish_date, announcement_id, pages = row
+            if start_date and publish_date < start_date:
+                continue
+            if end_date and publish_date > end_date:
+                continue
+            results.append({
+                "announcementId": announcement_id,
+                "publishDate": publish_date,
+                "pdfLocalPath": path,
+                "pages": pages,
+                "hitPages": {k: sorted(v) for k, v in hits.items()},
+            })
+    finally:
+        conn.close()
+
+    results.sort(key=lambda r: (r["publishDate"], r["announcementId"]), reverse=True)
+    if limit > 0:
+        results = results[:limit]
+    return results
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import datetime as _dt
+import json
+import threading
+from pathlib import Path
+
+HISTORY_FILENAME = ".page_history.json"
+# 日期跨度分桶（天）
+SPAN_BUCKETS = (1, 7, 31, 92, 366)
+# 页数的指数滑动平均权重
+EWMA_ALPHA = 0.3
+
+
+# 计算 seDate（YYYY-MM-DD~YYYY-MM-DD）对应的跨度分桶
+
+def span_bucket(date_range: str):
+    try:
+        start, end = [p.strip() for p in date_range.split("~", 1)]
+        days = (
+            _dt.datetime.strptime(end, "%Y-%m-%d").date()
+            - _dt.datetime.strptime(start, "%Y-%m-%d").date()
+        ).days + 1
+    except Exception:
+        return "unknown"
+    for bucket in SPAN_BUCKETS:
+        if days <= bucket:
+            return str(bucket)
+    return "long"
+
+
+# 分页历史：按 (市场, 日期跨度, 是否服务端检索) 记录典型页数与服务端实际单页上限
+
+class PageHistory:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            if isinstance(loaded, dict):
+                self.data = loaded
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def key(market: str, date_range: str, searchkey: str):
+        return f"{market}|{span_bucket(date_range)}|{'search' if searchkey else 'all'}"
+
+    def suggest(self, key: str):
+        with self.lock:
+            entry = self.data.get(key) or {}
+        return entry.get("pages"), entry.get("pageCap")
+
+    # page_cap 为 None 表示本次没有见到确定的满页（只有一页或只有不满页），不更新单页上限
+    def record(self, key: str, pages: int, page_cap=None):
+        with self.lock:
+            entry = self.data.get(key)
+            if entry:
+                entry["pages"] = round(EWMA_ALPHA * pages + (1 - EWMA_ALPHA) * entry["pages"], 2)
+                if page_cap:
+                    entry["pageCap"] = max(entry.get("pageCap") or 0, page_cap)
+                entry["runs"] = entry.get("runs", 0) + 1
+            else:
+                self.data[key] = {"pages": float(pages), "pageCap": page_cap, "runs": 1}
+
+    def save(self):
+        with self.lock:
+            text = json.dumps(self.data, ensure_ascii=False, indent=2, sort_keys=True)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        Path(self.path).write_text(text, encoding="utf-8")
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+# 单个阶段的吞吐统计（线程安全）
+
+class StageStats:
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.processed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool):
+        with self.lock:
+            now = time.time()
+            if self.started is None:
+                self.started = now - seconds
+            self.finished = now
+            self.processed += 1
+            if not ok:
+                self.failed += 1
+            self.busy_seconds += seconds
+
+    def to_dict(self):
+        wall = (self.finished - self.started) if self.started is not None else 0.0
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "busySeconds": round(self.busy_seconds, 3),
+            "wallSeconds": round(wall, 3),
+            "throughputPerSec": round(self.processed / wall, 2) if wall > 0 else 0.0,
+            "utilization": round(self.busy_seconds / (wall * self.workers), 3) if wall > 0 else 0.0,
+        }
+
+
+# 两阶段 PDF 流水线：下载线程池（I/O）→ 有界队列 → 提取线程池（按 CPU 核数）
+# download_fn(job) -> (下载结果, 错误)；extract_fn(job, 下载结果) -> (提取结果, 错误)
+# 在调用线程中逐个产出 (job, 下载结果, 提取结果, 错误)，队列满时下载线程阻塞形成背压
+
+class PdfPipeline:
+    def __init__(self, download_fn, extract_fn, download_workers: int, extract_workers: int, queue_size: int):
+        self.download_fn = download_fn
+        self.extract_fn = extract_fn
+        self.download_workers = max(1, download_workers)
+        self.extract_workers = max(1, extract_workers)
+        self.queue_size = max(1, queue_size)
+        self.download_stats = StageStats("download", self.download_workers)
+        self.extract_stats = StageStats("extract", self.extract_workers)
+
+    def stats(self):
+        return {
+            "queueSize": self.queue_size,
+            "download": self.download_stats.to_dict(),
+            "extract": self.extract_stats.to_dict(),
+        }
+
+    def run(self, jobs):
+        job_iter = iter(jobs)
+        job_lock = threading.Lock()
+        extract_q = queue.Queue(maxsize=self.queue_size)
+        result_q = queue.Queue(maxsize=self.queue_size)
+
+        def download_worker():
+            while True:
+                with job_lock:
+                    job = next(job_iter, _DONE)
+                if job is _DONE:
+                    return
+                t0 = time.time()
+                try:
+                    downloaded, err = self.download_fn(job)
+                except Exception as exc:
+                    downloaded, err = None, str(exc)
+                self.download_stats.record(time.time() - t0, not err)
+                if err:
+                    result_q.put((job, downloaded, None, err))
+                else:
+                    extract_q.put((job, downloaded))
+
+        def extract_worker():
+            while True:
+                entry = extract_q.get()
+                if entry is _DONE:
+                    result_q.put(_DONE)
+                    return
+                job, downloaded = entry
+                t0 = time.time()
+                try:
+                    extracted, err = self.extract_fn(job, downloaded)
+                except Exception as exc:
+                    extracted, err = None, str(exc)
+                self.extract_stats.record(time.time() - t0, not err)
+                result_q.put((job, downloaded, extracted, err))
+
+        downloaders = [threading.Thread(target=download_worker, daemon=True) for _ in range(self.download_workers)]
+        extractors = [threading.Thread(target=extract_worker, daemon=True) for _ in range(self.extract_workers)]
+
+        def close_extract_queue():
+            for t in downloaders:
+                t.join()
+            for _ in extractors:
+                extract_q.put(_DONE)
+
+        for t in downloaders + extractors:
+            t.start()
+        threading.Thread(target=close_extract_queue, daemon=True).start()
+
+        remaining = len(extractors)
+        while remaining:
+            entry = result_q.get()
+            if entry is _DONE:
+                remaining -= 1
+                continue
+            yield entry
@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 
+import codecs
 import shutil
 import subprocess
 
+PDFTOTEXT_CMD = ["pdftotext", "-layout", "-enc", "UTF-8"]
+READ_CHUNK_SIZE = 64 * 1024
+PAGE_BREAK = "\f"
+
 
 # 检查 pdftotext 是否可用
 
@@ -17,7 +22,7 @@ def extract_text_pdftotext(pdf_path: str):
         return None
     try:
         result = subprocess.run(
-            ["pdftotext", "-layout", "-enc", "UTF-8", pdf_path, "-"],
+            PDFTOTEXT_CMD + [pdf_path, "-"],
             check=False,
             capture_output=True,
             text=True,
@@ -29,6 +34,44 @@ def extract_text_pdftotext(pdf_path: str):
     return result.stdout or ""
 
 
+# 流式读取 pdftotext 输出，按页（\f 分隔）逐页产出 (页码, 文本)
+# 生成器提前关闭时会终止 pdftotext 进程；转换失败时抛出 RuntimeError
+
+def iter_pdf_pages(pdf_path: str):
+    if not has_pdftotext():
+        raise RuntimeError("pdftotext_not_found")
+    proc = subprocess.Popen(
+        PDFTOTEXT_CMD + [pdf_path, "-"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    page_num = 1
+    pending = ""
+    finished = False
+    try:
+        while True:
+            chunk = proc.stdout.read1(READ_CHUNK_SIZE)
+            pending += decoder.decode(chunk, final=not chunk)
+            pages = pending.split(PAGE_BREAK)
+            pending = pages.pop()
+            for page_text in pages:
+                yield page_num, page_text
+                page_num += 1
+            if not chunk:
+                break
+        if proc.wait() != 0:
+            raise RuntimeError(f"pdftotext_failed[code={proc.returncode}]")
+        finished = True
+        if pending.strip():
+            yield page_num, pending
+    finally:
+        if not finished and proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+
+
 # 文本关键词匹配
 
 def match_keywords_in_text(text: str, keywords, match_mode: str):
@@ -40,6 +83,41 @@ def match_keywords_in_text(text: str, keywords, match_mode: str):
     return any(hits)
 
 
+# 逐页扫描 PDF，匹配结果确定后立即停止
+# stop_when(已命中页码) 可自定义提前停止条件（多组合共享扫描时使用）
+# 返回 (是否命中, {关键词: 首次命中页码})
+
+def scan_pdf_keywords(pdf_path: str, keywords, match_mode: str, stop_when=None):
+    if not keywords:
+        return True, {}
+    pending = list(dict.fromkeys(keywords))
+    # 保留上一页末尾，避免跨页关键词漏检
+    overlap = max(len(k) for k in pending) - 1
+    hit_pages = {}
+    tail = ""
+    pages = iter_pdf_pages(pdf_path)
+    try:
+        for page_num, page_text in pages:
+            window = tail + page_text
+            for k in list(pending):
+                if k in window:
+                    hit_pages[k] = page_num
+                    pending.remove(k)
+            if not pending:
+                break
+            if stop_when is not None:
+                if stop_when(hit_pages):
+                    break
+            elif match_mode != "all" and hit_pages:
+                break
+            tail = page_text[-overlap:] if overlap > 0 else ""
+    finally:
+        pages.close()
+    if match_mode == "all":
+        return not pending, hit_pages
+    return bool(hit_pages), hit_pages
+
+
 # PDF 关键词匹配（必须使用 pdftotext）
 
 def pdf_contains_keywords(pdf_path: str, keywords, match_mode: str):
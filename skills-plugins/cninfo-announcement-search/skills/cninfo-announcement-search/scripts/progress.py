@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import threading
+import time
+
+
+# 周期性向 stderr 输出处理进度（线程安全）
+
+class ProgressReporter:
+    def __init__(self, label: str, total: int, interval: float = 5.0, stream=None):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.done = 0
+        self.matched = 0
+        self.errors = 0
+        self.started = time.time()
+        self.last_report = self.started
+        self.lock = threading.Lock()
+
+    def update(self, matched: bool = False, error: bool = False):
+        with self.lock:
+            self.done += 1
+            if matched:
+                self.matched += 1
+            if error:
+                self.errors += 1
+            now = time.time()
+            if self.interval > 0 and now - self.last_report >= self.interval:
+                self.last_report = now
+                self._write(now)
+
+    def finish(self):
+        with self.lock:
+            if self.interval > 0:
+                self._write(time.time())
+
+    def _write(self, now: float):
+        elapsed = max(now - self.started, 1e-6)
+        pct = (self.done * 100.0 / self.total) if self.total else 100.0
+        self.stream.write(
+            f"[progress] {self.label} {self.done}/{self.total} ({pct:.1f}%) "
+            f"{self.done / elapsed:.1f}/s matched={self.matched} errors={self.errors} "
+            f"elapsed={elapsed:.1f}s\n"
+        )
+        self.stream.flush()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import datetime as _dt
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from date_utils import iter_dates
+
+# 固定目录结构：
+#   <fixtures>/query/<column>/<seDate>.json  该市场、该日期范围的完整公告列表 {"announcements": [...]}
+#   <fixtures>/pdf/<adjunctUrl>              公告 PDF
+QUERY_PATH = "/new/hisAnnouncement/query"
+STATS_PATH = "/__stats"
+
+
+# 请求统计：各类请求数、错误数、并发峰值（线程安全）
+
+class ReplayStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def enter(self, kind: str):
+        with self.lock:
+            c = self.counters.setdefault(kind, {"requests": 0, "errors": 0, "inFlight": 0, "peakConcurrency": 0})
+            c["requests"] += 1
+            c["inFlight"] += 1
+            c["peakConcurrency"] = max(c["peakConcurrency"], c["inFlight"])
+
+    def leave(self, kind: str, error: bool):
+        with self.lock:
+            c = self.counters[kind]
+            c["inFlight"] -= 1
+            if error:
+                c["errors"] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {k: {kk: vv for kk, vv in v.items() if kk != "inFlight"} for k, v in self.counters.items()}
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+
+
+# 从固定目录回放 cninfo 查询与 PDF，可注入延迟与错误
+# 公告列表按请求的 pageNum/pageSize 现场分页，searchkey 按标题子串过滤
+
+class ReplayServer:
+    def __init__(self, fixtures: str, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, error_status: int = 503, omit_totals: bool = False, seed: int = 0):
+        self.fixtures = Path(fixtures)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.omit_totals = omit_totals
+        self.stats = ReplayStats()
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.listings = {}
+        self.listings_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def query_url(self):
+        return self.base_url + QUERY_PATH
+
+    @property
+    def pdf_base(self):
+        return self.base_url + "/pdf/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def _delay_and_fail(self):
+        with self.rng_lock:
+            delay = self.latency_ms + (self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0)
+            fail = self.error_rate > 0 and self.rng.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        return fail
+
+    def _listing(self, column: str, se_date: str):
+        key = (column, se_date)
+        with self.listings_lock:
+            if key in self.listings:
+                return self.listings[key]
+        path = self.fixtures / "query" / column / f"{se_date}.json"
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            listing = data.get("announcements") or []
+        else:
+            listing = self._listing_from_days(column, se_date)
+        with self.listings_lock:
+            self.listings[key] = listing
+        return listing
+
+    # 范围查询没有整段录制时，按单日录制拼接
+    def _listing_from_days(self, column: str, se_date: str):
+        try:
+            start, end = se_date.split("~", 1)
+            days = list(iter_dates(start, end))
+        except ValueError:
+            return []
+        listing = []
+        for day in days:
+            path = self.fixtures / "query" / column / f"{day}~{day}.json"
+            if path.exists():
+                listing.extend(json.loads(path.read_text(encoding="utf-8")).get("announcements") or [])
+        return listing
+
+    def _query(self, params: dict):
+        column = params.get("column", "")
+        se_date = params.get("seDate", "")
+        searchkey = params.get("searchkey", "").strip()
+        page_num = max(1, int(params.get("pageNum") or 1))
+        page_size = max(1, int(params.get("pageSize") or 30))
+        listing = self._listing(column, se_date)
+        if searchkey:
+            words = searchkey.split()
+            listing = [a for a in listing if any(w in (a.get("announcementTitle") or "") for w in words)]
+        page = listing[(page_num - 1) * page_size:page_num * page_size]
+        body = {"announcements": page or None, "hasMore": page_num * page_size < len(listing)}
+        if not self.omit_totals:
+            body["totalAnnouncement"] = len(listing)
+            body["totalRecordNum"] = len(listing)
+        return body
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if urllib.parse.urlsplit(self.path).path != QUERY_PATH:
+                    self._send(404, b"not found", "text/plain")
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                params = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode("utf-8"), keep_blank_values=True))
+                server.stats.enter("query")
+                error = True
+                try:
+                    if server._delay_and_fail():
+                        self._send(server.error_status, b"injected error", "text/plain")
+                        return
+                    body = json.dumps(server._query(params), ensure_ascii=False).encode("utf-8")
+                    self._send(200, body, "application/json;charset=UTF-8")
+                    error = False
+                finally:
+                    server.stats.leave("query", error)
+
+            def do_GET(self):
+                path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+                if path == STATS_PATH:
+                    self._send(200, json.dumps(server.stats.snapshot()).encode("utf-8"), "application/json")
+                    return
+                if not path.startswith("/pdf/"):
+                    self._send(404, b"not found", "text/plain")
+                    return
+                pdf_root = (server.fixtures / "pdf").resolve()
+                target = (pdf_root / path[len("/pdf/"):]).resolve()
+                server.stats.enter("pdf")
+                error = True
+                try:
+                    if server._delay_and_fail():
+                        self._send(server.error_status, b"injected error", "text/plain")
+                        return
+                    if pdf_root not in target.parents or not target.is_file():
+                        self._send(404, b"not found", "text/plain")
+                        return
+                    self._send(200, target.read_bytes(), "application/pdf")
+                    error = False
+                finally:
+                    server.stats.leave("pdf", error)
+
+        return Handler
+
+
+# 生成只含 ASCII 文本的最小多页 PDF（pdftotext 可解析）
+
+def make_text_pdf(pages):
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        safe = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 12 Tf 72 720 Td ({safe}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {content_id} 0 R /Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+SYNTH_TITLES = ["关于回购公司股份的进展公告", "股权激励计划草案", "年度报告", "董事会决议公告", "关于重大诉讼的公告", "股东大会通知"]
+
+
+# 生成合成回放数据：每个市场每天 per_day 条公告，match_ratio 比例的 PDF 含关键词
+
+def synthesize_fixtures(out_dir: str, start_date: str, end_date: str, markets, per_day: int, pages_per_pdf: int, match_ratio: float, keyword: str = "buyback", seed: int = 0):
+    rng = random.Random(seed)
+    root = Path(out_dir)
+    n = 0
+    for market in markets:
+        for day in iter_dates(start_date, end_date):
+            base_ms = int(time.mktime(_dt.datetime.strptime(day, "%Y-%m-%d").timetuple()) * 1000)
+            items = []
+            for i in range(per_day):
+                n += 1
+                aid = str(1300000000 + n)
+                code = f"{rng.randint(1, 3999):06d}"
+                adjunct = f"finalpage/{day}/{aid}.PDF"
+                items.append({
+                    "secCode": code,
+                    "secName": f"合成{code[-3:]}",
+                    "announcementId": aid,
+                    "announcementTitle": rng.choice(SYNTH_TITLES),
+                    "announcementTime": base_ms + 9 * 3600 * 1000 + i * 1000,
+                    "adjunctUrl": adjunct,
+                    "adjunctType": "PDF",
+                })
+                pages = [f"{market} {aid} page {p} filler text" for p in range(1, pages_per_pdf + 1)]
+                if rng.random() < match_ratio:
+                    hit = rng.randint(0, pages_per_pdf - 1)
+                    pages[hit] += f" {keyword} plan"
+                pdf_path = root / "pdf" / adjunct
+                pdf_path.parent.mkdir(parents=True, exist_ok=True)
+                pdf_path.write_bytes(make_text_pdf(pages))
+            query_path = root / "query" / market / f"{day}~{day}.json"
+            query_path.parent.mkdir(parents=True, exist_ok=True)
+            query_path.write_text(json.dumps({"announcements": items}, ensure_ascii=False), encoding="utf-8")
+    return n
+
+
+# 从线上录制回放数据（公告列表按单日保存，可选下载前 max_pdfs 份 PDF）
+
+def record_fixtures(out_dir: str, start_date: str, end_date: str, markets, max_pdfs: int, timeout: int, page_sleep: float):
+    from cninfo_client import build_headers, build_pdf_url, download_pdf, fetch_announcements
+
+    root = Path(out_dir)
+    headers = build_headers("", "Mozilla/5.0")
+    errors = []
+    pdfs = 0
+    for market in markets:
+        for day in iter_dates(start_date, end_date):
+            items, errs = fetch_announcements(f"{day}~{day}", "", market, 30, 0, headers, timeout, False, page_workers=1, page_sleep=page_sleep)
+            errors.extend(errs)
+            raw = [a.to_raw() for a in items]
+            query_path = root / "query" / market / f"{day}~{day}.json"
+            query_path.parent.mkdir(parents=True, exist_ok=True)
+            query_path.write_text(json.dumps({"announcements": raw}, ensure_ascii=False), encoding="utf-8")
+            for a in items:
+                if pdfs >= max_pdfs or not a.adjunct_url:
+                    continue
+                target = root / "pdf" / a.adjunct_url.lstrip("/")
+                try:
+                    download_pdf(build_pdf_url(a.adjunct_url, str(a.announcement_id)), target.parent, target.name, timeout)
+                    pdfs += 1
+                except Exception as exc:
+                    errors.append(f"pdf_failed[{a.announcement_id}]: {exc}")
+    return pdfs, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline replay server for cninfo query pages and PDFs.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Serve fixtures over HTTP.")
+    serve.add_argument("--fixtures", required=True, help="Fixture directory.")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency-ms", type=float, default=0, help="Added latency per request.")
+    serve.add_argument("--jitter-ms", type=float, default=0, help="Uniform latency jitter (+/-).")
+    serve.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with --error-status.")
+    serve.add_argument("--error-status", type=int, default=503)
+    serve.add_argument("--omit-totals", action="store_true", help="Leave out total counts to exercise speculative paging.")
+
+    synth = sub.add_parser("synth", help="Generate synthetic fixtures.")
+    synth.add_argument("--out", required=True)
+    synth.add_argument("--start-date", required=True)
+    synth.add_argument("--end-date", required=True)
+    synth.add_argument("--markets", default="szse,sse,bse")
+    synth.add_argument("--per-day", type=int, default=100, help="Announcements per market per day.")
+    synth.add_argument("--pdf-pages", type=int, default=20, help="Pages per synthetic PDF.")
+    synth.add_argument("--match-ratio", type=float, default=0.2, help="Fraction of PDFs containing the keyword.")
+    synth.add_argument("--keyword", default="buyback")
+
+    record = sub.add_parser("record", help="Record fixtures from the live site.")
+    record.add_argument("--out", required=True)
+    record.add_argument("--start-date", required=True)
+    record.add_argument("--end-date", required=True)
+    record.add_argument("--markets", default="szse,sse,bse")
+    record.add_argument("--max-pdfs", type=int, default=50)
+    record.add_argument("--timeout", type=int, default=20)
+    record.add_argument("--page-sleep", type=float, default=0.5)
+
+    args = parser.parse_args()
+    if args.command == "synth":
+        count = synthesize_fixtures(args.out, args.start_date, args.end_date, args.markets.split(","), args.per_day, args.pdf_pages, args.match_ratio, args.keyword)
+        print(json.dumps({"fixtures": args.out, "announcements": count}))
+    elif args.command == "record":
+        pdfs, errors = record_fixtures(args.out, args.start_date, args.end_date, args.markets.split(","), args.max_pdfs, args.timeout, args.page_sleep)
+        print(json.dumps({"fixtures": args.out, "pdfs": pdfs, "errors": errors}, ensure_ascii=False, indent=2))
+    else:
+        server = ReplayServer(args.fixtures, args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.omit_totals)
+        print(f"CNINFO_QUERY_URL={server.query_url} CNINFO_PDF_BASE={server.pdf_base}", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
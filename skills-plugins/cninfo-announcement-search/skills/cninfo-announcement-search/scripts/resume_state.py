@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from cninfo_client import Announcement
+
+STATE_FILENAME = ".resume_state.json"
+
+
+# 查询签名：只有签名一致的状态文件才能用于 --resume
+
+def query_signature(date_range: str, keyword: str, server_search: bool, page_size: int, max_pages: int):
+    return {
+        "dateRange": date_range,
+        "keyword": keyword if server_search else "",
+        "serverSearch": server_search,
+        "pageSize": page_size,
+        "maxPages": max_pages,
+    }
+
+
+# 默认状态文件按查询签名区分：<download-root>/.resume_state.<签名摘要>.json，不同查询互不覆盖
+
+def default_state_path(download_root: str, signature: dict):
+    digest = hashlib.sha1(json.dumps(signature, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    stem, suffix = os.path.splitext(STATE_FILENAME)
+    return str(Path(download_root) / f"{stem}.{digest}{suffix}")
+
+
+# 状态文件是否可由当前查询覆盖或删除：不存在、已损坏或签名一致
+
+def state_owned(path: str, signature: dict):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return True
+    return not isinstance(state, dict) or state.get("query") == signature
+
+
+# 读取上次运行的分页状态；不存在或签名不一致返回 None
+
+def load_state(path: str, signature: dict):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or state.get("query") != signature:
+        return None
+    for market_state in (state.get("markets") or {}).values():
+        market_state["items"] = [Announcement.from_raw(a) for a in market_state.get("items") or []]
+    return state
+
+
+# 原子写入分页状态：各市场已拉取的公告、失败页与未探明的起始页
+
+def save_state(path: str, signature: dict, markets: dict):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    payload = {
+        market: dict(market_state, items=[a.to_raw() for a in market_state.get("items") or []])
+        for market, market_state in markets.items()
+    }
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"query": signature, "markets": payload}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# 某市场是否还有缺失页
+
+def market_incomplete(market_state: dict):
+    return bool(market_state.get("failedPages") or market_state.get("openFrom"))
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Markdown 渲染基准。
+用合成消息对比逐条 datetime.fromtimestamp(...).strftime 与 MessageClock 分桶缓存的耗时,
+并校验两者输出的 Markdown 完全一致。不调用 lark-cli。
+"""
+
+import argparse
+import io
+import json
+import random
+import sys
+import time
+from datetime import datetime
+
+from fetch_chat_messages import MarkdownWriter, messages_to_markdown
+from time_buckets import MessageClock, parse_utc_offset
+
+
+class StrftimeClock:
+    """逐条调用 datetime 格式化的参照实现(与 MessageClock 接口一致)。"""
+
+    def __init__(self, utc_offset=None):
+        self.tzinfo = MessageClock(utc_offset).tzinfo
+
+    def parts(self, timestamp: int) -> tuple[str, str]:
+        return (
+            datetime.fromtimestamp(timestamp, self.tzinfo).strftime("%Y-%m-%d"),
+            datetime.fromtimestamp(timestamp, self.tzinfo).strftime("%H:%M"),
+        )
+
+    def date(self, timestamp: int) -> str:
+        return self.parts(timestamp)[0]
+
+    def format(self, timestamp: int) -> str:
+        return datetime.fromtimestamp(timestamp, self.tzinfo).strftime("%Y-%m-%d %H:%M")
+
+
+def synthesize_messages(count: int, start_time: int, seconds: int, seed: int = 0) -> list[dict]:
+    """生成按时间倒序排列的合成文本消息(与接口返回顺序一致)。"""
+    rng = random.Random(seed)
+    times = sorted((start_time + rng.randrange(seconds) for _ in range(count)), reverse=True)
+    return [
+        {
+            "message_id": f"om_{i}",
+            "msg_type": "text",
+            "create_time": ts,
+            "sender": {"id": f"ou_{i % 50}", "name": f"用户{i % 50:02d}"},
+            "body": {"content": json.dumps({"text": f"消息 {i}"}, ensure_ascii=False)},
+        }
+        for i, ts in enumerate(times)
+    ]
+
+
+def render(messages: list[dict], clock, streaming: bool) -> tuple[str, float]:
+    """渲染一次,返回 (Markdown, 耗时秒)。"""
+    start_time = messages[-1]["create_time"]
+    end_time = messages[0]["create_time"]
+    started = time.perf_counter()
+    if streaming:
+        buf = io.StringIO()
+        writer = MarkdownWriter(buf, "基准群", "基准", start_time, end_time, clock=clock)
+        for msg in reversed(messages):
+            writer.write_message(msg)
+        writer.close()
+        text = buf.getvalue()
+    else:
+        text = messages_to_markdown("基准群", messages, "基准", start_time, end_time, clock=clock)
+    return text, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Markdown 渲染基准(合成消息)")
+    parser.add_argument("--messages", type=int, default=100000, help="合成消息数")
+    parser.add_argument("--days", type=float, default=30, help="消息分布的天数")
+    parser.add_argument("--utc-offset", help="时区偏移(如 +08:00),默认使用系统本地时区")
+    parser.add_argument("--repeat", type=int, default=3, help="每种实现重复次数(取最快一次)")
+    args = parser.parse_args()
+
+    utc_offset = parse_utc_offset(args.utc_offset) if args.utc_offset else None
+    seconds = max(1, int(args.days * 86400))
+    messages = synthesize_messages(args.messages, int(time.time()) - seconds, seconds)
+
+    report = {"messages": args.messages, "days": args.days, "utcOffset": utc_offset}
+    for mode, streaming in (("streaming", True), ("messagesToMarkdown", False)):
+        baseline, fast = [], []
+        for _ in range(args.repeat):
+            baseline.append(render(messages, StrftimeClock(utc_offset), streaming))
+            fast.append(render(messages, MessageClock(utc_offset), streaming))
+        identical = baseline[0][0] == fast[0][0]
+        strftime_seconds = min(t for _, t in baseline)
+        clock_seconds = min(t for _, t in fast)
+        report[mode] = {
+            "strftimeSeconds": round(strftime_seconds, 3),
+            "clockSeconds": round(clock_seconds, 3),
+            "speedup": round(strftime_seconds / clock_seconds, 2) if clock_seconds else 0,
+            "identical": identical,
+        }
+        if not identical:
+            print(f"错误: {mode} 输出不一致", file=sys.stderr)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not all(report[mode]["identical"] for mode in ("streaming", "messagesToMarkdown")):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
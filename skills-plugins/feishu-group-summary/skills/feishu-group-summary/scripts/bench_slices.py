@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+分片拉取基准与一致性校验。
+用进程内的合成消息接口(可设每页延迟)对比不分片与 --slices 分片拉取的耗时,
+并在接口正序/倒序、有无 --max-messages 截断的组合下校验两者产出的消息完全一致。不调用 lark-cli。
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+import fetch_chat_messages
+from fetch_chat_messages import iter_chat_messages
+
+
+class SyntheticHistory:
+    """模拟 get-message-history 的分页接口(与 run_lark_cli 调用方式一致)。"""
+
+    def __init__(self, count: int, start_time: int, step: int, ascending: bool, page_size: int, latency: float):
+        self.start_time = start_time
+        self.step = step
+        self.count = count
+        self.ascending = ascending
+        self.page_size = page_size
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, args: list, want_json: bool = False, verbose: bool = False) -> dict:
+        def opt(name: str, default: str) -> str:
+            return args[args.index(name) + 1] if name in args else default
+
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        start, end = int(opt("--start-time", "0")), int(opt("--end-time", str(1 << 62)))
+        # 每两条消息共用一个时间戳,子区间边界上会出现同一秒的消息
+        index = [i for i in range(self.count) if start <= self.start_time + (i // 2) * self.step <= end]
+        if not self.ascending:
+            index.reverse()
+        offset = int(opt("--page-token", "0") or 0)
+        page = index[offset:offset + self.page_size]
+        more = offset + self.page_size < len(index)
+        return {
+            "items": [
+                {"message_id": f"om_{i}", "create_time": self.start_time + (i // 2) * self.step, "msg_type": "text"}
+                for i in page
+            ],
+            "has_more": more,
+            "page_token": str(offset + self.page_size) if more else "",
+        }
+
+
+def fetch_ids(history: SyntheticHistory, start_time: int, end_time: int, max_messages: int, slices: int):
+    """拉取一次,返回 (message_id 列表, 耗时秒, 接口调用次数)。"""
+    fetch_chat_messages.run_lark_cli = history
+    history.calls = 0
+    started = time.perf_counter()
+    ids = [msg["message_id"] for msg in iter_chat_messages("oc_bench", start_time, end_time, max_messages, slices=slices)]
+    return ids, time.perf_counter() - started, history.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片拉取基准与一致性校验(合成消息)")
+    parser.add_argument("--messages", type=int, default=3000, help="合成消息数")
+    parser.add_argument("--slices", type=int, default=4, help="分片数")
+    parser.add_argument("--page-size", type=int, default=50, help="每页消息数")
+    parser.add_argument("--latency-ms", type=float, default=20, help="每页接口延迟(毫秒)")
+    args = parser.parse_args()
+
+    start_time, step = 1767225600, 60
+    end_time = start_time + (args.messages // 2 + 1) * step
+    caps = sorted({args.messages * 2, args.messages, args.messages // 2, args.messages // 5, 1})
+    report = {"messages": args.messages, "slices": args.slices, "cases": []}
+    ok = True
+    for ascending in (True, False):
+        history = SyntheticHistory(
+            args.messages, start_time, step, ascending, args.page_size, args.latency_ms / 1000
+        )
+        for cap in caps:
+            plain, plain_seconds, plain_calls = fetch_ids(history, start_time, end_time, cap, 1)
+            sliced, sliced_seconds, sliced_calls = fetch_ids(history, start_time, end_time, cap, args.slices)
+            identical = plain == sliced
+            ok = ok and identical
+            report["cases"].append({
+                "order": "asc" if ascending else "desc",
+                "maxMessages": cap,
+                "returned": len(plain),
+                "plainSeconds": round(plain_seconds, 3),
+                "slicedSeconds": round(sliced_seconds, 3),
+                "plainCalls": plain_calls,
+                "slicedCalls": sliced_calls,
+                "identical": identical,
+            })
+            if not identical:
+                print(f"错误: {'正序' if ascending else '倒序'} max_messages={cap} 分片结果与不分片不一致", file=sys.stderr)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,35 @@
 """
 
 import argparse
+import io
+import itertools
+import json
+import os
+import re
+import shutil
+import struct
 import sys
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Iterable, Iterator, Optional, TextIO
 
 from lark_cli import run_lark_cli
+from message_store import DEFAULT_ARCHIVE_PATH, MessageStore, plan_sync
+from thread_index import DEFAULT_THREAD_COLLAPSE, ThreadIndex, thread_date
+from time_buckets import LOCAL_CLOCK, MessageClock, parse_utc_offset
+from transcript_chunker import DEFAULT_CHUNK_TOKENS, MANIFEST_FILENAME, TranscriptChunker
+from user_resolver import DEFAULT_USER_CACHE_PATH, DEFAULT_USER_CACHE_TTL, UserResolver
+
+# 从本地归档读取时,每批预解析用户名的消息数
+RESOLVE_BATCH_SIZE = 500
+
+# 归档同步区间的上界至少落后当前时间的秒数,避免接口尚未可见的消息被视为已同步
+ARCHIVE_SETTLE_SECONDS = 60
+
+_NUMBER_RE = re.compile(r'(\d+)')
+_DATE_RANGE_RE = re.compile(r'(\d{4}-\d{2}-\d{2})[至到](\d{4}-\d{2}-\d{2})')
 
 
 def search_chats(query: str, page_size: int = 20) -> list[dict]:
@@ -27,7 +51,10 @@ def search_chats(query: str, page_size: int = 20) -> list[dict]:
     return data.get("items", [])
 
 
-def parse_time_range(description: str) -> tuple[Optional[int], Optional[int]]:
+def parse_time_range(
+    description: str,
+    clock: MessageClock = LOCAL_CLOCK,
+) -> tuple[Optional[int], Optional[int]]:
     """解析时间范围描述为时间戳。
 
     支持格式:
@@ -38,17 +65,18 @@ def parse_time_range(description: str) -> tuple[Optional[int], Optional[int]]:
 
     Args:
         description: 时间范围描述
+        clock: 时区("上周"、日期区间等按该时区的自然日计算)
 
     Returns:
         (start_time, end_time) 元组,秒级时间戳
     """
-    now = datetime.now()
+    tz = clock.tzinfo
+    now = datetime.now(tz)
     description = description.strip().lower()
 
     # 近N天
     if "近" in description or "最近" in description or "天内" in description:
-        import re
-        match = re.search(r'(\d+)', description)
+        match = _NUMBER_RE.search(description)
         if match:
             days = int(match.group(1))
             start = now - timedelta(days=days)
@@ -56,8 +84,7 @@ def parse_time_range(description: str) -> tuple[Optional[int], Optional[int]]:
 
     # 近N周
     if "周" in description:
-        import re
-        match = re.search(r'(\d+)', description)
+        match = _NUMBER_RE.search(description)
         if match:
             weeks = int(match.group(1))
             start = now - timedelta(weeks=weeks)
@@ -81,12 +108,11 @@ def parse_time_range(description: str) -> tuple[Optional[int], Optional[int]]:
 
     # YYYY-MM-DD至YYYY-MM-DD
     if "至" in description or "到" in description:
-        import re
-        match = re.search(r'(\d{4}-\d{2}-\d{2})[至到](\d{4}-\d{2}-\d{2})', description)
+        match = _DATE_RANGE_RE.search(description)
         if match:
             start_str, end_str = match.groups()
-            start_dt = datetime.fromisoformat(start_str)
-            end_dt = datetime.fromisoformat(end_str)
+            start_dt = datetime.fromisoformat(start_str).replace(tzinfo=tz)
+            end_dt = datetime.fromisoformat(end_str).replace(tzinfo=tz)
             end_dt = end_dt.replace(hour=23, minute=59, second=59)
             return int(start_dt.timestamp()), int(end_dt.timestamp())
 
@@ -95,25 +121,26 @@ def parse_time_range(description: str) -> tuple[Optional[int], Optional[int]]:
     return int(start.timestamp()), int(now.timestamp())
 
 
-def format_timestamp(timestamp: int) -> str:
+def format_timestamp(timestamp: int, clock: MessageClock = LOCAL_CLOCK) -> str:
     """格式化时间戳为可读字符串。
 
     Args:
         timestamp: 秒级时间戳
+        clock: 时区换算器,默认系统本地时区
 
     Returns:
         格式化的时间字符串,如 "2026-01-21 14:30"
     """
-    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+    return clock.format(timestamp)
 
 
-def get_messages(
+def iter_message_pages(
     chat_id: str,
     start_time: Optional[int] = None,
     end_time: Optional[int] = None,
     max_messages: int = 10000,
-) -> list[dict]:
-    """获取群聊历史消息(自动处理分页)。
+) -> Iterator[list[dict]]:
+    """逐页拉取群聊历史消息(生成器,每拉到一页立即产出)。
 
     Args:
         chat_id: 群聊ID
@@ -121,11 +148,11 @@ def get_messages(
         end_time: 结束时间(秒级时间戳)
         max_messages: 最大消息数,默认10000
 
-    Returns:
-        消息列表,按时间倒序排列
+    Yields:
+        每页的消息列表(保持接口返回顺序),累计不超过 max_messages 条
     """
-    all_messages = []
     page_token = None
+    remaining = max_messages
 
     args = ["get-message-history", "--container-id-type", "chat", "--container-id", chat_id]
 
@@ -134,7 +161,7 @@ def get_messages(
     if end_time:
         args.extend(["--end-time", str(end_time)])
 
-    while len(all_messages) < max_messages:
+    while remaining > 0:
         current_args = args.copy()
         if page_token:
             current_args.extend(["--page-token", page_token])
@@ -145,21 +172,361 @@ def get_messages(
         if not items:
             break
 
-        all_messages.extend(items)
+        page = items[:remaining]
+        remaining -= len(page)
+        yield page
 
         if not data.get("has_more"):
             break
 
         page_token = data.get("page_token")
 
-    return all_messages[:max_messages]
+
+def _create_time(msg: dict) -> int:
+    """读取消息的 create_time(秒级时间戳)。"""
+    return int(msg.get("create_time") or 0)
+
+
+def _spool_write(spool, msg: dict):
+    """将消息追加到临时文件,记录前后各附 8 字节长度,便于正向与反向读取。"""
+    record = json.dumps(msg, ensure_ascii=False).encode("utf-8")
+    size = struct.pack(">Q", len(record))
+    spool.write(size)
+    spool.write(record)
+    spool.write(size)
+
+
+def _spool_read(spool, reverse: bool = False) -> Iterator[dict]:
+    """从临时文件逐条读出消息(reverse=True 时从尾部反向读)。"""
+    if not reverse:
+        spool.seek(0)
+        while True:
+            head = spool.read(8)
+            if not head:
+                return
+            (size,) = struct.unpack(">Q", head)
+            record = spool.read(size)
+            spool.seek(8, os.SEEK_CUR)
+            yield json.loads(record.decode("utf-8"))
+
+    pos = spool.seek(0, os.SEEK_END)
+    while pos > 0:
+        spool.seek(pos - 8)
+        (size,) = struct.unpack(">Q", spool.read(8))
+        pos -= size + 16
+        spool.seek(pos + 8)
+        yield json.loads(spool.read(size).decode("utf-8"))
+
+
+def _batched(iterable: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    """按固定大小分批。"""
+    it = iter(iterable)
+    while True:
+        batch = list(itertools.islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def split_time_range(start_time: int, end_time: int, slices: int) -> list[tuple[int, int]]:
+    """将 [start_time, end_time] 均分为最多 slices 个子区间。
+
+    相邻子区间共享边界秒(接口起止时间均包含端点),边界上的重复消息由调用方按 message_id 去重。
+    """
+    slices = max(1, min(slices, end_time - start_time))
+    step = (end_time - start_time) / slices
+    bounds = [start_time + round(step * i) for i in range(slices)] + [end_time]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _fetch_slice(
+    chat_id: str,
+    start_time: int,
+    end_time: int,
+    max_messages: int,
+    resolver: Optional[UserResolver],
+):
+    """拉取一个子区间的全部分页,写入临时文件。
+
+    Returns:
+        (临时文件, 消息数, 是否正序),消息时间全部相同(或不足两条)无法判断顺序时为 None
+    """
+    spool = tempfile.TemporaryFile()
+    count = 0
+    first_ts = last_ts = None
+    try:
+        for page in iter_message_pages(chat_id, start_time, end_time, max_messages):
+            if resolver is not None:
+                resolver.prefetch(page)
+            for msg in page:
+                _spool_write(spool, msg)
+                last_ts = _create_time(msg)
+                if first_ts is None:
+                    first_ts = last_ts
+            count += len(page)
+    except BaseException:
+        spool.close()
+        raise
+    if first_ts is None or last_ts == first_ts:
+        return spool, count, None
+    return spool, count, last_ts > first_ts
+
+
+def fetch_time_slices(
+    chat_id: str,
+    start_time: int,
+    end_time: int,
+    slices: int,
+    max_messages: int = 10000,
+    resolver: Optional[UserResolver] = None,
+) -> list[Future]:
+    """将时间范围切成多个子区间并发分页拉取,每个子区间各自维护 page-token 链。
+
+    Returns:
+        按时间先后排列的 Future 列表,结果为 (临时文件, 消息数, 是否正序)
+    """
+    ranges = split_time_range(start_time, end_time, slices)
+    pool = ThreadPoolExecutor(max_workers=len(ranges))
+    futures = [
+        pool.submit(_fetch_slice, chat_id, range_start, range_end, max_messages, resolver)
+        for range_start, range_end in ranges
+    ]
+    pool.shutdown(wait=False)
+    return futures
+
+
+def _slice_results(futures: list[Future]) -> list[tuple]:
+    """等待全部子区间完成;任一失败时关闭已完成的临时文件并抛出异常。"""
+    results = []
+    try:
+        for future in futures:
+            results.append(future.result())
+    except BaseException:
+        for spool, _, _ in results:
+            spool.close()
+        for future in futures:
+            if future.done() and not future.exception():
+                future.result()[0].close()
+        raise
+    return results
+
+
+def _iter_slice_spools(results: list[tuple]) -> Iterator[dict]:
+    """按时间先后依次读出各子区间的消息(正序),并按 message_id 去重。
+
+    子区间互不重叠(仅共享边界秒),依次读出即为全局正序;
+    重复消息只可能出现在同一秒内,去重集合只保留当前这一秒的 message_id。
+    """
+    current_ts = None
+    seen = set()
+    for spool, _, ascending in results:
+        # 无法判断顺序时按倒序处理,与 iter_in_time_order 一致
+        for msg in _spool_read(spool, reverse=not ascending):
+            ts = _create_time(msg)
+            if ts != current_ts:
+                current_ts = ts
+                seen.clear()
+            message_id = msg.get("message_id")
+            if message_id:
+                if message_id in seen:
+                    continue
+                seen.add(message_id)
+            yield msg
+
+
+def iter_messages_sliced(
+    chat_id: str,
+    start_time: int,
+    end_time: int,
+    slices: int,
+    max_messages: int = 10000,
+    resolver: Optional[UserResolver] = None,
+) -> Iterator[dict]:
+    """分片并发拉取,按时间正序合并产出,并按 message_id 去重。
+
+    超过 max_messages 时与不分片拉取的结果一致,保留接口顺序中最先返回的 max_messages 条:
+    接口正序时为最早的若干条,倒序时为最新的若干条。各子区间同样按接口顺序截断,
+    被截掉的部分不会进入结果。倒序时需要全部子区间完成后先数一遍去重后的条数。
+    截断时若所有子区间都无法判断接口顺序(如 max_messages 极小),改为不分片重新拉取。
+    """
+    results = _slice_results(fetch_time_slices(chat_id, start_time, end_time, slices, max_messages, resolver))
+    orders = {ascending for _, _, ascending in results if ascending is not None}
+    try:
+        if sum(count for _, count, _ in results) <= max_messages:
+            yield from _iter_slice_spools(results)
+        elif True in orders:
+            yield from itertools.islice(_iter_slice_spools(results), max_messages)
+        elif False in orders:
+            skip = max(0, sum(1 for _ in _iter_slice_spools(results)) - max_messages)
+            yield from itertools.islice(_iter_slice_spools(results), skip, None)
+    finally:
+        for spool, _, _ in results:
+            spool.close()
+    if not orders and sum(count for _, count, _ in results) > max_messages:
+        pages = _prefetch_users(iter_message_pages(chat_id, start_time, end_time, max_messages), resolver)
+        yield from iter_in_time_order(msg for page in pages for msg in page)
+
+
+def sync_messages(
+    store: MessageStore,
+    chat_id: str,
+    start_time: int,
+    end_time: int,
+    max_messages: int = 10000,
+    slices: int = 1,
+) -> dict:
+    """将时间范围内归档缺失的消息从接口补拉到本地归档。
+
+    只拉取已同步区间之外的部分(通常只是上次同步之后的新消息);
+    某段拉取触达 max_messages 上限时不更新同步区间,下次会重新拉取。
+
+    Args:
+        store: 本地消息归档
+        chat_id: 群聊ID
+        start_time: 起始时间(秒级时间戳)
+        end_time: 结束时间(秒级时间戳)
+        max_messages: 每段最大拉取消息数
+        slices: 每段再切分为多少个子区间并发拉取
+
+    Returns:
+        {"fetched": 接口拉取条数, "ranges": 补拉的时间段列表}
+    """
+    ranges, (low, high) = plan_sync(store.coverage(chat_id), start_time, end_time)
+    high = min(high, int(time.time()) - ARCHIVE_SETTLE_SECONDS)
+
+    fetched = 0
+    complete = True
+    for range_start, range_end in ranges:
+        if slices > 1:
+            futures = fetch_time_slices(chat_id, range_start, range_end, slices, max_messages)
+            for spool, count, _ in _slice_results(futures):
+                with spool:
+                    for batch in _batched(_spool_read(spool), RESOLVE_BATCH_SIZE):
+                        store.upsert(chat_id, batch)
+                fetched += count
+                if count >= max_messages:
+                    complete = False
+            continue
+
+        count = 0
+        for page in iter_message_pages(chat_id, range_start, range_end, max_messages):
+            store.upsert(chat_id, page)
+            count += len(page)
+        fetched += count
+        if count >= max_messages:
+            complete = False
+
+    if complete and low <= high:
+        store.set_coverage(chat_id, low, high)
+    return {"fetched": fetched, "ranges": ranges}
+
+
+def get_messages(
+    chat_id: str,
+    start_time: Optional[int] = None,
+    end_time: Optional[int] = None,
+    max_messages: int = 10000,
+    store: Optional[MessageStore] = None,
+) -> list[dict]:
+    """获取群聊历史消息(自动处理分页)。
+
+    Args:
+        chat_id: 群聊ID
+        start_time: 起始时间(秒级时间戳)
+        end_time: 结束时间(秒级时间戳)
+        max_messages: 最大消息数,默认10000
+        store: 本地消息归档(可选);提供且给定起止时间时只从接口补拉缺失部分,其余从归档读取
+
+    Returns:
+        消息列表,按时间倒序排列
+    """
+    if store is not None and start_time and end_time:
+        sync_messages(store, chat_id, start_time, end_time, max_messages)
+        messages = list(store.iter_messages(chat_id, start_time, end_time, limit=max_messages))
+        messages.reverse()
+        return messages
+
+    pages = iter_message_pages(chat_id, start_time, end_time, max_messages)
+    return [msg for page in pages for msg in page]
+
+
+def _prefetch_users(batches: Iterable[list[dict]], resolver: Optional[UserResolver]) -> Iterator[list[dict]]:
+    """每批消息产出前先批量解析其中的发送者与 @提及 用户名。"""
+    for batch in batches:
+        if resolver is not None:
+            resolver.prefetch(batch)
+        yield batch
+
+
+def iter_chat_messages(
+    chat_id: str,
+    start_time: int,
+    end_time: int,
+    max_messages: int = 10000,
+    store: Optional[MessageStore] = None,
+    resolver: Optional[UserResolver] = None,
+    slices: int = 1,
+) -> Iterator[dict]:
+    """按时间正序产出群聊消息。
+
+    提供 store 时从本地归档读取(调用方需先 sync_messages);slices > 1 时分片并发拉取;
+    否则边拉取边产出。提供 resolver 时每页(归档读取时每批)消息产出前先批量解析用户名。
+    """
+    if store is not None:
+        batches = _batched(store.iter_messages(chat_id, start_time, end_time, limit=max_messages), RESOLVE_BATCH_SIZE)
+        return (msg for batch in _prefetch_users(batches, resolver) for msg in batch)
+    if slices > 1:
+        return iter_messages_sliced(chat_id, start_time, end_time, slices, max_messages, resolver)
+    pages = _prefetch_users(iter_message_pages(chat_id, start_time, end_time, max_messages), resolver)
+    return iter_in_time_order(msg for page in pages for msg in page)
+
+
+def iter_in_time_order(messages: Iterable[dict]) -> Iterator[dict]:
+    """将接口返回的消息流转为按时间正序产出。
+
+    根据最先出现的两个不同 create_time 判断接口顺序:
+    - 正序: 直接透传,拉到即产出
+    - 倒序: 逐条写入临时文件,结束后从文件尾部反向读出;内存占用与消息总数无关
+
+    Args:
+        messages: 接口顺序的消息流
+
+    Yields:
+        按时间正序排列的消息
+    """
+    stream = iter(messages)
+    pending = []
+    first_ts = None
+    for msg in stream:
+        ts = _create_time(msg)
+        if first_ts is None:
+            first_ts = ts
+        pending.append(msg)
+        if ts != first_ts:
+            break
+    else:
+        # 消息时间全部相同(或没有消息)时无法判断,按倒序处理
+        yield from reversed(pending)
+        return
+
+    if _create_time(pending[-1]) > first_ts:
+        yield from pending
+        yield from stream
+        return
+
+    with tempfile.TemporaryFile() as spool:
+        for msg in itertools.chain(pending, stream):
+            _spool_write(spool, msg)
+        pending = None
+        yield from _spool_read(spool, reverse=True)
 
 
-def format_message(msg: dict) -> str:
+def format_message(msg: dict, names: Optional[UserResolver] = None) -> str:
     """格式化单条消息为 Markdown。
 
     Args:
         msg: 消息对象
+        names: 用户名解析器(可选),用于将 @提及 的用户 ID 替换为用户名
 
     Returns:
         Markdown 格式的消息文本
@@ -176,12 +543,18 @@ def format_message(msg: dict) -> str:
     if msg_type == "text":
         # 文本消息
         content_text = body.get("content", "").strip()
+        # @提及 占位符(如 @_user_1)替换为用户名
+        for mention in msg.get("mentions") or []:
+            key = mention.get("key")
+            if key:
+                user_id = mention.get("id", "")
+                name = mention.get("name") or (names.name(user_id) if names else None) or user_id
+                content_text = content_text.replace(key, f"@{name}")
 
     elif msg_type == "post":
         # 富文本消息
         post_content = body.get("content", {})
         if isinstance(post_content, str):
-            import json
             post_content = json.loads(post_content)
 
         # 提取所有文本段落
@@ -194,7 +567,9 @@ def format_message(msg: dict) -> str:
                     content_text += f"[{line.get('text', '链接')}]({line.get('href', '')})"
                 elif line.get("tag") == "at":
                     # @提及
-                    content_text += f"@{line.get('user_name', line.get('id', ''))}"
+                    user_id = line.get("user_id") or line.get("id", "")
+                    name = line.get("user_name") or (names.name(user_id) if names else None) or user_id
+                    content_text += f"@{name}"
                 elif line.get("tag") == "img":
                     # 图片
                     content_text += f"[图片: {line.get('image_key', '')}]"
@@ -234,12 +609,170 @@ def format_message(msg: dict) -> str:
     return content_text
 
 
+def message_parts(
+    msg: dict,
+    names: Optional[UserResolver] = None,
+    clock: MessageClock = LOCAL_CLOCK,
+) -> tuple[str, str, str, str]:
+    """计算消息渲染所需的 (日期, 时间, 发送者, 内容)。"""
+    date_str, time_str = clock.parts(msg.get("create_time", 0))
+    if names is not None:
+        sender_name = names.sender_name(msg.get("sender", {}))
+    else:
+        sender_name = msg.get("sender", {}).get("name", "未知用户")
+    return date_str, time_str, sender_name, format_message(msg, names)
+
+
+class MarkdownWriter:
+    """增量写出聊天记录 Markdown。
+
+    消息需按时间正序传入,日期变化时写出日期标题,每条消息立即写出。
+    已知消息总数(total)时写在头部;流式写出时总数未知,写在末尾。
+    """
+
+    def __init__(
+        self,
+        out: TextIO,
+        chat_name: str,
+        time_range_desc: str,
+        start_time: int,
+        end_time: int,
+        total: Optional[int] = None,
+        level: int = 1,
+        names: Optional[UserResolver] = None,
+        clock: MessageClock = LOCAL_CLOCK,
+    ):
+        """
+        Args:
+            out: 输出流
+            chat_name: 群聊名称
+            time_range_desc: 时间范围描述
+            start_time: 起始时间戳
+            end_time: 结束时间戳
+            total: 消息总数,None 表示流式写出、总数未知
+            level: 标题层级(多群合并报告中每个群作为二级标题)
+            names: 用户名解析器(可选)
+            clock: 时区换算器,默认系统本地时区
+        """
+        self.out = out
+        self.total = total
+        self.names = names
+        self.clock = clock
+        self.count = 0
+        self.current_date = None
+        self._heading = "#" * level
+        self._sep = ""
+
+        self._line(f"{self._heading} {chat_name} - 聊天记录")
+        self._line("")
+        self._line(f"**时间范围**: {time_range_desc}")
+        self._line(f"**时间段**: {format_timestamp(start_time, clock)} 至 {format_timestamp(end_time, clock)}")
+        if total is not None:
+            self._line(f"**消息总数**: {total} 条")
+        self._line("")
+        self._line("---")
+        self._line("")
+
+    def _line(self, text: str):
+        # 行间以换行分隔,末行不带换行
+        self.out.write(self._sep + text)
+        self._sep = "\n"
+
+    def _date_heading(self, date_str: str):
+        if date_str != self.current_date:
+            self.current_date = date_str
+            self._line(f"{self._heading}# {date_str}")
+            self._line("")
+            self.out.flush()
+
+    def write_message(self, msg: dict):
+        """写出一条消息(按时间正序调用)。"""
+        date_str, time_str, sender_name, content = message_parts(msg, self.names, self.clock)
+        self._date_heading(date_str)
+
+        self._line(f"{self._heading}## {time_str} {sender_name}")
+        self._line("")
+        self._line(content)
+        self._line("")
+        self._line("---")
+        self._line("")
+        self.count += 1
+
+    def write_thread(self, thread: dict, collapse: int = DEFAULT_THREAD_COLLAPSE):
+        """写出一个话题:根消息在前,回复以引用块嵌套在其下。
+
+        Args:
+            thread: ThreadIndex 中的话题
+            collapse: 回复数达到该值时用 <details> 折叠,0 表示不折叠
+        """
+        date_str = thread_date(thread)
+        self._date_heading(date_str)
+
+        replies = thread["replies"]
+        if thread["parts"] is not None:
+            _, time_str, sender_name, content = thread["parts"]
+            self._line(f"{self._heading}## {time_str} {sender_name}")
+            self._line("")
+            self._line(content)
+            self.count += 1
+        else:
+            self._line(f"{self._heading}## {replies[0]['parts'][1]} (回复更早的消息)")
+        self._line("")
+
+        if replies:
+            folded = collapse and len(replies) >= collapse
+            if folded:
+                self._line("<details>")
+                self._line(f"<summary>{len(replies)} 条回复</summary>")
+                self._line("")
+            elif thread["parts"] is not None:
+                self._line(f"> **{len(replies)} 条回复**")
+                self._line(">")
+            for i, reply in enumerate(replies):
+                reply_date, time_str, sender_name, content = reply["parts"]
+                if reply_date != date_str:
+                    time_str = f"{reply_date[5:]} {time_str}"
+                label = f"**{time_str} {sender_name}**"
+                if reply["reply_to"]:
+                    label += f" 回复 {reply['reply_to']}"
+                lines = content.split("\n")
+                if i:
+                    self._line(">")
+                self._line(f"> {label}: {lines[0]}")
+                for line in lines[1:]:
+                    self._line(f"> {line}" if line else ">")
+            self._line("")
+            if folded:
+                self._line("</details>")
+                self._line("")
+            self.count += len(replies)
+
+        self._line("---")
+        self._line("")
+
+    def write_note(self, text: str):
+        """写出一段说明文字(如拉取失败提示)。"""
+        self._line(text)
+        self._line("")
+
+    def close(self):
+        """写出结尾(空消息提示、流式模式下的消息总数)。"""
+        if not self.count:
+            self._line("*该时间段内暂无消息*")
+        if self.total is None:
+            if not self.count:
+                self._line("")
+            self._line(f"**消息总数**: {self.count} 条")
+        self.out.flush()
+
+
 def messages_to_markdown(
     chat_name: str,
     messages: list[dict],
     time_range_desc: str,
     start_time: int,
     end_time: int,
+    clock: MessageClock = LOCAL_CLOCK,
 ) -> str:
     """将消息列表转换为 Markdown 格式。
 
@@ -249,56 +782,185 @@ def messages_to_markdown(
         time_range_desc: 时间范围描述
         start_time: 起始时间戳
         end_time: 结束时间戳
+        clock: 时区换算器,默认系统本地时区
 
     Returns:
         Markdown 格式的文本
     """
-    lines = []
-
-    # 标题
-    lines.append(f"# {chat_name} - 聊天记录")
-    lines.append("")
-    lines.append(f"**时间范围**: {time_range_desc}")
-    lines.append(f"**时间段**: {format_timestamp(start_time)} 至 {format_timestamp(end_time)}")
-    lines.append(f"**消息总数**: {len(messages)} 条")
-    lines.append("")
-    lines.append("---")
-    lines.append("")
-
-    if not messages:
-        lines.append("*该时间段内暂无消息*")
-        return "\n".join(lines)
-
-    # 按日期分组
-    from collections import defaultdict
-
-    messages_by_date = defaultdict(list)
-
-    # 消息是倒序的,先转为正序
-    for msg in reversed(messages):
-        timestamp = msg.get("create_time", 0)
-        date_str = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d")
-        messages_by_date[date_str].append(msg)
-
-    # 按日期输出
-    for date_str in sorted(messages_by_date.keys()):
-        lines.append(f"## {date_str}")
-        lines.append("")
-
-        for msg in messages_by_date[date_str]:
-            timestamp = msg.get("create_time", 0)
-            time_str = datetime.fromtimestamp(timestamp).strftime("%H:%M")
-            sender_name = msg.get("sender", {}).get("name", "未知用户")
-            content = format_message(msg)
-
-            lines.append(f"### {time_str} {sender_name}")
-            lines.append("")
-            lines.append(content)
-            lines.append("")
-            lines.append("---")
-            lines.append("")
-
-    return "\n".join(lines)
+    buf = io.StringIO()
+    writer = MarkdownWriter(buf, chat_name, time_range_desc, start_time, end_time, total=len(messages), clock=clock)
+
+    # 消息是倒序的,先转为正序,再按日期稳定排序
+    ordered = sorted(
+        reversed(messages),
+        key=lambda msg: clock.date(msg.get("create_time", 0)),
+    )
+    for msg in ordered:
+        writer.write_message(msg)
+    writer.close()
+    return buf.getvalue()
+
+
+def write_messages(
+    writer: MarkdownWriter,
+    messages: Iterable[dict],
+    threads: bool = False,
+    thread_collapse: int = DEFAULT_THREAD_COLLAPSE,
+):
+    """把消息写入 writer;threads 为 True 时先建立话题索引,再按话题嵌套写出。"""
+    if not threads:
+        for msg in messages:
+            writer.write_message(msg)
+        return
+    index = ThreadIndex()
+    for msg in messages:
+        index.add(msg, message_parts(msg, writer.names, writer.clock))
+    for thread in index:
+        writer.write_thread(thread, thread_collapse)
+
+
+def fetch_chat_section(
+    chat: dict,
+    start_time: int,
+    end_time: int,
+    time_range_desc: str,
+    max_messages: int,
+    names: UserResolver,
+    archive_path: str = "",
+    slices: int = 1,
+    clock: MessageClock = LOCAL_CLOCK,
+    threads: bool = False,
+    thread_collapse: int = DEFAULT_THREAD_COLLAPSE,
+) -> dict:
+    """拉取单个群的消息,写成合并报告中的一节(写入临时文件,不占内存)。
+
+    lark-cli 调用失败或其它异常只记录到该群的结果中,不影响其它群。
+
+    Args:
+        chat: 群聊信息(chat_id, name)
+        start_time: 起始时间(秒级时间戳)
+        end_time: 结束时间(秒级时间戳)
+        time_range_desc: 时间范围描述
+        max_messages: 最大消息数
+        names: 共享的用户名解析器
+        archive_path: 本地消息归档路径(可选)
+        slices: 时间范围切分的子区间数(并发拉取)
+        clock: 时区换算器
+        threads: 是否按话题嵌套回复
+        thread_collapse: 回复数达到该值的话题折叠,0 表示不折叠
+
+    Returns:
+        {"chat_id", "name", "messages", "seconds", "error", "section"},section 为已回到开头的临时文件
+    """
+    started = time.perf_counter()
+    chat_id = chat["chat_id"]
+    section = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+    writer = MarkdownWriter(section, chat["name"], time_range_desc, start_time, end_time, level=2, names=names, clock=clock)
+    store = None
+    error = ""
+    try:
+        if archive_path:
+            store = MessageStore(archive_path)
+            sync_messages(store, chat_id, start_time, end_time, max_messages, slices)
+        messages = iter_chat_messages(chat_id, start_time, end_time, max_messages, store, names, slices)
+        write_messages(writer, messages, threads, thread_collapse)
+    except SystemExit as e:
+        # run_lark_cli 失败时以 SystemExit 退出,这里只记为该群失败
+        error = f"lark-cli 调用失败(退出码 {e.code})"
+        writer.write_note(f"*拉取失败: {error}*")
+    except Exception as e:
+        # 归档数据库、临时文件、输出解析等其它错误同样只记为该群失败,其余群照常写入
+        error = f"{type(e).__name__}: {e}"
+        writer.write_note(f"*拉取失败: {error}*")
+    finally:
+        if store is not None:
+            store.close()
+    writer.close()
+    section.seek(0)
+    return {
+        "chat_id": chat_id,
+        "name": chat["name"],
+        "messages": writer.count,
+        "seconds": time.perf_counter() - started,
+        "error": error,
+        "section": section,
+    }
+
+
+def resolve_time_range(args, clock: MessageClock = LOCAL_CLOCK) -> tuple[int, int, str]:
+    """根据命令行参数确定 (start_time, end_time, 时间范围描述)。"""
+    if args.start_time and args.end_time:
+        return args.start_time, args.end_time, f"{args.start_time} 至 {args.end_time}"
+    start_time, end_time = parse_time_range(args.time_range, clock)
+    return start_time, end_time, args.time_range
+
+
+def make_clock(args) -> MessageClock:
+    """根据 --utc-offset 创建时区换算器(未指定时使用系统本地时区)。"""
+    if not args.utc_offset:
+        return LOCAL_CLOCK
+    try:
+        return MessageClock(parse_utc_offset(args.utc_offset))
+    except ValueError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def resolve_archive_path(archive: str) -> str:
+    """解析 --archive 参数(default 表示默认路径,空串表示不使用归档)。"""
+    return DEFAULT_ARCHIVE_PATH if archive == "default" else archive
+
+
+def make_user_resolver(args) -> UserResolver:
+    """根据 --user-cache / --user-cache-ttl-days 创建用户名解析器(off 表示不持久化)。"""
+    cache_path = None if args.user_cache == "off" else args.user_cache
+    return UserResolver(cache_path, ttl=int(args.user_cache_ttl_days * 24 * 3600))
+
+
+def report_user_resolver(resolver: UserResolver):
+    """保存用户名缓存并输出查询统计。"""
+    resolver.save()
+    stats = resolver.stats
+    if stats["lookups"]:
+        print(f"用户名解析: 查询 {stats['lookups']} 个用户, 失败 {stats['failed']} 个", file=sys.stderr)
+
+
+def add_utc_offset_argument(subparser):
+    """添加时区参数。"""
+    subparser.add_argument(
+        "--utc-offset",
+        help="按该时区划分日期与显示时间(如 +08:00、-5),默认使用系统本地时区",
+    )
+
+
+def add_thread_arguments(subparser):
+    """添加话题嵌套相关参数。"""
+    subparser.add_argument(
+        "--threads",
+        action="store_true",
+        help="按话题(回复链)嵌套写出:回复以引用块挂在根消息下(需等全部消息拉取完成后再写出)",
+    )
+    subparser.add_argument(
+        "--thread-collapse",
+        type=int,
+        default=DEFAULT_THREAD_COLLAPSE,
+        help="回复数达到该值的话题折叠显示,0 表示不折叠",
+    )
+
+
+def add_user_cache_arguments(subparser):
+    """添加用户名解析相关参数。"""
+    subparser.add_argument(
+        "--user-cache",
+        default=DEFAULT_USER_CACHE_PATH,
+        help="用户名缓存文件路径(跨运行复用);off 表示只在本次运行内缓存",
+    )
+    subparser.add_argument(
+        "--user-cache-ttl-days",
+        type=float,
+        default=DEFAULT_USER_CACHE_TTL / 86400,
+        help="用户名缓存有效期(天)",
+    )
 
 
 def main():
@@ -315,6 +977,9 @@ def main():
 
   # 拉取消息(使用时间戳)
   python fetch_chat_messages.py fetch oc_xxxxxxxxxxxxx --start-time 1642723200 --end-time 1642992000 --output messages.md
+
+  # 并发拉取多个群,合并为一份报告
+  python fetch_chat_messages.py fetch-many --query "项目群" --time-range "近7天" --workers 8 --output digest.md
         """
     )
 
@@ -333,6 +998,47 @@ def main():
     fetch_parser.add_argument("--end-time", type=int, help="结束时间(秒级时间戳)")
     fetch_parser.add_argument("--max-messages", type=int, default=10000, help="最大消息数")
     fetch_parser.add_argument("--output", "-o", help="输出文件路径(默认输出到stdout)")
+    fetch_parser.add_argument(
+        "--archive",
+        default="",
+        help=f"本地消息归档(SQLite)路径,只从接口拉取归档中缺失的消息;传 default 使用 {DEFAULT_ARCHIVE_PATH}",
+    )
+    fetch_parser.add_argument(
+        "--slices",
+        type=int,
+        default=1,
+        help="将时间范围切分为 N 个子区间并发分页拉取(长时间范围提速,受接口限流约束)",
+    )
+    fetch_parser.add_argument(
+        "--chunk-dir",
+        help=f"按 token 预算分块输出到该目录(chunk_NNN.md + {MANIFEST_FILENAME}),供分块总结;指定后忽略 --output",
+    )
+    fetch_parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        default=DEFAULT_CHUNK_TOKENS,
+        help="每块的 token 预算(粗略估算)",
+    )
+    add_thread_arguments(fetch_parser)
+    add_utc_offset_argument(fetch_parser)
+    add_user_cache_arguments(fetch_parser)
+
+    # fetch-many 子命令
+    many_parser = subparsers.add_parser("fetch-many", help="并发拉取多个群聊消息并合并为一份报告")
+    many_source = many_parser.add_mutually_exclusive_group(required=True)
+    many_source.add_argument("--chat-ids", help="逗号分隔的群聊ID列表")
+    many_source.add_argument("--query", help="搜索关键词,拉取所有匹配的群聊")
+    many_parser.add_argument("--time-range", help="时间范围描述(如'近3天'、'上周')", default="近7天")
+    many_parser.add_argument("--start-time", type=int, help="起始时间(秒级时间戳)")
+    many_parser.add_argument("--end-time", type=int, help="结束时间(秒级时间戳)")
+    many_parser.add_argument("--max-messages", type=int, default=10000, help="每个群的最大消息数")
+    many_parser.add_argument("--workers", type=int, default=4, help="并发拉取的群数")
+    many_parser.add_argument("--output", "-o", help="输出文件路径(默认输出到stdout)")
+    many_parser.add_argument("--archive", default="", help="本地消息归档(SQLite)路径,同 fetch")
+    many_parser.add_argument("--slices", type=int, default=1, help="每个群的时间范围切分为 N 个子区间并发拉取")
+    add_thread_arguments(many_parser)
+    add_utc_offset_argument(many_parser)
+    add_user_cache_arguments(many_parser)
 
     args = parser.parse_args()
 
@@ -363,36 +1069,164 @@ def main():
         chat_id = args.chat_id
 
         # 解析时间范围
-        if args.start_time and args.end_time:
-            start_time, end_time = args.start_time, args.end_time
-            time_range_desc = f"{args.start_time} 至 {args.end_time}"
-        else:
-            start_time, end_time = parse_time_range(args.time_range)
-            time_range_desc = args.time_range
+        clock = make_clock(args)
+        start_time, end_time, time_range_desc = resolve_time_range(args, clock)
 
         print(f"正在拉取群聊消息 (Chat ID: {chat_id})...", file=sys.stderr)
         print(f"时间范围: {time_range_desc}", file=sys.stderr)
 
-        messages = get_messages(chat_id, start_time, end_time, args.max_messages)
-
-        print(f"成功拉取 {len(messages)} 条消息", file=sys.stderr)
-
-        # 转换为 Markdown
-        markdown = messages_to_markdown(
-            chat_name=args.chat_name,
-            messages=messages,
-            time_range_desc=time_range_desc,
-            start_time=start_time,
-            end_time=end_time,
+        # 使用本地归档时先补拉缺失部分,再从归档按时间正序读出
+        store = None
+        if args.archive:
+            store = MessageStore(resolve_archive_path(args.archive))
+            stats = sync_messages(store, chat_id, start_time, end_time, args.max_messages, args.slices)
+            print(
+                f"本地归档: 从接口补拉 {stats['fetched']} 条消息 ({len(stats['ranges'])} 个时间段)",
+                file=sys.stderr,
+            )
+
+        resolver = make_user_resolver(args)
+        messages = iter_chat_messages(
+            chat_id, start_time, end_time, args.max_messages, store, resolver, args.slices
         )
 
-        # 输出
+        # 分块输出:按日期与话题边界切成 token 预算内的若干块,并写出清单
+        if args.chunk_dir:
+            try:
+                chunker = TranscriptChunker(
+                    args.chunk_dir,
+                    chat_name=args.chat_name,
+                    time_range_desc=time_range_desc,
+                    render=lambda msg: message_parts(msg, resolver, clock),
+                    token_budget=args.chunk_tokens,
+                )
+                for msg in messages:
+                    chunker.write_message(msg)
+                manifest = chunker.close({
+                    "chatId": chat_id,
+                    "startTime": start_time,
+                    "endTime": end_time,
+                })
+            finally:
+                if store is not None:
+                    store.close()
+
+            report_user_resolver(resolver)
+            dropped = manifest["dropped"]
+            print(
+                f"成功拉取 {chunker.count} 条消息, 分为 {len(manifest['chunks'])} 块"
+                f"(约 {manifest['estimatedTokens']} tokens;丢弃低信息量 {dropped['lowSignal']} 条、重复 {dropped['duplicate']} 条)",
+                file=sys.stderr,
+            )
+            print(f"分块清单: {os.path.join(args.chunk_dir, MANIFEST_FILENAME)}", file=sys.stderr)
+            return
+
+        # 边拉取边按时间正序写出 Markdown
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            writer = MarkdownWriter(
+                out,
+                chat_name=args.chat_name,
+                time_range_desc=time_range_desc,
+                start_time=start_time,
+                end_time=end_time,
+                names=resolver,
+                clock=clock,
+            )
+            write_messages(writer, messages, args.threads, args.thread_collapse)
+            writer.close()
+        finally:
+            if store is not None:
+                store.close()
+            if args.output:
+                out.close()
+            else:
+                out.write("\n")
+
+        report_user_resolver(resolver)
+        print(f"成功拉取 {writer.count} 条消息", file=sys.stderr)
         if args.output:
-            with open(args.output, "w", encoding="utf-8") as f:
-                f.write(markdown)
             print(f"已保存到: {args.output}", file=sys.stderr)
+
+    elif args.command == "fetch-many":
+        # 确定群聊列表
+        if args.query:
+            chats = [
+                {"chat_id": chat.get("chat_id", ""), "name": chat.get("name", "未命名群聊")}
+                for chat in search_chats(args.query)
+                if chat.get("chat_id")
+            ]
         else:
-            print(markdown)
+            chats = [
+                {"chat_id": chat_id, "name": chat_id}
+                for chat_id in (c.strip() for c in args.chat_ids.split(","))
+                if chat_id
+            ]
+        if not chats:
+            print("没有需要拉取的群聊", file=sys.stderr)
+            sys.exit(1)
+
+        clock = make_clock(args)
+        start_time, end_time, time_range_desc = resolve_time_range(args, clock)
+        workers = max(1, args.workers)
+        archive_path = resolve_archive_path(args.archive)
+        names = make_user_resolver(args)
+        print(f"正在并发拉取 {len(chats)} 个群聊 (并发 {workers})...", file=sys.stderr)
+        print(f"时间范围: {time_range_desc}", file=sys.stderr)
+
+        def job(chat):
+            return fetch_chat_section(
+                chat, start_time, end_time, time_range_desc, args.max_messages, names, archive_path, args.slices, clock,
+                args.threads, args.thread_collapse,
+            )
+
+        started = time.perf_counter()
+        results = []
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            out.write("# 多群聊天记录\n\n")
+            out.write(f"**时间范围**: {time_range_desc}\n")
+            out.write(f"**时间段**: {format_timestamp(start_time, clock)} 至 {format_timestamp(end_time, clock)}\n")
+            out.write(f"**群聊数**: {len(chats)} 个\n\n---\n\n")
+
+            # map 按输入顺序返回结果:各群并发拉取,按顺序写出已完成的分节
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for result in pool.map(job, chats):
+                    with result.pop("section") as section:
+                        shutil.copyfileobj(section, out)
+                    out.write("\n\n")
+                    out.flush()
+                    results.append(result)
+                    status = result["error"] or f"{result['messages']} 条"
+                    print(f"  {result['name']}: {status}, {result['seconds']:.2f}s", file=sys.stderr)
+
+            wall = time.perf_counter() - started
+            busy = sum(r["seconds"] for r in results)
+            out.write("## 拉取统计\n\n")
+            out.write("| 群聊 | Chat ID | 消息数 | 耗时(秒) | 状态 |\n")
+            out.write("| --- | --- | --- | --- | --- |\n")
+            for r in results:
+                out.write(
+                    f"| {r['name']} | {r['chat_id']} | {r['messages']} | {r['seconds']:.2f} | {r['error'] or '成功'} |\n"
+                )
+            out.write(
+                f"\n**消息总数**: {sum(r['messages'] for r in results)} 条\n"
+                f"**总耗时**: {wall:.2f} 秒(各群耗时合计 {busy:.2f} 秒,并发 {workers})"
+            )
+        finally:
+            if args.output:
+                out.close()
+            else:
+                out.write("\n")
+
+        report_user_resolver(names)
+        failed = sum(1 for r in results if r["error"])
+        print(
+            f"完成: {len(results) - failed} 个群成功, {failed} 个失败, 总耗时 {wall:.2f}s (串行合计 {busy:.2f}s)",
+            file=sys.stderr,
+        )
+        if args.output:
+            print(f"已保存到: {args.output}", file=sys.stderr)
 
 
 if __name__ == "__main__":
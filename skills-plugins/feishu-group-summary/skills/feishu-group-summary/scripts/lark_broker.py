@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+lark-cli 常驻代理(broker)。
+在本机 Unix socket 上提供按行分隔的 JSON 协议,各插件的 lark_cli.py 检测到 socket 时把调用转发过来,
+否则照常直接启动 lark-cli。
+
+lark-cli 本身没有常驻模式,每次未命中缓存的调用仍会启动一次 lark-cli;broker 省下的是:
+- 只读查询(get-user-info、get-node)在 TTL 内直接返回缓存结果,跨进程、跨插件共享
+- 并发的相同只读查询合并为一次调用
+- 所有插件共用一个并发上限,避免同时启动过多 lark-cli 触发限流
+
+协议(每行一个 JSON 对象,一个连接可连续发送多个请求):
+- {"op": "run", "args": [...], "cwd": "..."} → {"returncode", "stdout", "stderr", "cached"}
+- {"op": "stats"} → 调用统计
+- {"op": "ping"} / {"op": "shutdown"}
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import lark_cli
+
+DEFAULT_SOCKET_PATH = os.path.join("~", ".cache", "lark-cli-broker", "broker.sock")
+DEFAULT_WORKERS = 8
+DEFAULT_CACHE_TTL = 300
+# 只读命令:结果可在 TTL 内复用
+CACHEABLE_COMMANDS = {"get-user-info", "get-node"}
+
+
+def socket_path() -> str:
+    """broker socket 路径:LARK_BROKER_SOCKET 环境变量,默认 ~/.cache/lark-cli-broker/broker.sock。"""
+    return os.path.expanduser(os.environ.get("LARK_BROKER_SOCKET") or DEFAULT_SOCKET_PATH)
+
+
+class Broker:
+    """执行 lark-cli 调用:并发上限、只读结果缓存与相同调用合并。"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, cache_ttl: float = DEFAULT_CACHE_TTL, executable: str = "lark-cli"):
+        """
+        Args:
+            workers: 同时运行的 lark-cli 进程数上限
+            cache_ttl: 只读结果缓存秒数,0 表示不缓存(仍合并并发的相同调用)
+            executable: lark-cli 可执行文件
+        """
+        self.cache_ttl = cache_ttl
+        self.executable = executable
+        self._slots = threading.BoundedSemaphore(max(1, workers))
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._pending = {}
+        self.stats = {"calls": 0, "spawns": 0, "cacheHits": 0, "coalesced": 0, "failed": 0, "spawnSeconds": 0.0}
+
+    def _spawn(self, args: list, cwd: str) -> dict:
+        with self._slots:
+            started = time.perf_counter()
+            res = subprocess.run([self.executable, *args], capture_output=True, text=True, cwd=cwd or None)
+            elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats["spawns"] += 1
+            self.stats["spawnSeconds"] += elapsed
+            if res.returncode != 0:
+                self.stats["failed"] += 1
+        return {"returncode": res.returncode, "stdout": res.stdout, "stderr": res.stderr, "cached": False}
+
+    def call(self, args: list, cwd: str = "") -> dict:
+        """执行一次 lark-cli 调用(参数不含 lark-cli 本身)。"""
+        with self._lock:
+            self.stats["calls"] += 1
+        if lark_cli.command_name(["lark-cli", *args]) not in CACHEABLE_COMMANDS:
+            return self._spawn(args, cwd)
+
+        key = tuple(args)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and time.monotonic() - entry[0] < self.cache_ttl:
+                self.stats["cacheHits"] += 1
+                return dict(entry[1], cached=True)
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[key] = future
+            else:
+                self.stats["coalesced"] += 1
+        if not owner:
+            return dict(future.result(), cached=True)
+
+        try:
+            result = self._spawn(args, cwd)
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if result["returncode"] == 0 and self.cache_ttl > 0:
+                self._cache[key] = (time.monotonic(), result)
+            self._pending.pop(key, None)
+        future.set_result(result)
+        return result
+
+    def snapshot(self) -> dict:
+        """返回统计信息。"""
+        with self._lock:
+            stats = dict(self.stats, cacheEntries=len(self._cache))
+        stats["spawnSeconds"] = round(stats["spawnSeconds"], 3)
+        return stats
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        broker = self.server.broker
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                op = request.get("op", "run")
+                if op == "run":
+                    reply = broker.call(list(request["args"]), request.get("cwd", ""))
+                elif op == "stats":
+                    reply = broker.snapshot()
+                elif op == "ping":
+                    reply = {"ok": True, "pid": os.getpid()}
+                elif op == "shutdown":
+                    reply = {"ok": True}
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                else:
+                    reply = {"error": f"unknown op: {op}"}
+            except (ValueError, KeyError, TypeError, OSError) as e:
+                reply = {"error": str(e)}
+            self.wfile.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket 服务端,每个连接一个线程。"""
+
+    daemon_threads = True
+
+    def __init__(self, path: str, broker: Broker):
+        self.broker = broker
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+        if os.path.exists(path):
+            if request(path, {"op": "ping"}) is not None:
+                raise RuntimeError(f"broker already running on {path}")
+            os.unlink(path)
+        super().__init__(path, _Handler)
+        # socket 可以代为执行 lark-cli,只允许当前用户访问
+        os.chmod(path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def request(path: str, payload: dict, timeout: float = 5) -> dict:
+    """发送单个请求,连接失败返回 None。"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            with sock.makefile("rwb") as conn:
+                conn.write(json.dumps(payload).encode("utf-8") + b"\n")
+                conn.flush()
+                line = conn.readline()
+        return json.loads(line) if line else None
+    except (OSError, ValueError):
+        return None
+
+
+def _bench_rate(run, argv: list, calls: int, threads: int) -> dict:
+    failures = []
+
+    def one(_):
+        res = run(["lark-cli", *argv])
+        if res.returncode != 0:
+            failures.append(res.returncode)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(calls)))
+    seconds = time.perf_counter() - started
+    return {
+        "calls": calls,
+        "seconds": round(seconds, 3),
+        "callsPerSec": round(calls / seconds, 1) if seconds else 0,
+        "failed": len(failures),
+    }
+
+
+def bench(args):
+    """对比直接启动 lark-cli 与经 broker 转发(不缓存 / 缓存)的吞吐。"""
+    argv = args.lark_args or ["--format", "json", "get-user-info", "ou_bench", "--user-id-type", "open_id"]
+    report = {"args": argv, "threads": args.threads}
+    os.environ["LARK_BROKER"] = "off"
+    report["direct"] = _bench_rate(lark_cli.run_process, argv, args.calls, args.threads)
+    os.environ.pop("LARK_BROKER")
+
+    with tempfile.TemporaryDirectory(prefix="lark-broker-bench-") as tmp:
+        for label, ttl in (("broker", 0), ("brokerCached", DEFAULT_CACHE_TTL)):
+            path = os.path.join(tmp, f"{label}.sock")
+            server = BrokerServer(path, Broker(workers=args.workers, cache_ttl=ttl))
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            lark_cli.BROKER_SOCKET = path
+            try:
+                report[label] = _bench_rate(lark_cli.run_process, argv, args.calls, args.threads)
+                report[label]["broker"] = server.broker.snapshot()
+            finally:
+                server.shutdown()
+                server.server_close()
+                lark_cli.close_broker_connection()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="lark-cli 常驻代理(Unix socket)")
+    parser.add_argument("--socket", default="", help=f"socket 路径(默认 LARK_BROKER_SOCKET 或 {DEFAULT_SOCKET_PATH})")
+    sub = parser.add_subparsers(dest="command")
+
+    serve_parser = sub.add_parser("serve", help="前台运行 broker")
+    serve_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="同时运行的 lark-cli 进程数上限")
+    serve_parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL, help="只读查询结果缓存秒数,0 表示不缓存")
+    sub.add_parser("stats", help="查看运行中 broker 的统计")
+    sub.add_parser("stop", help="停止运行中的 broker")
+
+    bench_parser = sub.add_parser("bench", help="对比直接启动与经 broker 转发的每秒调用数")
+    bench_parser.add_argument("--calls", type=int, default=200, help="每种方式的调用次数")
+    bench_parser.add_argument("--threads", type=int, default=4, help="并发调用线程数")
+    bench_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="broker 并发上限")
+    bench_parser.add_argument("lark_args", nargs=argparse.REMAINDER, help="基准使用的 lark-cli 参数(默认 get-user-info)")
+    args = parser.parse_args()
+
+    path = os.path.expanduser(args.socket) if args.socket else socket_path()
+    if args.command == "serve":
+        server = BrokerServer(path, Broker(workers=args.workers, cache_ttl=args.cache_ttl))
+        print(f"lark-cli broker listening on {path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    elif args.command in ("stats", "stop"):
+        reply = request(path, {"op": "stats" if args.command == "stats" else "shutdown"})
+        if reply is None:
+            print(f"broker not running on {path}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(reply, ensure_ascii=False, indent=2))
+    elif args.command == "bench":
+        if args.lark_args and args.lark_args[0] == "--":
+            args.lark_args = args.lark_args[1:]
+        bench(args)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
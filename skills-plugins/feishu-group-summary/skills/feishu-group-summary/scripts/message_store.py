@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+群聊消息本地归档(SQLite)。
+按 message_id 去重存储消息,并为每个群记录已完整同步的时间区间 [low, high],
+再次拉取时只需补齐区间之外的部分。
+"""
+
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+DEFAULT_ARCHIVE_PATH = os.path.join("~", ".cache", "feishu-group-summary", "messages.sqlite3")
+
+
+def plan_sync(
+    coverage: Optional[tuple[int, int]],
+    start_time: int,
+    end_time: int,
+) -> tuple[list[tuple[int, int]], tuple[int, int]]:
+    """计算需要从接口补拉的时间段。
+
+    Args:
+        coverage: 已同步区间 (low, high),None 表示从未同步
+        start_time: 请求起始时间(秒级时间戳)
+        end_time: 请求结束时间(秒级时间戳)
+
+    Returns:
+        (待拉取时间段列表, 拉取完成后的同步区间)
+        请求与已同步区间不相交时整段重拉,并以请求区间替换原区间
+    """
+    if coverage is None or end_time < coverage[0] or start_time > coverage[1]:
+        return [(start_time, end_time)], (start_time, end_time)
+
+    low, high = coverage
+    ranges = []
+    if start_time < low:
+        ranges.append((start_time, low))
+    if end_time > high:
+        # 从 high 本身开始重拉,同一秒内后到的消息不会遗漏(按 message_id 去重)
+        ranges.append((high, end_time))
+    return ranges, (min(start_time, low), max(end_time, high))
+
+
+class MessageStore:
+    """群聊消息归档。"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite 文件路径(支持 ~)
+        """
+        self.path = os.path.expanduser(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                message_id TEXT PRIMARY KEY,
+                chat_id TEXT NOT NULL,
+                create_time INTEGER NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_chat_time ON messages (chat_id, create_time);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                chat_id TEXT PRIMARY KEY,
+                low INTEGER NOT NULL,
+                high INTEGER NOT NULL
+            );
+            """
+        )
+
+    def coverage(self, chat_id: str) -> Optional[tuple[int, int]]:
+        """返回群的已同步区间 (low, high),从未同步返回 None。"""
+        row = self.conn.execute(
+            "SELECT low, high FROM sync_state WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set_coverage(self, chat_id: str, low: int, high: int):
+        """更新群的已同步区间。"""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (chat_id, low, high) VALUES (?, ?, ?)",
+                (chat_id, low, high),
+            )
+
+    def upsert(self, chat_id: str, messages: Iterable[dict]) -> int:
+        """写入消息(同 message_id 覆盖),返回写入条数。"""
+        rows = [
+            (
+                msg["message_id"],
+                chat_id,
+                int(msg.get("create_time") or 0),
+                json.dumps(msg, ensure_ascii=False),
+            )
+            for msg in messages
+            if msg.get("message_id")
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO messages (message_id, chat_id, create_time, data) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def iter_messages(
+        self,
+        chat_id: str,
+        start_time: int,
+        end_time: int,
+        limit: Optional[int] = None,
+    ) -> Iterator[dict]:
+        """按时间正序产出区间内的消息。
+
+        Args:
+            chat_id: 群聊ID
+            start_time: 起始时间(秒级时间戳)
+            end_time: 结束时间(秒级时间戳)
+            limit: 只取最新的 limit 条(与接口倒序拉取时的截断一致)
+        """
+        sql = "SELECT data, create_time, message_id FROM messages WHERE chat_id = ? AND create_time BETWEEN ? AND ?"
+        params = [chat_id, start_time, end_time]
+        if limit is not None:
+            sql = f"SELECT * FROM ({sql} ORDER BY create_time DESC, message_id DESC LIMIT ?)"
+            params.append(limit)
+        sql += " ORDER BY create_time, message_id"
+        for (data, *_) in self.conn.execute(sql, params):
+            yield json.loads(data)
+
+    def close(self):
+        """关闭数据库连接。"""
+        self.conn.close()
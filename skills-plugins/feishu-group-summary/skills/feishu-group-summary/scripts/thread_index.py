@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+话题(回复链)索引。
+按时间正序逐条加入消息,用 message_id → 条目 的单个字典把回复挂到所属话题的根消息下,
+整体 O(n);只保存渲染好的文本片段,不保留原始消息。
+"""
+
+from typing import Iterator, Optional
+
+# 回复数达到该值的话题默认折叠
+DEFAULT_THREAD_COLLAPSE = 10
+
+
+class ThreadIndex:
+    """话题索引。
+
+    - 没有 root_id/parent_id 的消息自成一个话题(根消息)
+    - 回复挂到根消息下;只有 parent_id 时沿父消息找到根
+    - 根消息不在本次范围内(更早)时,以首条回复的位置建立占位话题,后续回复仍归入其中
+    """
+
+    def __init__(self):
+        self.threads = []
+        self._by_id = {}
+        self.count = 0
+
+    def add(self, msg: dict, parts: tuple[str, str, str, str]):
+        """加入一条消息(按时间正序调用)。
+
+        Args:
+            msg: 消息对象(只读取 message_id、root_id、parent_id)
+            parts: 渲染好的 (日期, 时间, 发送者, 内容)
+        """
+        self.count += 1
+        message_id = msg.get("message_id")
+        parent_id = msg.get("parent_id")
+        root_id = msg.get("root_id") or parent_id
+
+        if not root_id or root_id == message_id:
+            thread = {"parts": parts, "replies": []}
+            self.threads.append(thread)
+            if message_id:
+                self._by_id[message_id] = thread
+            return
+
+        thread = self._by_id.get(root_id)
+        if thread is None:
+            thread = {"parts": None, "replies": []}
+            self.threads.append(thread)
+            self._by_id[root_id] = thread
+        elif "thread" in thread:
+            # root_id 指向的是一条回复(只有 parent_id 的情况),归入它所在的话题
+            thread = thread["thread"]
+
+        # 直接回复的是话题中的另一条回复时,标注被回复者
+        reply_to = None
+        parent = self._by_id.get(parent_id) if parent_id else None
+        if parent is not None and "thread" in parent:
+            reply_to = parent["parts"][2]
+        reply = {"parts": parts, "reply_to": reply_to, "thread": thread}
+        thread["replies"].append(reply)
+        if message_id:
+            self._by_id[message_id] = reply
+
+    def __iter__(self) -> Iterator[dict]:
+        """按根消息(或占位话题首条回复)的时间顺序产出话题。"""
+        return iter(self.threads)
+
+
+def thread_date(thread: dict) -> Optional[str]:
+    """话题所属日期:根消息日期,占位话题取首条回复日期。"""
+    parts = thread["parts"] or (thread["replies"][0]["parts"] if thread["replies"] else None)
+    return parts[0] if parts else None
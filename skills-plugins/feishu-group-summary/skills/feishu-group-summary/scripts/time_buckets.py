@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+消息时间分桶。
+把秒级时间戳换算为本地日期("YYYY-MM-DD")与时刻("HH:MM")。
+用整数运算按时区偏移切分日期与分钟,并按分钟缓存格式化结果,
+避免对每条消息重复调用 datetime.fromtimestamp(...).strftime。
+"""
+
+import re
+import time
+from datetime import date, timedelta, timezone
+from typing import Optional
+
+# 1970-01-01 的 proleptic Gregorian 序数
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# 时区偏移切换(夏令时等)总发生在 UTC 的整 15 分钟上,按该粒度缓存本地偏移
+_OFFSET_SLOT_SECONDS = 900
+# 分钟缓存条数上限,超出后清空重建(按时间顺序处理时命中率不受影响)
+_MINUTE_CACHE_LIMIT = 1 << 17
+
+_UTC_OFFSET_RE = re.compile(r'^(?:utc|gmt)?\s*([+-])?(\d{1,2})(?::?(\d{2}))?$')
+
+
+def parse_utc_offset(text: str) -> int:
+    """解析时区偏移为秒数。
+
+    支持 "+08:00"、"+0800"、"8"、"-5"、"UTC+8" 等写法。
+
+    Args:
+        text: 时区偏移描述
+
+    Returns:
+        相对 UTC 的偏移秒数
+
+    Raises:
+        ValueError: 无法解析或超出 ±14 小时
+    """
+    match = _UTC_OFFSET_RE.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"无法解析时区偏移: {text}")
+    sign, hours, minutes = match.groups()
+    offset = int(hours) * 3600 + int(minutes or 0) * 60
+    if offset > 14 * 3600 or int(minutes or 0) >= 60:
+        raise ValueError(f"时区偏移超出范围: {text}")
+    return -offset if sign == "-" else offset
+
+
+class MessageClock:
+    """时间戳 → (日期, 时刻) 换算器。
+
+    - 指定 utc_offset 时按固定偏移换算;未指定时使用系统本地时区,
+      本地偏移按 UTC 15 分钟粒度缓存,夏令时切换前后与 datetime.fromtimestamp 结果一致
+    - 每个本地分钟只格式化一次;缓存写入幂等,可在多个线程间共享
+    """
+
+    def __init__(self, utc_offset: Optional[int] = None):
+        """
+        Args:
+            utc_offset: 相对 UTC 的偏移秒数,None 表示使用系统本地时区
+        """
+        self.utc_offset = utc_offset
+        self._slot_offsets = {}
+        self._minutes = {}
+        self._days = {}
+
+    @property
+    def tzinfo(self) -> Optional[timezone]:
+        """固定偏移对应的 tzinfo,本地时区返回 None(供 datetime 使用)。"""
+        if self.utc_offset is None:
+            return None
+        return timezone(timedelta(seconds=self.utc_offset))
+
+    def _offset(self, timestamp: int) -> int:
+        if self.utc_offset is not None:
+            return self.utc_offset
+        slot = timestamp // _OFFSET_SLOT_SECONDS
+        offset = self._slot_offsets.get(slot)
+        if offset is None:
+            offset = time.localtime(slot * _OFFSET_SLOT_SECONDS).tm_gmtoff
+            self._slot_offsets[slot] = offset
+        return offset
+
+    def _day(self, day: int) -> str:
+        text = self._days.get(day)
+        if text is None:
+            text = date.fromordinal(_EPOCH_ORDINAL + day).isoformat()
+            self._days[day] = text
+        return text
+
+    def parts(self, timestamp: int) -> tuple[str, str]:
+        """返回 (日期 "YYYY-MM-DD", 时刻 "HH:MM")。"""
+        timestamp = int(timestamp)
+        minute = (timestamp + self._offset(timestamp)) // 60
+        cached = self._minutes.get(minute)
+        if cached is None:
+            if len(self._minutes) >= _MINUTE_CACHE_LIMIT:
+                self._minutes = {}
+            day, minute_of_day = divmod(minute, 1440)
+            cached = (self._day(day), f"{minute_of_day // 60:02d}:{minute_of_day % 60:02d}")
+            self._minutes[minute] = cached
+        return cached
+
+    def date(self, timestamp: int) -> str:
+        """返回日期 "YYYY-MM-DD"。"""
+        return self.parts(timestamp)[0]
+
+    def format(self, timestamp: int) -> str:
+        """返回 "YYYY-MM-DD HH:MM"。"""
+        return " ".join(self.parts(timestamp))
+
+
+# 系统本地时区的共享实例
+LOCAL_CLOCK = MessageClock()
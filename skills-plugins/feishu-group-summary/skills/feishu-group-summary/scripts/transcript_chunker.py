@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+聊天记录分块。
+按日期与话题(回复链)边界把聊天记录切成不超过 token 预算的若干块,
+丢弃表情包、系统消息与重复转发等低信息量消息,并输出分块清单(manifest),
+供 LLM 分块总结后再汇总(map-reduce)。
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+MANIFEST_FILENAME = "manifest.json"
+DEFAULT_CHUNK_TOKENS = 6000
+# 低信息量消息类型,分块时直接丢弃
+LOW_SIGNAL_TYPES = {"sticker", "system"}
+# 内容短于该长度的消息不参与重复判定("好的"、"收到"等短回复重复出现是正常的)
+DUPLICATE_MIN_CHARS = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本 token 数:中日韩等宽字符约 1 字 1 token,其余约 4 字符 1 token。
+
+    UTF-8 下宽字符占 3 字节、ASCII 占 1 字节,用编码后的长度差即可数出宽字符数,无需逐字判断。
+    """
+    wide = (len(text.encode("utf-8")) - len(text)) // 2
+    return wide + (len(text) - wide + 3) // 4
+
+
+class TranscriptChunker:
+    """按 token 预算分块写出聊天记录。
+
+    消息需按时间正序传入;接口与 MarkdownWriter 一致(write_message / close / count)。
+    - 同一天的消息先在内存中攒齐(按回复链归并为若干话题单元,回复跟在所属话题之后),当天结束后整体装箱:
+      能放进当前块就放,放不下但能单独成块就另起一块,单独也放不下才按话题单元拆分;
+      单个话题单元超出预算时才按消息拆分
+    - 内存占用为一个块加一天的消息
+    """
+
+    def __init__(
+        self,
+        out_dir: str,
+        chat_name: str,
+        time_range_desc: str,
+        render: Callable[[dict], tuple[str, str, str, str]],
+        token_budget: int = DEFAULT_CHUNK_TOKENS,
+    ):
+        """
+        Args:
+            out_dir: 分块输出目录
+            chat_name: 群聊名称
+            time_range_desc: 时间范围描述
+            render: 消息渲染函数,返回 (日期, 时间, 发送者, 内容)
+            token_budget: 每块 token 预算
+        """
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.chat_name = chat_name
+        self.time_range_desc = time_range_desc
+        self.render = render
+        self.token_budget = token_budget
+        self.count = 0
+        self.dropped = {"lowSignal": 0, "duplicate": 0}
+        self.chunks = []
+        self._seen_contents = set()
+
+        # 当天缓冲:话题单元列表,每个单元 {"blocks": [(文本, tokens)], "tokens": int};
+        # message_id → 所在单元,回复按根消息(或父消息)归入同一单元
+        self._day = None
+        self._day_units = []
+        self._day_index = {}
+        # 当前块
+        self._parts = []
+        self._tokens = 0
+        self._messages = 0
+        self._dates = []
+
+    def write_message(self, msg: dict):
+        """加入一条消息(按时间正序调用)。"""
+        if msg.get("msg_type") in LOW_SIGNAL_TYPES:
+            self.dropped["lowSignal"] += 1
+            return
+
+        date_str, time_str, sender_name, content = self.render(msg)
+        if len(content) >= DUPLICATE_MIN_CHARS:
+            key = hash(content)
+            if key in self._seen_contents:
+                self.dropped["duplicate"] += 1
+                return
+            self._seen_contents.add(key)
+
+        if date_str != self._day:
+            self._pack_day()
+            self._day = date_str
+
+        block = f"### {time_str} {sender_name}\n\n{content}\n\n---\n\n"
+        tokens = estimate_tokens(block)
+        message_id = msg.get("message_id")
+        # 回复归入根消息所在单元(中间隔着其它消息也一样);根消息不在当天时退而找父消息
+        unit = self._day_index.get(msg.get("root_id")) or self._day_index.get(msg.get("parent_id"))
+        if unit is None:
+            unit = {"blocks": [], "tokens": 0}
+            self._day_units.append(unit)
+        if message_id:
+            self._day_index[message_id] = unit
+        unit["blocks"].append((block, tokens))
+        unit["tokens"] += tokens
+        self.count += 1
+
+    def _append(self, blocks: list[tuple[str, int]]):
+        # 追加到当前块,必要时补日期标题
+        if not self._dates or self._dates[-1] != self._day:
+            header = f"## {self._day}\n\n"
+            self._parts.append(header)
+            self._tokens += estimate_tokens(header)
+            self._dates.append(self._day)
+        for block, tokens in blocks:
+            self._parts.append(block)
+            self._tokens += tokens
+            self._messages += 1
+
+    def _pack_day(self):
+        units = self._day_units
+        self._day_units = []
+        self._day_index = {}
+        if not units:
+            return
+        day_tokens = sum(unit["tokens"] for unit in units)
+        if self._tokens + day_tokens <= self.token_budget:
+            self._append([b for unit in units for b in unit["blocks"]])
+            return
+        if day_tokens <= self.token_budget:
+            self._flush()
+            self._append([b for unit in units for b in unit["blocks"]])
+            return
+        for unit in units:
+            if self._messages and self._tokens + unit["tokens"] > self.token_budget:
+                self._flush()
+            if unit["tokens"] <= self.token_budget:
+                self._append(unit["blocks"])
+                continue
+            for block in unit["blocks"]:
+                if self._messages and self._tokens + block[1] > self.token_budget:
+                    self._flush()
+                self._append([block])
+
+    def _flush(self):
+        if not self._messages:
+            return
+        index = len(self.chunks) + 1
+        filename = f"chunk_{index:03d}.md"
+        header = (
+            f"# {self.chat_name} - 聊天记录(第 {index} 部分)\n\n"
+            f"**时间范围**: {self.time_range_desc}\n"
+            f"**日期**: {self._dates[0]} 至 {self._dates[-1]}\n"
+            f"**消息数**: {self._messages} 条\n\n---\n\n"
+        )
+        text = header + "".join(self._parts)
+        tmp_path = self.out_dir / f"{filename}.tmp"
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, self.out_dir / filename)
+        self.chunks.append({
+            "index": index,
+            "file": filename,
+            "startDate": self._dates[0],
+            "endDate": self._dates[-1],
+            "messages": self._messages,
+            "estimatedTokens": self._tokens + estimate_tokens(header),
+        })
+        self._parts = []
+        self._tokens = 0
+        self._messages = 0
+        self._dates = []
+
+    def close(self, extra: Optional[dict] = None) -> dict:
+        """写出剩余消息与清单,返回清单内容。"""
+        self._pack_day()
+        self._flush()
+        manifest = {
+            "chat": self.chat_name,
+            "timeRange": self.time_range_desc,
+            "tokenBudget": self.token_budget,
+            "messages": self.count,
+            "dropped": self.dropped,
+            "estimatedTokens": sum(chunk["estimatedTokens"] for chunk in self.chunks),
+            "chunks": self.chunks,
+        }
+        if extra:
+            manifest.update(extra)
+        tmp_path = self.out_dir / f"{MANIFEST_FILENAME}.tmp"
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, self.out_dir / MANIFEST_FILENAME)
+        return manifest
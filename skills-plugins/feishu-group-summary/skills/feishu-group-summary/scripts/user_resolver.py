@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+飞书用户名解析。
+批量解析一批消息中出现的发送者与 @提及 用户 ID,结果持久化到本地缓存(带 TTL),
+跨运行复用;线程安全,可在多个群之间共享。
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from lark_cli import get_user_info
+
+DEFAULT_USER_CACHE_PATH = os.path.join("~", ".cache", "feishu-group-summary", "users.json")
+DEFAULT_USER_CACHE_TTL = 7 * 24 * 3600
+# 同时进行的 get-user-info 调用数
+LOOKUP_WORKERS = 8
+
+
+def user_id_type(user_id: str) -> str:
+    """根据 ID 前缀判断 user_id_type。"""
+    if user_id.startswith("ou_"):
+        return "open_id"
+    if user_id.startswith("on_"):
+        return "union_id"
+    return "user_id"
+
+
+def lookup_user_name(user_id: str) -> str:
+    """通过 lark-cli 查询用户名,失败返回空字符串。"""
+    info = get_user_info(user_id, user_id_type=user_id_type(user_id))
+    if isinstance(info.get("user"), dict):
+        info = info["user"]
+    return info.get("name") or info.get("en_name") or ""
+
+
+def message_user_ids(msg: dict) -> set[str]:
+    """收集一条消息中的发送者与 @提及 用户 ID。"""
+    ids = set()
+    sender = msg.get("sender") or {}
+    if sender.get("id") and sender.get("sender_type", "user") == "user":
+        ids.add(sender["id"])
+    for mention in msg.get("mentions") or []:
+        if mention.get("id"):
+            ids.add(mention["id"])
+    if msg.get("msg_type") == "post":
+        content = (msg.get("body") or {}).get("content")
+        if isinstance(content, str):
+            try:
+                content = json.loads(content)
+            except json.JSONDecodeError:
+                content = []
+        for line in content or []:
+            for element in line if isinstance(line, list) else []:
+                if isinstance(element, dict) and element.get("tag") == "at":
+                    user_id = element.get("user_id") or element.get("id")
+                    if user_id and user_id != "all":
+                        ids.add(user_id)
+    return ids
+
+
+class UserResolver:
+    """用户 ID → 用户名解析器。
+
+    - prefetch(messages): 收集一批消息里未缓存(或已过期)的用户 ID,并发查询,同一 ID 只查一次
+    - 消息自带的发送者/提及名称直接写入缓存,不再查询
+    - 缓存以 JSON 持久化,条目超过 ttl 秒后重新查询;查询失败只在本次运行内记住
+    """
+
+    def __init__(
+        self,
+        cache_path: Optional[str] = DEFAULT_USER_CACHE_PATH,
+        ttl: int = DEFAULT_USER_CACHE_TTL,
+        workers: int = LOOKUP_WORKERS,
+        lookup: Callable[[str], str] = lookup_user_name,
+    ):
+        """
+        Args:
+            cache_path: 持久化缓存路径(支持 ~),None 表示只在内存中缓存
+            ttl: 缓存有效期(秒)
+            workers: 并发查询数
+            lookup: 单个用户名查询函数
+        """
+        self.cache_path = os.path.expanduser(cache_path) if cache_path else None
+        self.ttl = ttl
+        self.lookup = lookup
+        self._lock = threading.Lock()
+        self._names = {}
+        self._failed = set()
+        self._resolved = set()
+        self._pending = {}
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.stats = {"lookups": 0, "failed": 0}
+
+        if self.cache_path:
+            try:
+                with open(self.cache_path, "r", encoding="utf-8") as f:
+                    loaded = json.load(f)
+                if isinstance(loaded, dict):
+                    self._names = loaded
+            except (OSError, ValueError):
+                pass
+
+    def _fresh(self, user_id: str, now: float) -> bool:
+        # 本次运行内已解析过的不再查询,与 TTL 无关
+        if user_id in self._resolved:
+            return True
+        entry = self._names.get(user_id)
+        return bool(entry) and now - entry.get("ts", 0) < self.ttl
+
+    def learn(self, user_id: str, name: str):
+        """记录从消息中直接得到的用户名。"""
+        if user_id and name:
+            with self._lock:
+                self._names[user_id] = {"name": name, "ts": time.time()}
+                self._resolved.add(user_id)
+
+    def _learn_from_message(self, msg: dict):
+        sender = msg.get("sender") or {}
+        self.learn(sender.get("id"), sender.get("name"))
+        for mention in msg.get("mentions") or []:
+            self.learn(mention.get("id"), mention.get("name"))
+
+    def _lookup(self, user_id: str):
+        name = self.lookup(user_id)
+        with self._lock:
+            self.stats["lookups"] += 1
+            if name:
+                self._names[user_id] = {"name": name, "ts": time.time()}
+                self._resolved.add(user_id)
+            else:
+                self.stats["failed"] += 1
+                self._failed.add(user_id)
+            self._pending.pop(user_id, None)
+
+    def prefetch(self, messages: Iterable[dict]):
+        """解析一批消息中出现的全部用户 ID(阻塞直到查询完成)。"""
+        ids = set()
+        for msg in messages:
+            self._learn_from_message(msg)
+            ids |= message_user_ids(msg)
+
+        now = time.time()
+        waits: list[Future] = []
+        with self._lock:
+            for user_id in ids:
+                if self._fresh(user_id, now) or user_id in self._failed:
+                    continue
+                future = self._pending.get(user_id)
+                if future is None:
+                    future = self._pool.submit(self._lookup, user_id)
+                    self._pending[user_id] = future
+                waits.append(future)
+        for future in waits:
+            future.result()
+
+    def name(self, user_id: Optional[str]) -> Optional[str]:
+        """返回已缓存的用户名(含已过期条目),未知返回 None。"""
+        if not user_id:
+            return None
+        with self._lock:
+            entry = self._names.get(user_id)
+        return entry["name"] if entry else None
+
+    def sender_name(self, sender: dict) -> str:
+        """返回发送者名称,无法确定时返回"未知用户"。"""
+        name = sender.get("name")
+        if name:
+            self.learn(sender.get("id"), name)
+            return name
+        return self.name(sender.get("id")) or "未知用户"
+
+    def save(self):
+        """持久化缓存(原子写入)。"""
+        self._pool.shutdown(wait=True)
+        if not self.cache_path:
+            return
+        with self._lock:
+            text = json.dumps(self._names, ensure_ascii=False)
+        Path(self.cache_path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, self.cache_path)
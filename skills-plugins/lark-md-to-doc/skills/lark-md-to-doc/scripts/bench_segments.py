@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Markdown 分段解析基准。
+
+用合成的大 Markdown 文件对比：
+- 参照实现：整份读入后 splitlines、逐个 fence 转小写、每个 callout 调用 shlex
+- iter_segments：从文件对象单遍流式解析
+
+输出耗时与峰值内存（tracemalloc），并校验两者产出的片段完全一致。不调用 lark-cli。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import shlex
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from md_segments import iter_segments, parse_callout_info
+
+
+def reference_parse_callout_info(info_line):
+    """逐个 callout 调用 shlex 的参照实现（与 parse_callout_info 结果一致）。"""
+    opts = {}
+    tokens = shlex.split(info_line)
+    if tokens:
+        head = tokens[0]
+        if ":" in head:
+            _, val = head.split(":", 1)
+            if val:
+                opts["type"] = val
+        for token in tokens[1:]:
+            if "=" in token:
+                key, value = token.split("=", 1)
+                if key.lower() in ("type", "callout-type"):
+                    opts[key.lower()] = value
+    if "callout-type" in opts and "type" not in opts:
+        opts["type"] = opts["callout-type"]
+    return opts
+
+
+def reference_segments(markdown_text):
+    """整份文本 splitlines 后再拼接的参照实现（与 parse_segments 结果一致）。"""
+    lines = markdown_text.splitlines()
+    segments = []
+    buf = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("```"):
+            info = line.strip()[3:].strip()
+            info_lower = info.lower()
+            is_callout = info_lower.startswith("callout")
+            is_plantuml = info_lower.startswith("plantuml")
+            is_mermaid = info_lower.startswith("mermaid")
+            if is_callout or is_plantuml or is_mermaid:
+                if buf:
+                    segments.append(("markdown", "\n".join(buf)))
+                    buf = []
+                i += 1
+                block_lines = []
+                while i < len(lines) and not lines[i].startswith("```"):
+                    block_lines.append(lines[i])
+                    i += 1
+                block_text = "\n".join(block_lines)
+                if is_callout:
+                    segments.append(("callout", info, block_text))
+                else:
+                    syntax = "plantuml" if is_plantuml else "mermaid"
+                    segments.append(("diagram", syntax, block_text))
+            else:
+                buf.append(line)
+                i += 1
+                while i < len(lines):
+                    buf.append(lines[i])
+                    if lines[i].startswith("```"):
+                        break
+                    i += 1
+        else:
+            buf.append(line)
+        i += 1
+    if buf:
+        segments.append(("markdown", "\n".join(buf)))
+    return segments
+
+
+def synthesize_markdown(path, size_mb, seed=0):
+    """生成约 size_mb MB 的合成 Markdown：标题、段落、列表、代码块、callout 与图表交替出现。"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    section = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            section += 1
+            parts = [f"## 第 {section} 节\n\n"]
+            for _ in range(rng.randrange(2, 6)):
+                parts.append("这是一段用于基准测试的正文，包含 **加粗** 与 `代码`。" * rng.randrange(1, 4) + "\n\n")
+            parts.append("".join(f"- 列表项 {k}\n" for k in range(rng.randrange(1, 6))) + "\n")
+            choice = section % 4
+            if choice == 0:
+                parts.append("```python\n" + "print('hello')\n" * rng.randrange(1, 8) + "```\n\n")
+            elif choice == 1:
+                parts.append(f"```callout type=info\n提示 {section}\n```\n\n")
+            elif choice == 2:
+                parts.append("```plantuml\n@startuml\nAlice -> Bob: Hello\n@enduml\n```\n\n")
+            else:
+                parts.append("```Mermaid\nsequenceDiagram\n  A->>B: Hi\n```\n\n")
+            chunk = "".join(parts)
+            f.write(chunk)
+            written += len(chunk.encode("utf-8"))
+
+
+def run_reference(path):
+    """参照实现：整份读入再解析，返回 (片段数, 摘要)。"""
+    with open(path, "r", encoding="utf-8") as f:
+        segments = reference_segments(f.read())
+    digest = hashlib.sha1()
+    for segment in segments:
+        if segment[0] == "callout":
+            reference_parse_callout_info(segment[1])
+        digest.update(repr(segment).encode("utf-8"))
+    return len(segments), digest.hexdigest()
+
+
+def run_streaming(path):
+    """iter_segments：边读边解析，片段处理后即释放，返回 (片段数, 摘要)。"""
+    count = 0
+    digest = hashlib.sha1()
+    with open(path, "r", encoding="utf-8") as f:
+        for _, segment in iter_segments(f):
+            if segment[0] == "callout":
+                parse_callout_info(segment[1])
+            digest.update(repr(segment).encode("utf-8"))
+            count += 1
+    return count, digest.hexdigest()
+
+
+def measure(fn, path, repeat):
+    """返回 (结果, 最快耗时秒, 峰值内存 MB)。"""
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(path)
+        seconds.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(seconds), peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Markdown segmenting on a large synthetic file.")
+    parser.add_argument("--md", help="Markdown file to parse (default: generate a synthetic file)")
+    parser.add_argument("--size-mb", type=float, default=50, help="Size of the synthetic file in MB")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation (fastest is reported)")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    path = args.md
+    if not path:
+        tmp_dir = tempfile.TemporaryDirectory(prefix="md-segments-bench-")
+        path = os.path.join(tmp_dir.name, "bench.md")
+        synthesize_markdown(path, args.size_mb)
+    try:
+        report = {"file": path if args.md else None, "sizeMb": round(os.path.getsize(path) / 1024 / 1024, 1)}
+        (ref_count, ref_digest), ref_seconds, ref_peak = measure(run_reference, path, args.repeat)
+        (count, digest), seconds, peak = measure(run_streaming, path, args.repeat)
+        report["segments"] = count
+        report["reference"] = {"seconds": round(ref_seconds, 3), "peakMb": round(ref_peak, 2)}
+        report["streaming"] = {"seconds": round(seconds, 3), "peakMb": round(peak, 2)}
+        report["speedup"] = round(ref_seconds / seconds, 2) if seconds else 0
+        report["identical"] = (ref_count, ref_digest) == (count, digest)
+    finally:
+        if tmp_dir:
+            tmp_dir.cleanup()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if not report["identical"]:
+        sys.stderr.write("Segments differ between reference and streaming parser.\n")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+增量同步：把 Markdown 的改动以最少的插入/删除写入已发布的飞书文档。
+
+- Markdown 按标题切分为小节，与高亮块、图表一起构成有序的「步骤」，每个步骤取内容哈希
+- 同步状态文件记录每个步骤的哈希及其对应的文档顶层块 id
+- 再次同步时先读取文档块树校验状态，再对新旧哈希序列做 diff：
+  未变的步骤不动，删除的步骤按块区间删除，新增/修改的步骤插入到对应位置
+- 在文档中间插入或删除需要 lark-cli 支持 add-content / add-callout / add-board 的 --index 参数与 delete-blocks 命令，
+  写入前先检查，不支持时不做任何修改；只追加到末尾时不需要
+"""
+
+import difflib
+import hashlib
+import json
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from lark_doc_ops import delete_blocks, get_top_level_blocks, missing_block_edit_support, write_segment
+
+SYNC_STATE_SUFFIX = ".lark-sync.json"
+HEADING_BLOCK_TYPES = set(range(3, 12))
+CALLOUT_BLOCK_TYPE = 19
+BOARD_BLOCK_TYPE = 43
+
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+
+
+def split_sections(markdown_text):
+    """按标题行（代码块外）切分 Markdown，每节以标题开头（首节可能没有标题）。"""
+    sections = []
+    buf = []
+    in_fence = False
+    for line in markdown_text.split("\n"):
+        if line.startswith("```"):
+            in_fence = not in_fence
+        elif not in_fence and _HEADING_RE.match(line) and buf:
+            sections.append("\n".join(buf))
+            buf = []
+        buf.append(line)
+    if buf:
+        sections.append("\n".join(buf))
+    return [section for section in sections if section.strip()]
+
+
+def sync_steps(segments):
+    """把片段整理为同步步骤：跳过空高亮块，Markdown 按标题切成小节（相邻的 Markdown 先合并）。"""
+    steps = []
+    pending = []
+
+    def flush():
+        if pending:
+            text = pending[0]
+            for part in pending[1:]:
+                text = text.rstrip("\n") + "\n\n" + part.lstrip("\n")
+            steps.extend(("markdown", section) for section in split_sections(text))
+            pending.clear()
+
+    for segment in segments:
+        kind = segment[0]
+        if kind == "markdown":
+            if segment[1].strip():
+                pending.append(segment[1])
+            continue
+        if kind == "callout" and not segment[2].strip():
+            continue
+        flush()
+        steps.append(tuple(segment))
+    flush()
+    return steps
+
+
+def merge_writes(steps):
+    """把相邻的 Markdown 小节合并为一次写入（按原文换行拼回），返回 [(片段, 步骤序号列表)]。"""
+    writes = []
+    for k, step in enumerate(steps):
+        if step[0] == "markdown" and writes and writes[-1][0][0] == "markdown":
+            merged, members = writes[-1]
+            writes[-1] = (("markdown", merged[1] + "\n" + step[1]), members + [k])
+        else:
+            writes.append((step, [k]))
+    return writes
+
+
+def step_hash(step):
+    """步骤内容哈希；Markdown 小节末尾的空行不影响生成的块，不计入哈希（在文末追加内容时上一节不必重写）。"""
+    if step[0] == "markdown":
+        step = ("markdown", step[1].rstrip())
+    return hashlib.sha1(json.dumps(step, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+def default_state_path(md_path):
+    """默认同步状态文件：Markdown 文件旁的 <文件名>.lark-sync.json。"""
+    return md_path + SYNC_STATE_SUFFIX
+
+
+def load_state(path):
+    """读取同步状态，不存在或损坏时返回 None。"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def save_state(path, state):
+    """原子写入同步状态。"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _assign_gap(steps, blocks, board_ids):
+    """把一段新写入的块按顺序分配给新步骤，无法对应时返回 None。
+
+    高亮块与画板各占一个块；Markdown 小节占到下一个步骤的起始块为止
+    （下一个是 Markdown 小节时以标题块为界，是高亮块/画板时以对应类型的块为界）。
+    """
+    assigned = []
+    pos = 0
+    for k, step in enumerate(steps):
+        kind = step[0]
+        if kind in ("callout", "diagram"):
+            expected = CALLOUT_BLOCK_TYPE if kind == "callout" else BOARD_BLOCK_TYPE
+            if pos >= len(blocks) or blocks[pos].get("block_type") != expected:
+                return None
+            token = (blocks[pos].get("board") or {}).get("token")
+            if kind == "diagram" and board_ids.get(k) and token and token != board_ids[k]:
+                return None
+            assigned.append([blocks[pos]["block_id"]])
+            pos += 1
+            continue
+        start = pos
+        if pos < len(blocks) and blocks[pos].get("block_type") in HEADING_BLOCK_TYPES:
+            pos += 1
+        next_kind = steps[k + 1][0] if k + 1 < len(steps) else None
+        while pos < len(blocks):
+            block_type = blocks[pos].get("block_type")
+            if next_kind == "markdown" and block_type in HEADING_BLOCK_TYPES:
+                break
+            if next_kind == "callout" and block_type == CALLOUT_BLOCK_TYPE:
+                break
+            if next_kind == "diagram" and block_type == BOARD_BLOCK_TYPE:
+                break
+            pos += 1
+        assigned.append([block["block_id"] for block in blocks[start:pos]])
+    return assigned if pos == len(blocks) else None
+
+
+def _map_blocks(opcodes, old, steps, final_blocks, board_ids):
+    """写入完成后，按 diff 结果把文档顶层块对应回新步骤，失败返回 None。"""
+    final_ids = [block["block_id"] for block in final_blocks]
+    position = {block_id: i for i, block_id in enumerate(final_ids)}
+    mapping = []
+    pos = 0
+    for n, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        if tag == "equal":
+            for k in range(i1, i2):
+                ids = old[k]["blocks"]
+                if final_ids[pos:pos + len(ids)] != ids:
+                    return None
+                mapping.append(ids)
+                pos += len(ids)
+            continue
+        # 新块区间的终点：之后第一个未变步骤的首块位置
+        gap_end = len(final_ids)
+        for later in opcodes[n + 1:]:
+            if later[0] != "equal":
+                continue
+            first = next((old[k]["blocks"][0] for k in range(later[1], later[2]) if old[k]["blocks"]), None)
+            if first is not None:
+                gap_end = position.get(first, -1)
+                break
+        if gap_end < pos:
+            return None
+        new_steps = steps[j1:j2]
+        gap_boards = {k - j1: board_id for k, board_id in board_ids.items() if j1 <= k < j2}
+        assigned = _assign_gap(new_steps, final_blocks[pos:gap_end], gap_boards)
+        if assigned is None:
+            return None
+        mapping.extend(assigned)
+        pos = gap_end
+    return mapping if pos == len(final_ids) else None
+
+
+def sync_document(
+    doc_id,
+    segments,
+    state_path,
+    force=False,
+    workers=4,
+    verbose=False,
+    dry_run=False,
+):
+    """把片段增量同步到文档，返回统计信息。
+
+    - 状态缺失或文档被手动改动（顶层块与状态不一致）时，文档非空需 force=True 才会整体重写
+    - 需要删除或在文档中间插入时，先检查 lark-cli 是否支持 delete-blocks 与 --index，不支持时不做任何修改并退出
+    - 图表导入并发执行，失败的图表记入统计的 failures；状态中其哈希记为空，下次同步只重建这些画板
+    """
+    steps = sync_steps(segments)
+    hashes = [step_hash(step) for step in steps]
+    current = [block["block_id"] for block in get_top_level_blocks(doc_id)]
+    calls = 1
+
+    state = load_state(state_path)
+    old = None
+    if state and state.get("docId") == doc_id and state.get("complete"):
+        old = state.get("steps") or []
+        if [block_id for step in old for block_id in step["blocks"]] != current:
+            sys.stderr.write("Document changed outside of sync; its tracked blocks no longer match the state file.\n")
+            old = None
+    if old is None:
+        if current and not force:
+            sys.stderr.write(
+                "Document has content not tracked by the sync state; "
+                "pass --force to replace it, or sync into a new document.\n"
+            )
+            raise SystemExit(6)
+        # 未跟踪的现有内容视为一个待删除的步骤
+        old = [{"hash": None, "blocks": current}] if current else []
+
+    opcodes = difflib.SequenceMatcher(None, [step["hash"] for step in old], hashes, autojunk=False).get_opcodes()
+    offsets = [0]
+    for step in old:
+        offsets.append(offsets[-1] + len(step["blocks"]))
+
+    # 写入前确认 lark-cli 支持所需的删除与按位置插入，避免执行到一半才失败留下半改的文档；
+    # 只追加到文档末尾时用不到这两项能力
+    need_delete = any(offsets[i2] > offsets[i1] for tag, i1, i2, _, _ in opcodes if tag != "equal")
+    insert_kinds = {
+        steps[j][0] for tag, _, i2, j1, j2 in opcodes if tag != "equal" and i2 != len(old) for j in range(j1, j2)
+    }
+    missing = missing_block_edit_support(insert_kinds, need_delete)
+    if missing:
+        sys.stderr.write(
+            "This lark-cli cannot edit blocks in place (missing: " + ", ".join(missing) + "); "
+            "the document was not changed. Re-render into a new document without --sync instead.\n"
+        )
+        raise SystemExit(7)
+
+    stats = {"steps": len(steps), "unchanged": 0, "written": 0, "removed": 0, "deleteCalls": 0, "failures": []}
+    if dry_run:
+        for tag, i1, i2, j1, j2 in opcodes:
+            if tag == "equal":
+                stats["unchanged"] += i2 - i1
+                continue
+            print(f"[{tag}] remove {i2 - i1} step(s) / blocks {offsets[i1]}..{offsets[i2]}, write {j2 - j1} step(s)")
+            for step in steps[j1:j2]:
+                print(f"  + [{step[0]}]", step[-1].strip().split("\n", 1)[0][:60])
+            stats["written"] += j2 - j1
+            stats["removed"] += i2 - i1
+        stats["calls"] = calls
+        return stats
+
+    board_ids = {}
+    imports = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        # 从后往前应用，前面的块下标保持不变
+        for tag, i1, i2, j1, j2 in reversed(opcodes):
+            if tag == "equal":
+                stats["unchanged"] += i2 - i1
+                continue
+            start, end = offsets[i1], offsets[i2]
+            if end > start:
+                delete_blocks(doc_id, start, end, verbose=verbose)
+                stats["deleteCalls"] += 1
+                calls += 1
+            stats["removed"] += i2 - i1
+            stats["written"] += j2 - j1
+            # 相邻的 Markdown 小节合并写入，写入后仍按标题块对应回各小节
+            writes = merge_writes(steps[j1:j2])
+            # 区间位于文档末尾时顺序追加，否则在同一下标处倒序插入
+            at_end = i2 == len(old)
+            for write, members in (writes if at_end else reversed(writes)):
+                board_id, future = write_segment(doc_id, write, pool, verbose=verbose, index=None if at_end else start)
+                calls += 1
+                if future is not None:
+                    j = j1 + members[0]
+                    board_ids[j] = board_id
+                    imports.append((j, write[1], future))
+                    calls += 1
+        for j, syntax, future in imports:
+            try:
+                future.result()
+            except SystemExit as e:
+                stats["failures"].append((j, syntax, e.code))
+
+    if stats["written"] or stats["removed"]:
+        final_blocks = get_top_level_blocks(doc_id)
+        calls += 1
+        mapping = _map_blocks(opcodes, old, steps, final_blocks, board_ids)
+    else:
+        mapping = [step["blocks"] for step in old]
+    if mapping is None:
+        sys.stderr.write("Could not map document blocks back to steps; the next sync needs --force to rewrite the document.\n")
+    # 导入失败的画板不记哈希，下次同步时与新内容不一致，只替换这些画板
+    failed = {j for j, _, _ in stats["failures"]}
+    save_state(state_path, {
+        "docId": doc_id,
+        "complete": mapping is not None,
+        "steps": [
+            {"hash": None if k in failed else hashes[k], "kind": steps[k][0], "blocks": mapping[k] if mapping else []}
+            for k in range(len(steps))
+        ],
+    })
+    stats["calls"] = calls
+    return stats
@@ -1,10 +1,243 @@
 """
 lark-cli 调用与输出解析。
+lark-doc-to-md、lark-doc-to-obsidian、lark-md-to-doc、feishu-group-summary 共用同一份实现,修改时同步四个插件。
+
+- 所有调用经 invoke():限制同时运行的 lark-cli 进程数,只读命令遇限流错误按指数退避重试,并按子命令记录耗时
+- lark-cli broker(见 lark_broker.py)运行时,调用经 Unix socket 转发给它,否则直接启动 lark-cli
+- 环境变量:
+  - LARK_CLI_MAX_CONCURRENCY:同时运行的 lark-cli 进程数上限(默认 8)
+  - LARK_CLI_RETRIES:只读命令的限流重试次数(默认 3)
+  - LARK_CLI_METRICS:设为 1 时退出前把各子命令的耗时直方图输出到 stderr,设为文件路径时追加写入该文件(JSON)
+  - LARK_BROKER=off / LARK_BROKER_SOCKET:关闭 broker 转发 / 指定 socket 路径
 """
 
+import atexit
 import json
+import os
+import random
+import re
+import socket
 import subprocess
 import sys
+import threading
+import time
+
+MAX_CONCURRENCY = max(1, int(os.environ.get("LARK_CLI_MAX_CONCURRENCY") or 8))
+RETRIES = max(0, int(os.environ.get("LARK_CLI_RETRIES") or 3))
+RETRY_BACKOFF = 0.5
+# 飞书开放平台限流错误码 99991400,以及 HTTP 状态码 429(只认错误码/状态码字段,不匹配任意文本中的数字)
+RATE_LIMIT_RE = re.compile(
+    r"\b99991400\b|\b(?:http(?:/\d(?:\.\d)?)?|status(?:[ _]?code)?)[\"']?\s*[:=]?\s*429\b",
+    re.IGNORECASE,
+)
+# 只读命令失败后重试不会产生副作用,默认重试;写命令(add-content 等)可能已部分生效,默认不重试
+READ_ONLY_PREFIXES = ("get-", "search-", "download-")
+# 耗时直方图分桶上界(毫秒)
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+
+class LarkCliError(subprocess.CalledProcessError):
+    """lark-cli 返回非零退出码。"""
+
+    def __str__(self):
+        detail = (self.stderr or self.output or "").strip()
+        return f"{' '.join(self.cmd)} failed ({self.returncode}): {detail}"
+
+
+# lark-cli broker(见 lark_broker.py)在运行时,调用经 Unix socket 转发给它,否则直接启动 lark-cli
+BROKER_SOCKET = os.path.expanduser(
+    os.environ.get("LARK_BROKER_SOCKET") or os.path.join("~", ".cache", "lark-cli-broker", "broker.sock")
+)
+_broker_local = threading.local()
+_broker_down = False
+
+
+def close_broker_connection():
+    """关闭当前线程与 broker 的连接。"""
+    conn = getattr(_broker_local, "conn", None)
+    _broker_local.conn = None
+    if conn is not None:
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+
+def _broker_run(args):
+    """经 broker 执行 lark-cli(args 不含 lark-cli 本身);broker 不可用时返回 None。"""
+    global _broker_down
+    if _broker_down or os.environ.get("LARK_BROKER") == "off" or not os.path.exists(BROKER_SOCKET):
+        return None
+    payload = json.dumps({"op": "run", "args": args, "cwd": os.getcwd()}).encode("utf-8") + b"\n"
+    # 复用的连接可能已被重启的 broker 关闭,重连一次;新连接也失败则本进程不再尝试 broker
+    for _ in range(2):
+        conn = getattr(_broker_local, "conn", None)
+        fresh = conn is None
+        try:
+            if fresh:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(BROKER_SOCKET)
+                conn = _broker_local.conn = sock.makefile("rwb")
+                sock.close()
+            conn.write(payload)
+            conn.flush()
+            line = conn.readline()
+            reply = json.loads(line) if line else {}
+            if "returncode" in reply:
+                return subprocess.CompletedProcess(
+                    ["lark-cli", *args], reply["returncode"], reply["stdout"], reply["stderr"]
+                )
+        except (OSError, ValueError):
+            pass
+        close_broker_connection()
+        if fresh:
+            break
+    _broker_down = True
+    return None
+
+
+def run_process(cmd):
+    """执行一次 lark-cli 命令(cmd 以 "lark-cli" 开头),返回 subprocess.CompletedProcess。"""
+    res = _broker_run(cmd[1:]) if cmd and cmd[0] == "lark-cli" else None
+    if res is None:
+        res = subprocess.run(cmd, capture_output=True, text=True)
+    return res
+
+
+def command_name(cmd):
+    """跳过 lark-cli 与全局参数(--format json、-v),返回子命令名。"""
+    skip = False
+    for arg in cmd[1:]:
+        if skip:
+            skip = False
+        elif arg == "--format":
+            skip = True
+        elif not arg.startswith("-"):
+            return arg
+    return ""
+
+
+class _Metrics:
+    """按子命令统计调用次数、失败、重试与耗时直方图。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._commands = {}
+
+    def record(self, command, seconds, ok, retries):
+        ms = seconds * 1000
+        with self._lock:
+            entry = self._commands.get(command)
+            if entry is None:
+                entry = {
+                    "calls": 0,
+                    "failed": 0,
+                    "retries": 0,
+                    "totalMs": 0.0,
+                    "maxMs": 0.0,
+                    "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+                self._commands[command] = entry
+            entry["calls"] += 1
+            entry["failed"] += 0 if ok else 1
+            entry["retries"] += retries
+            entry["totalMs"] += ms
+            entry["maxMs"] = max(entry["maxMs"], ms)
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if ms <= bound:
+                    entry["buckets"][i] += 1
+                    break
+            else:
+                entry["buckets"][-1] += 1
+
+    def snapshot(self):
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            return {
+                command: {
+                    "calls": entry["calls"],
+                    "failed": entry["failed"],
+                    "retries": entry["retries"],
+                    "avgMs": round(entry["totalMs"] / entry["calls"], 1),
+                    "maxMs": round(entry["maxMs"], 1),
+                    "histogram": {label: n for label, n in zip(labels, entry["buckets"]) if n},
+                }
+                for command, entry in sorted(self._commands.items())
+            }
+
+
+_metrics = _Metrics()
+
+
+def metrics_snapshot():
+    """返回本进程内各子命令的调用统计与耗时直方图。"""
+    return _metrics.snapshot()
+
+
+def _dump_metrics():
+    target = os.environ.get("LARK_CLI_METRICS")
+    stats = metrics_snapshot()
+    if not target or not stats:
+        return
+    text = json.dumps({"pid": os.getpid(), "argv": sys.argv, "commands": stats}, ensure_ascii=False)
+    if target in ("1", "stderr"):
+        sys.stderr.write(f"lark-cli metrics: {text}\n")
+        return
+    try:
+        with open(os.path.expanduser(target), "a", encoding="utf-8") as f:
+            f.write(text + "\n")
+    except OSError as e:
+        sys.stderr.write(f"Failed to write lark-cli metrics: {e}\n")
+
+
+atexit.register(_dump_metrics)
+
+
+def invoke(cmd, retries=None):
+    """执行 lark-cli 命令并返回 CompletedProcess(不检查退出码)。
+
+    - 同时运行的进程数受 LARK_CLI_MAX_CONCURRENCY 限制,可从多个线程并发调用
+    - 输出中出现限流错误时按指数退避(带抖动)重试,最多 retries 次;
+      retries 为 None 时只读命令(get-*、search-*、download-*)重试 LARK_CLI_RETRIES 次,写命令不重试,
+      避免部分生效的写入(如已创建了部分块的 add-content)被重复执行
+    """
+    command = command_name(cmd)
+    if retries is None:
+        retries = RETRIES if command.startswith(READ_ONLY_PREFIXES) else 0
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        with _slots:
+            res = run_process(cmd)
+        if res.returncode == 0 or attempt >= retries:
+            break
+        if not RATE_LIMIT_RE.search((res.stdout or "") + (res.stderr or "")):
+            break
+        attempt += 1
+        time.sleep(RETRY_BACKOFF * (2 ** (attempt - 1)) * (0.5 + random.random()))
+    _metrics.record(command, time.perf_counter() - started, res.returncode == 0, attempt)
+    return res
+
+
+def run_cmd(cmd, quiet=True):
+    """执行完整命令(含 lark-cli),返回 stdout;失败抛出 LarkCliError。
+
+    - quiet=True 时错误码 41050(无权限查看用户信息)返回空字符串
+    - quiet=False 时把失败输出写到 stderr
+    """
+    proc = invoke(cmd)
+    if proc.returncode == 0:
+        return proc.stdout
+    output = (proc.stdout or "") + (proc.stderr or "")
+    if quiet and "41050" in output:
+        return ""
+    if not quiet:
+        sys.stderr.write(proc.stdout or "")
+        sys.stderr.write(proc.stderr or "")
+        sys.stderr.write(f"Command failed: {' '.join(cmd)}\n")
+    raise LarkCliError(proc.returncode, cmd, output=proc.stdout, stderr=proc.stderr)
 
 
 def run_lark_cli(args, want_json=False, verbose=False):
@@ -21,7 +254,7 @@ def run_lark_cli(args, want_json=False, verbose=False):
     if want_json:
         cmd += ["--format", "json"]
     cmd += args
-    res = subprocess.run(cmd, capture_output=True, text=True)
+    res = invoke(cmd)
     if res.returncode != 0:
         # lark-cli 可能将错误写到 stdout 或 stderr，这里统一输出
         sys.stderr.write(res.stderr or res.stdout)
@@ -29,13 +262,49 @@ def run_lark_cli(args, want_json=False, verbose=False):
     if want_json:
         try:
             return json.loads(res.stdout)
-        except json.JSONDecodeError:
+        except json.JSONDecodeError as e:
             # JSON 解析失败时，直接输出原始文本便于排查
-            sys.stderr.write(res.stdout)
+            sys.stderr.write(f"Failed to parse lark-cli JSON output: {e}\n")
+            sys.stderr.write(f"Output was: {res.stdout}\n")
             raise SystemExit(2)
     return res.stdout
 
 
+def resolve_wiki_node(node_token):
+    """解析 wiki 节点对应的文档 token,无权限(41050)时返回空字符串。"""
+    raw = run_cmd(["lark-cli", "--format", "json", "get-node", node_token])
+    if not raw:
+        return ""
+    data = json.loads(raw)
+    obj_token = data.get("obj_token")
+    if not obj_token:
+        raise ValueError(f"get-node missing obj_token for wiki token: {node_token}")
+    return obj_token
+
+
+def get_blocks(doc_id):
+    """获取文档全部 block。"""
+    raw = run_cmd(["lark-cli", "--format", "json", "get-blocks", doc_id, "--all"])
+    if not raw:
+        return {"items": []}
+    return json.loads(raw)
+
+
+def get_user_info(user_id, user_id_type="user_id"):
+    """查询用户信息。
+
+    - user_id_type: user_id / open_id / union_id
+    - 查询失败(无权限、用户不存在等)时返回空字典,不中断调用方
+    """
+    res = invoke(["lark-cli", "--format", "json", "get-user-info", user_id, "--user-id-type", user_id_type])
+    if res.returncode != 0:
+        return {}
+    try:
+        return json.loads(res.stdout)
+    except json.JSONDecodeError:
+        return {}
+
+
 def extract_id(data, keys, value_predicate=None):
     """从任意层级 JSON 中提取 id。
 
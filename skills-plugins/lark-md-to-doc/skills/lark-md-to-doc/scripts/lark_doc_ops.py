@@ -6,7 +6,8 @@ import os
 import sys
 import tempfile
 
-from lark_cli import extract_id, is_board_id, is_doc_id, run_lark_cli
+from lark_cli import extract_id, get_blocks, invoke, is_board_id, is_doc_id, run_lark_cli
+from md_segments import parse_callout_info
 
 
 def create_document(title, folder_token, verbose=False):
@@ -46,8 +47,15 @@ def create_document(title, folder_token, verbose=False):
     return doc_id, doc_url
 
 
-def add_markdown(doc_id, text, verbose=False):
-    """将一段 Markdown 写入文档。"""
+def with_index(args, index):
+    """index 不为 None 时追加 --index（插入到文档顶层第 index 个块之前）。"""
+    if index is not None:
+        args += ["--index", str(index)]
+    return args
+
+
+def add_markdown(doc_id, text, verbose=False, index=None):
+    """将一段 Markdown 写入文档（默认追加到末尾）。"""
     if not text.strip():
         return
     # 使用临时文件，避免命令行长度限制和转义问题
@@ -55,24 +63,24 @@ def add_markdown(doc_id, text, verbose=False):
         tmp.write(text)
         tmp_path = tmp.name
     try:
-        run_lark_cli(["add-content", doc_id, tmp_path], want_json=False, verbose=verbose)
+        run_lark_cli(with_index(["add-content", doc_id, tmp_path], index), want_json=False, verbose=verbose)
     finally:
         os.unlink(tmp_path)
 
 
-def add_callout(doc_id, text, callout_type=None, verbose=False):
+def add_callout(doc_id, text, callout_type=None, verbose=False, index=None):
     """创建高亮块。"""
     if not text.strip():
         return
     args = ["add-callout", doc_id, text]
     if callout_type:
         args += ["--callout-type", callout_type]
-    run_lark_cli(args, want_json=False, verbose=verbose)
+    run_lark_cli(with_index(args, index), want_json=False, verbose=verbose)
 
 
-def add_board(doc_id, verbose=False):
+def add_board(doc_id, verbose=False, index=None):
     """创建画板并返回 whiteboard_id。"""
-    data = run_lark_cli(["add-board", doc_id], want_json=True, verbose=verbose)
+    data = run_lark_cli(with_index(["add-board", doc_id], index), want_json=True, verbose=verbose)
     # 先从标准结构里取 board.token
     board_id = None
     if isinstance(data, dict):
@@ -121,3 +129,74 @@ def import_diagram(board_id, content, syntax, verbose=False):
         )
     finally:
         os.unlink(tmp_path)
+
+
+_help_cache = {}
+
+
+def _command_help(command):
+    """返回 `lark-cli <command> --help` 的输出，命令不存在时返回 None（按命令缓存）。"""
+    if command not in _help_cache:
+        res = invoke(["lark-cli", command, "--help"], retries=0)
+        _help_cache[command] = (res.stdout or "") + (res.stderr or "") if res.returncode == 0 else None
+    return _help_cache[command]
+
+
+def missing_block_edit_support(kinds, need_delete):
+    """检查 lark-cli 是否支持按位置编辑文档，返回缺少的能力描述列表（为空表示都支持）。
+
+    - kinds：需要插入到文档中间的片段类型（markdown / callout / diagram），对应命令需支持 --index
+    - need_delete：是否需要 delete-blocks 命令
+    """
+    commands = {"markdown": "add-content", "callout": "add-callout", "diagram": "add-board"}
+    missing = []
+    if need_delete and _command_help("delete-blocks") is None:
+        missing.append("delete-blocks command")
+    for command in sorted({commands[kind] for kind in kinds}):
+        text = _command_help(command)
+        if text is None or "--index" not in text:
+            missing.append(f"{command} --index")
+    return missing
+
+
+def delete_blocks(doc_id, start_index, end_index, verbose=False):
+    """删除文档顶层第 [start_index, end_index) 个块。"""
+    if end_index <= start_index:
+        return
+    run_lark_cli(
+        ["delete-blocks", doc_id, "--start-index", str(start_index), "--end-index", str(end_index)],
+        want_json=False,
+        verbose=verbose,
+    )
+
+
+def get_top_level_blocks(doc_id):
+    """返回文档顶层块列表（按顺序），每项为 get-blocks 输出中的块对象。"""
+    items = get_blocks(doc_id).get("items", [])
+    index = {item.get("block_id"): item for item in items}
+    page = index.get(doc_id)
+    if page is None:
+        # 兼容 page 块 id 与 doc_id 不一致的情况：取第一个无 parent 的块
+        page = next((item for item in items if not item.get("parent_id")), {})
+    return [index[child] for child in page.get("children", []) if child in index]
+
+
+def write_segment(doc_id, segment, pool, verbose=False, index=None):
+    """写入一个片段，返回 (画板 id, 图表导入 future)，非图表片段返回 (None, None)。
+
+    - 图表先同步创建画板占位，再把导入提交到 pool，与后续写入并发执行
+    - index 为 None 时追加到文档末尾，否则插入到顶层第 index 个块之前
+    """
+    kind = segment[0]
+    if kind == "markdown":
+        add_markdown(doc_id, segment[1], verbose=verbose, index=index)
+    elif kind == "callout":
+        opts = parse_callout_info(segment[1])
+        add_callout(doc_id, segment[2].strip(), callout_type=opts.get("type"), verbose=verbose, index=index)
+    elif kind == "diagram":
+        syntax, text = segment[1], segment[2]
+        board_id = add_board(doc_id, verbose=verbose, index=index)
+        return board_id, pool.submit(import_diagram, board_id, text.strip(), syntax, verbose)
+    else:
+        raise SystemExit(f"Unknown segment type: {kind}")
+    return None, None
@@ -1,9 +1,23 @@
 """
 Markdown 分段解析。
+
+- iter_segments：从文件对象（或任意按行迭代的对象）单遍读取，逐个产出片段及其起始行号，不需要整份文本
+- parse_segments：对整段文本的兼容封装，返回片段列表
 """
 
+import io
+import re
 import shlex
 
+# 指令块的 info 前缀（忽略大小写），只匹配开头，不再整体转小写
+_DIRECTIVE_RE = re.compile(r"(callout|plantuml|mermaid)", re.IGNORECASE)
+# 含引号或反斜杠时才需要 shlex 分词
+_SHELL_QUOTE_RE = re.compile(r"[\"'\\]")
+# shlex 只把这几个字符当作空白（全角空格、\xa0 等不算）
+_SHELL_SPACE_RE = re.compile(r"[ \t\r\n]+")
+# \n 以外 str.splitlines 也视为换行的字符，按行读文件时不会在这些字符处断行
+_EXTRA_BREAK_RE = re.compile("[\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+
 
 def parse_callout_info(info_line):
     """解析 callout 指令参数。
@@ -13,8 +27,11 @@ def parse_callout_info(info_line):
     - ```callout:warning
     """
     opts = {}
-    # 用 shlex 处理引号与空格，避免手写分词的坑
-    tokens = shlex.split(info_line)
+    # 用 shlex 处理引号与空格，避免手写分词的坑；不含引号时按 shlex 的空白切分，结果相同
+    if _SHELL_QUOTE_RE.search(info_line):
+        tokens = shlex.split(info_line)
+    else:
+        tokens = [token for token in _SHELL_SPACE_RE.split(info_line) if token]
     if tokens:
         head = tokens[0]
         if ":" in head:
@@ -31,53 +48,84 @@ def parse_callout_info(info_line):
     return opts
 
 
-def parse_segments(markdown_text):
-    """将 Markdown 分割为三类片段：
+def _split_lines(lines):
+    """逐行产出 (行号, 去掉换行符的行)，换行边界与 str.splitlines 相同。"""
+    for line_no, line in enumerate(lines, 1):
+        if _EXTRA_BREAK_RE.search(line):
+            for part in line.splitlines():
+                yield line_no, part
+        else:
+            yield line_no, line.rstrip("\r\n")
+
 
+def iter_segments(lines):
+    """单遍扫描 Markdown 行，逐个产出 (起始行号, 片段)，行号从 1 开始。
+
+    片段格式：
     - ("markdown", text)
     - ("callout", info_line, text)
     - ("diagram", syntax, text)
+
+    - lines 可以是文本模式打开的文件对象，行尾换行符会被去掉
+    - 与 str.splitlines 一致，\f、\x85、\u2028 等也视为换行，会把一行再拆开；拆出的行沿用所在物理行的行号
+    - 只缓存当前片段的行，片段产出后即释放
+    - 指令块的起始行号为开头的 ``` 行
     """
-    lines = markdown_text.splitlines()
-    segments = []
     buf = []
-    i = 0
-    while i < len(lines):
-        line = lines[i]
+    buf_start = 1
+    block = None
+    block_lines = None
+    in_code = False
+    line_no = 0
+    for line_no, line in _split_lines(lines):
+        if block is not None:
+            # 指令块内：遇到任意 ``` 行结束
+            if line.startswith("```"):
+                kind, arg, start = block
+                yield start, (kind, arg, "\n".join(block_lines))
+                block = block_lines = None
+            else:
+                block_lines.append(line)
+            continue
+        if in_code:
+            # 非指令块的代码块，按原样写入 Markdown
+            buf.append(line)
+            if line.startswith("```"):
+                in_code = False
+            continue
         if line.startswith("```"):
-            info = line.strip()[3:].strip()
-            info_lower = info.lower()
-            is_callout = info_lower.startswith("callout")
-            is_plantuml = info_lower.startswith("plantuml")
-            is_mermaid = info_lower.startswith("mermaid")
-            if is_callout or is_plantuml or is_mermaid:
+            info = line[3:].strip()
+            match = _DIRECTIVE_RE.match(info)
+            if match:
                 # 进入指令块，先把之前的普通 Markdown 缓冲输出
                 if buf:
-                    segments.append(("markdown", "\n".join(buf)))
+                    yield buf_start, ("markdown", "\n".join(buf))
                     buf = []
-                i += 1
-                block_lines = []
-                while i < len(lines) and not lines[i].startswith("```"):
-                    block_lines.append(lines[i])
-                    i += 1
-                block_text = "\n".join(block_lines)
-                if is_callout:
-                    segments.append(("callout", info, block_text))
+                directive = match.group(1).lower()
+                if directive == "callout":
+                    block = ("callout", info, line_no)
                 else:
-                    syntax = "plantuml" if is_plantuml else "mermaid"
-                    segments.append(("diagram", syntax, block_text))
-            else:
-                # 非指令块的代码块，按原样写入 Markdown
-                buf.append(line)
-                i += 1
-                while i < len(lines):
-                    buf.append(lines[i])
-                    if lines[i].startswith("```"):
-                        break
-                    i += 1
-        else:
-            buf.append(line)
-        i += 1
+                    block = ("diagram", directive, line_no)
+                block_lines = []
+                continue
+            in_code = True
+        if not buf:
+            buf_start = line_no
+        buf.append(line)
+    if block is not None:
+        # 未闭合的指令块延续到文件末尾
+        kind, arg, start = block
+        yield start, (kind, arg, "\n".join(block_lines))
     if buf:
-        segments.append(("markdown", "\n".join(buf)))
-    return segments
+        yield buf_start, ("markdown", "\n".join(buf))
+
+
+def parse_segments(markdown_text):
+    """将 Markdown 分割为三类片段：
+
+    - ("markdown", text)
+    - ("callout", info_line, text)
+    - ("diagram", syntax, text)
+    """
+    # newline=None：与文本模式读文件一致，\r\n 与 \r 统一为 \n
+    return [segment for _, segment in iter_segments(io.StringIO(markdown_text, newline=None))]
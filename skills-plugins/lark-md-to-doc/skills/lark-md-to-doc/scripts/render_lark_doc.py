@@ -4,15 +4,63 @@
 - 普通 Markdown 段落：lark-cli add-content
 - ```plantuml / ```mermaid：创建画板并导入图表
 - ```callout：创建高亮块
+- --sync：增量同步到已发布的文档，只重写改动的小节（见 doc_sync.py）
 
 输入：Markdown 文件
 输出：写入到指定/新建的飞书文档
 """
 
 import argparse
+import sys
+from concurrent.futures import ThreadPoolExecutor
 
-from lark_doc_ops import add_board, add_callout, add_markdown, create_document, import_diagram
-from md_segments import parse_callout_info, parse_segments
+from doc_sync import default_state_path, sync_document
+from lark_doc_ops import create_document, write_segment
+from md_segments import iter_segments, parse_callout_info
+
+# 并发导入图表的线程数
+DEFAULT_WORKERS = 4
+
+
+def preview(text):
+    """截断过长文本用于 dry-run 输出。"""
+    return (text[:80] + "...") if len(text) > 80 else text
+
+
+def print_segments(segments):
+    """dry-run：按顺序打印将要执行的步骤。"""
+    for segment in segments:
+        kind = segment[0]
+        if kind == "markdown":
+            print("[markdown]", preview(segment[1]))
+        elif kind == "callout":
+            print("[callout]", parse_callout_info(segment[1]), preview(segment[2]))
+        elif kind == "diagram":
+            print(f"[diagram:{segment[1]}]", preview(segment[2]))
+        else:
+            raise SystemExit(f"Unknown segment type: {kind}")
+
+
+def render_segments(doc_id, segments, workers=DEFAULT_WORKERS, verbose=False):
+    """按文档顺序写入片段，返回导入失败的图表 [(片段序号, syntax, 退出码)]。
+
+    - Markdown、高亮块与画板占位按顺序逐个追加，保证文档顺序
+    - 图表导入只依赖已创建的画板，提交到线程池与后续写入并发执行
+    - 单个图表导入失败不影响其它片段，全部完成后统一返回
+    """
+    imports = []
+    failures = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for index, segment in enumerate(segments):
+            _, future = write_segment(doc_id, segment, pool, verbose=verbose)
+            if future is not None:
+                imports.append((index, segment[1], future))
+        for index, syntax, future in imports:
+            try:
+                future.result()
+            except SystemExit as e:
+                failures.append((index, syntax, e.code))
+    return failures
 
 
 def main():
@@ -23,60 +71,80 @@ def main():
     parser.add_argument("--folder-token", help="Optional folder token for new doc")
     parser.add_argument("--dry-run", action="store_true", help="Print steps without calling lark-cli")
     parser.add_argument("--verbose", action="store_true", help="Verbose lark-cli output")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Concurrent diagram imports (blocks are still appended in document order)",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Incrementally sync into the document, rewriting only changed sections",
+    )
+    parser.add_argument("--sync-state", help="Sync state file (default: <md>.lark-sync.json)")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="With --sync, replace document content that the sync state does not track",
+    )
     args = parser.parse_args()
 
     if not args.doc_id and not args.title:
         parser.error("Either --doc-id or --title is required")
+    if args.force and not args.sync:
+        parser.error("--force requires --sync")
 
+    # 文件在写入期间保持打开，片段边解析边写入，整体写入时全文不留在内存；
+    # --sync 需要比对整篇文档，由 sync_document 把片段收集为完整的步骤列表
     with open(args.md, "r", encoding="utf-8") as f:
-        markdown_text = f.read()
-
-    # 创建或复用文档
-    doc_id = args.doc_id
-    doc_url = None
-    if not doc_id:
-        if args.dry_run:
-            # dry-run 不调用 lark-cli，用占位符代替
-            doc_id = "DOC_ID"
-        else:
-            doc_id, doc_url = create_document(args.title, args.folder_token, verbose=args.verbose)
-            # 默认输出 doc_id 与 url，方便用户回收链接
-            print(f"doc_id: {doc_id}")
-            if doc_url:
-                print(f"url: {doc_url}")
-
-    # 解析 Markdown 为可执行片段
-    segments = parse_segments(markdown_text)
+        segments = (segment for _, segment in iter_segments(f))
 
-    # 按顺序渲染到文档
-    for segment in segments:
-        kind = segment[0]
-        if kind == "markdown":
+        # 创建或复用文档
+        doc_id = args.doc_id
+        doc_url = None
+        if not doc_id:
             if args.dry_run:
-                print("[markdown]", (segment[1][:80] + "...") if len(segment[1]) > 80 else segment[1])
+                # dry-run 不调用 lark-cli，用占位符代替
+                doc_id = "DOC_ID"
             else:
-                add_markdown(doc_id, segment[1], verbose=args.verbose)
-        elif kind == "callout":
-            info_line, text = segment[1], segment[2]
-            opts = parse_callout_info(info_line)
-            if args.dry_run:
-                print("[callout]", opts, (text[:80] + "...") if len(text) > 80 else text)
-            else:
-                add_callout(
-                    doc_id,
-                    text.strip(),
-                    callout_type=opts.get("type"),
-                    verbose=args.verbose,
-                )
-        elif kind == "diagram":
-            syntax, text = segment[1], segment[2]
-            if args.dry_run:
-                print(f"[diagram:{syntax}]", (text[:80] + "...") if len(text) > 80 else text)
-            else:
-                board_id = add_board(doc_id, verbose=args.verbose)
-                import_diagram(board_id, text.strip(), syntax=syntax, verbose=args.verbose)
-        else:
-            raise SystemExit(f"Unknown segment type: {kind}")
+                doc_id, doc_url = create_document(args.title, args.folder_token, verbose=args.verbose)
+                # 默认输出 doc_id 与 url，方便用户回收链接
+                print(f"doc_id: {doc_id}")
+                if doc_url:
+                    print(f"url: {doc_url}")
+
+        # 新建文档的 dry-run 无需读取文档，与整体写入的输出相同
+        if args.sync and not (args.dry_run and not args.doc_id):
+            sync_stats = sync_document(
+                doc_id,
+                segments,
+                args.sync_state or default_state_path(args.md),
+                force=args.force,
+                workers=args.workers,
+                verbose=args.verbose,
+                dry_run=args.dry_run,
+            )
+            sys.stderr.write(
+                f"Sync: {sync_stats['steps']} steps, {sync_stats['unchanged']} unchanged, "
+                f"{sync_stats['written']} written, {sync_stats['removed']} removed, "
+                f"{sync_stats['calls']} lark-cli calls\n"
+            )
+            if sync_stats["failures"]:
+                for index, syntax, code in sync_stats["failures"]:
+                    sys.stderr.write(f"Diagram import failed: step #{index} ({syntax}), exit code {code}\n")
+                raise SystemExit(5)
+            return
+
+        if args.dry_run:
+            print_segments(segments)
+            return
+
+        failures = render_segments(doc_id, segments, workers=args.workers, verbose=args.verbose)
+        if failures:
+            for index, syntax, code in failures:
+                sys.stderr.write(f"Diagram import failed: segment #{index} ({syntax}), exit code {code}\n")
+            raise SystemExit(5)
 
 
 if __name__ == "__main__":